@@ -0,0 +1,98 @@
+"""Selectable CPU speech recognition backends.
+
+Every backend returns an object with Whisper's transcribe(audio, **options)
+call and result shape ({"text", "segments", "language"}), so it can be used
+anywhere a Whisper model is:
+
+- "whisper": the reference openai-whisper model in fp32
+- "whisper-int8": the same model with its linear layers dynamically
+  quantized to int8 for faster CPU inference
+- "faster-whisper": the CTranslate2 engine (int8), if faster-whisper is installed
+
+Model size is one of tiny/base/small. Configure with WHISPER_MODEL and
+WHISPER_BACKEND.
+"""
+import os
+
+MODEL_SIZES = ("tiny", "base", "small")
+BACKENDS = ("whisper", "whisper-int8", "faster-whisper")
+
+DEFAULT_MODEL_SIZE = os.getenv("WHISPER_MODEL", "base")
+DEFAULT_BACKEND = os.getenv("WHISPER_BACKEND", "whisper")
+
+
+def backend_tag(size=DEFAULT_MODEL_SIZE, backend=DEFAULT_BACKEND):
+    """Identifier for cache keys and reports; plain size for the reference backend."""
+    return size if backend == "whisper" else f"{size}-{backend}"
+
+
+def quantize_whisper(model):
+    """Dynamically quantize the linear layers of a CPU Whisper model to int8."""
+    import torch
+    import whisper.model
+
+    # whisper.model.Linear only overrides forward() to cast weights to the input dtype, which is a
+    # no-op in fp32; quantize_dynamic only converts exact nn.Linear modules, so unwrap them first.
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class FasterWhisperModel:
+    """Adapter giving faster-whisper the openai-whisper transcribe() interface."""
+
+    def __init__(self, size, compute_type="int8", threads=0):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(size, device="cpu", compute_type=compute_type, cpu_threads=threads)
+
+    def transcribe(self, audio, word_timestamps=False, language=None, initial_prompt=None,
+                   condition_on_previous_text=True, **_ignored):
+        segments, info = self.model.transcribe(
+            audio,
+            language=language,
+            initial_prompt=initial_prompt,
+            word_timestamps=word_timestamps,
+            condition_on_previous_text=condition_on_previous_text,
+        )
+        result_segments = []
+        for segment in segments:
+            entry = {
+                "id": segment.id,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+            }
+            if word_timestamps and segment.words:
+                entry["words"] = [
+                    {"word": w.word, "start": w.start, "end": w.end, "probability": w.probability}
+                    for w in segment.words
+                ]
+            result_segments.append(entry)
+        return {
+            "text": "".join(segment["text"] for segment in result_segments),
+            "segments": result_segments,
+            "language": info.language,
+        }
+
+
+def load_asr_model(size=DEFAULT_MODEL_SIZE, backend=DEFAULT_BACKEND, threads=None):
+    if size not in MODEL_SIZES:
+        raise ValueError(f"Unknown model size {size!r}; expected one of {', '.join(MODEL_SIZES)}")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+    if backend == "faster-whisper":
+        try:
+            return FasterWhisperModel(size, threads=threads or 0)
+        except ImportError as e:
+            raise ImportError("The faster-whisper backend requires `pip install faster-whisper`") from e
+
+    import whisper
+    model = whisper.load_model(size, device="cpu")
+    if backend == "whisper-int8":
+        model = quantize_whisper(model)
+    return model
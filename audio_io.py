@@ -0,0 +1,45 @@
+"""Single-pass audio ingestion.
+
+Encoded audio (webm, wav, mp3, ...) is decoded once, straight from memory,
+to 16 kHz mono float32 -- the format Whisper works in -- and the same array
+is shared by transcription, duration and pause analysis. The fingerprint of
+the encoded bytes is kept for the transcript cache key.
+"""
+import subprocess
+from dataclasses import dataclass
+
+import numpy as np
+
+from transcript_cache import audio_fingerprint
+
+SAMPLE_RATE = 16000
+
+
+@dataclass
+class DecodedAudio:
+    samples: np.ndarray
+    sample_rate: int
+    fingerprint: str
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+
+def decode_audio_bytes(data, sample_rate=SAMPLE_RATE):
+    """Decode encoded audio bytes with ffmpeg over pipes, without a temp file."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "pipe:1",
+    ]
+    process = subprocess.run(cmd, input=data, capture_output=True)
+    if process.returncode:
+        raise RuntimeError(f"Failed to decode audio: {process.stderr.decode(errors='replace').strip()}")
+    pcm = process.stdout
+    samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], np.int16).astype(np.float32) / 32768.0
+    return DecodedAudio(samples=samples, sample_rate=sample_rate, fingerprint=audio_fingerprint(data))
+
+
+def decode_audio_file(path, sample_rate=SAMPLE_RATE):
+    with open(path, "rb") as f:
+        return decode_audio_bytes(f.read(), sample_rate)
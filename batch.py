@@ -0,0 +1,231 @@
+"""Headless batch runner for the speech analysis pipeline.
+
+Runs transcribe_audio -> analyze_phonetics -> analyze_speech over every audio
+file in a directory without the Streamlit UI and writes one JSON result per
+file. Runs are resumable: files that already have a result are skipped.
+Stage timings are stored in each result; set METRICS_LOG_PATH to also log
+them as JSON lines.
+
+Usage:
+    python batch.py recordings/ --out results/ --workers 4 --llm-concurrency 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from main import (WHISPER_BACKEND, WHISPER_MODEL_SIZE, WORD_CONFIDENCE_ENABLED, transcribe_audio, analyze_phonetics,
+                  analyze_speech)
+from transcript_cache import TranscriptCache
+from metrics import compute_text_metrics
+from pause_analysis import analyze_pauses_array
+from pronunciation_scoring import recognized_words, score_pronunciation
+from structured_report import render_markdown
+from audio_io import decode_audio_file
+from llm_client import new_usage
+from instrumentation import span, trace
+from asr_backends import BACKENDS, MODEL_SIZES, backend_tag, load_asr_model
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".webm", ".m4a", ".ogg", ".flac"}
+
+# One Whisper model per worker process, loaded by the pool initializer
+_worker_model = None
+_worker_model_name = None
+_worker_cache = None
+
+
+def _init_worker(model_name, backend):
+    global _worker_model, _worker_model_name, _worker_cache
+    _worker_model = load_asr_model(model_name, backend)
+    _worker_model_name = backend_tag(model_name, backend)
+    _worker_cache = TranscriptCache.from_env()
+
+
+# Transcription stage, runs inside a worker process
+def _transcribe_file(audio_path):
+    with trace("batch_transcribe", file=audio_path) as request:
+        # Decode once and share the samples between Whisper, duration and pause analysis
+        with span("decode") as stage:
+            audio = decode_audio_file(audio_path)
+            stage["audio_seconds"] = round(audio.duration, 3)
+        with span("transcribe", model=_worker_model_name, audio_seconds=round(audio.duration, 3)):
+            decode_options = {"word_timestamps": True} if WORD_CONFIDENCE_ENABLED else {}
+            asr_result = transcribe_audio(audio, _worker_model, cache=_worker_cache, model_name=_worker_model_name,
+                                          return_result=True, **decode_options)
+        transcription = asr_result["text"]
+        audio_duration = audio.duration
+        word_count = len(transcription.split())
+        with span("phonetics", words=word_count):
+            phoneme_data = analyze_phonetics(transcription)
+        with span("text_metrics"):
+            metrics = compute_text_metrics(transcription, phoneme_data, audio_duration)
+        with span("pauses"):
+            pause_metrics = analyze_pauses_array(audio.samples, audio.sample_rate, word_count=word_count,
+                                                 syllable_count=metrics.get("syllable_count"))
+        pronunciation_scores = None
+        words = recognized_words(asr_result)
+        if words:
+            with span("pronunciation", words=len(words)):
+                pronunciation_scores = score_pronunciation(words, phoneme_data)
+    return {
+        "transcription": transcription,
+        "segments": [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in asr_result.get("segments", [])],
+        "audio_duration": audio_duration,
+        "word_count": word_count,
+        "phoneme_data": phoneme_data,
+        "metrics": metrics,
+        "pause_metrics": pause_metrics,
+        "pronunciation_scores": pronunciation_scores,
+        "trace": {"transcription": request.to_dict()},
+    }
+
+
+# LLM stage, runs in a thread of the parent process
+def _analyze(file_result, language_hint, expected_topic, parallel_sections, structured=False):
+    usage = new_usage()
+    with trace("batch_analyze", file=file_result["file"]) as request:
+        with span("llm", parallel_sections=parallel_sections, structured=structured) as stage:
+            analysis = analyze_speech(
+                file_result["transcription"],
+                file_result["phoneme_data"],
+                audio_duration=file_result["audio_duration"],
+                word_count=file_result["word_count"],
+                language_hint=language_hint,
+                expected_topic=expected_topic,
+                metrics=file_result["metrics"],
+                pause_metrics=file_result["pause_metrics"],
+                parallel_sections=parallel_sections,
+                usage=usage,
+                transcript_segments=file_result["segments"],
+                pronunciation_scores=file_result["pronunciation_scores"],
+                structured=structured
+            )
+            stage.update(usage)
+    if structured:
+        file_result["report"], analysis = analysis, render_markdown(analysis)
+    file_result["analysis"] = analysis
+    file_result["token_usage"] = usage
+    file_result["trace"]["analysis"] = request.to_dict()
+    return file_result
+
+
+def find_audio_files(input_dir):
+    audio_files = []
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                audio_files.append(os.path.join(root, name))
+    return sorted(audio_files)
+
+
+def result_path_for(audio_path, input_dir, output_dir):
+    relative = os.path.relpath(audio_path, input_dir)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + ".json")
+
+
+def write_result(path, result):
+    """Write atomically so an interrupted run never leaves a partial result behind."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_batch(input_dir, output_dir, workers=2, llm_concurrency=4, model_name=WHISPER_MODEL_SIZE,
+              backend=WHISPER_BACKEND, language_hint=None, expected_topic=None, parallel_sections=False,
+              structured=False):
+    """Process every pending audio file in input_dir. Returns (completed, failed) counts."""
+    audio_files = find_audio_files(input_dir)
+    pending = {}
+    for audio_path in audio_files:
+        result_path = result_path_for(audio_path, input_dir, output_dir)
+        if not os.path.exists(result_path):
+            pending[audio_path] = result_path
+
+    skipped = len(audio_files) - len(pending)
+    print(f"{len(pending)} file(s) to process, {skipped} already done", file=sys.stderr)
+    if not pending:
+        return 0, 0
+
+    completed = failed = 0
+    # spawn keeps torch/whisper state out of the parent and is safe alongside the LLM threads
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                             initializer=_init_worker, initargs=(model_name, backend)) as asr_pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency) as llm_pool:
+        asr_futures = {asr_pool.submit(_transcribe_file, path): path for path in pending}
+        llm_futures = {}
+
+        # Drain both stages together, so each result is written as soon as its analysis finishes
+        # and a crash part-way through the run loses no finished analysis
+        running = set(asr_futures)
+        while running:
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in asr_futures:
+                    audio_path = asr_futures[future]
+                    try:
+                        file_result = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"[failed] {audio_path}: transcription error: {e}", file=sys.stderr)
+                        continue
+                    file_result["file"] = os.path.relpath(audio_path, input_dir)
+                    file_result["language_hint"] = language_hint
+                    file_result["expected_topic"] = expected_topic
+                    llm_future = llm_pool.submit(_analyze, file_result, language_hint, expected_topic,
+                                                 parallel_sections, structured)
+                    llm_futures[llm_future] = audio_path
+                    running.add(llm_future)
+                    continue
+                audio_path = llm_futures[future]
+                try:
+                    write_result(pending[audio_path], future.result())
+                    completed += 1
+                    print(f"[done] {audio_path}", file=sys.stderr)
+                except Exception as e:
+                    failed += 1
+                    print(f"[failed] {audio_path}: analysis error: {e}", file=sys.stderr)
+
+    return completed, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the speech analysis pipeline over a directory of recordings.")
+    parser.add_argument("input_dir", help="Directory containing audio files (searched recursively)")
+    parser.add_argument("--out", dest="output_dir", default="results", help="Directory for JSON results")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Whisper worker processes (one model per worker)")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Concurrent analysis requests")
+    parser.add_argument("--model", default=WHISPER_MODEL_SIZE, choices=MODEL_SIZES, help="Whisper model size")
+    parser.add_argument("--backend", default=WHISPER_BACKEND, choices=BACKENDS,
+                        help="CPU inference backend (int8 variants are faster, slightly less accurate)")
+    parser.add_argument("--language-hint", default=None, help="Speaker's likely native language")
+    parser.add_argument("--topic", default=None, help="Expected speaking topic")
+    parser.add_argument("--parallel-sections", action="store_true",
+                        help="Request report section groups concurrently and merge them")
+    parser.add_argument("--structured", action="store_true",
+                        help="Generate the report as schema-validated JSON (stored under \"report\") and render it")
+    args = parser.parse_args(argv)
+
+    completed, failed = run_batch(
+        args.input_dir,
+        args.output_dir,
+        workers=args.workers,
+        llm_concurrency=args.llm_concurrency,
+        model_name=args.model,
+        backend=args.backend,
+        language_hint=args.language_hint,
+        expected_topic=args.topic,
+        parallel_sections=args.parallel_sections,
+        structured=args.structured
+    )
+    print(f"{completed} completed, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Speed/accuracy benchmark for the CPU speech recognition backends.
+
+Transcribes every clip in a directory with each model size and backend and
+reports the real-time factor (processing time / audio duration, lower is
+faster) and the word error rate against a reference transcript. Each clip
+needs a reference next to it with the same name and a .txt extension:
+
+    benchmarks/clips/learner_01.wav
+    benchmarks/clips/learner_01.txt
+
+The repository ships a small synthetic set in benchmarks/clips (eSpeak NG
+speech of sentences written for this repo, regenerated by make_clips.py) so
+the benchmark runs out of the box; add learner recordings for realistic WER.
+
+Clips are decoded once up front, so the timings cover inference only; each
+model gets one untimed warm-up call before its clips are measured.
+
+Usage:
+    python benchmarks/asr_benchmark.py --sizes tiny base --backends whisper whisper-int8
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from asr_backends import BACKENDS, MODEL_SIZES, backend_tag, load_asr_model  # noqa: E402
+from audio_io import decode_audio_file  # noqa: E402
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".webm", ".m4a", ".ogg", ".flac"}
+DEFAULT_CLIPS_DIR = os.path.join(REPO_ROOT, "benchmarks", "clips")
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance divided by the reference length."""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    previous = np.arange(len(hyp) + 1)
+    for i, ref_word in enumerate(ref, 1):
+        current = np.empty_like(previous)
+        current[0] = i
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return float(previous[-1]) / len(ref)
+
+
+def load_clips(clips_dir):
+    clips = []
+    for name in sorted(os.listdir(clips_dir)):
+        stem, ext = os.path.splitext(name)
+        reference_path = os.path.join(clips_dir, stem + ".txt")
+        if ext.lower() not in AUDIO_EXTENSIONS or not os.path.exists(reference_path):
+            continue
+        with open(reference_path, encoding="utf-8") as f:
+            reference = f.read().strip()
+        clips.append((name, decode_audio_file(os.path.join(clips_dir, name)), reference))
+    return clips
+
+
+def run_backend(size, backend, clips):
+    load_start = time.perf_counter()
+    model = load_asr_model(size, backend)
+    load_seconds = time.perf_counter() - load_start
+    model.transcribe(clips[0][1].samples)
+
+    audio_seconds = processing_seconds = 0.0
+    errors = []
+    for name, audio, reference in clips:
+        start = time.perf_counter()
+        result = model.transcribe(audio.samples)
+        processing_seconds += time.perf_counter() - start
+        audio_seconds += audio.duration
+        errors.append(word_error_rate(reference, result["text"]))
+    return {
+        "model": backend_tag(size, backend),
+        "load_seconds": round(load_seconds, 2),
+        "rtf": round(processing_seconds / audio_seconds, 3),
+        "wer": round(float(np.mean(errors)), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", default=DEFAULT_CLIPS_DIR, help="Directory of audio clips with .txt references")
+    parser.add_argument("--sizes", nargs="+", default=list(MODEL_SIZES), choices=MODEL_SIZES)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    clips = load_clips(args.clips)
+    if not clips:
+        parser.error(f"no audio clips with .txt references found in {args.clips}")
+    print(f"{len(clips)} clip(s), {sum(audio.duration for _, audio, _ in clips):.1f} s of audio", file=sys.stderr)
+
+    results = []
+    for size in args.sizes:
+        for backend in args.backends:
+            try:
+                results.append(run_backend(size, backend, clips))
+            except ImportError as e:
+                results.append({"model": backend_tag(size, backend), "error": str(e)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'model':<24} {'load s':>7} {'RTF':>7} {'WER':>7}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['model']:<24} skipped: {result['error']}")
+            continue
+        print(f"{result['model']:<24} {result['load_seconds']:>7} {result['rtf']:>7} {result['wer']:>7}")
+
+
+if __name__ == "__main__":
+    main()
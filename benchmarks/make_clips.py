@@ -0,0 +1,61 @@
+"""Regenerate the synthetic clip set in benchmarks/clips.
+
+Each clip is one sentence written for this repository, spoken by eSpeak NG
+(en-us, 150 words per minute) and stored as 16 kHz mono WAV next to its
+reference transcript. The sentences and the audio carry no third-party
+rights. Synthetic speech makes the benchmark reproducible out of the box; it
+is cleaner than learner recordings, so add real clips to the directory (or
+point --clips elsewhere) for WER figures that reflect the app's users.
+
+Requires the espeak-ng command and ffmpeg.
+
+Usage:
+    python benchmarks/make_clips.py
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CLIPS_DIR = os.path.join(REPO_ROOT, "benchmarks", "clips")
+
+SENTENCES = {
+    "synthetic_01": "Last summer I travelled to the coast with my family, and we spent most of the afternoons "
+                    "walking along the beach.",
+    "synthetic_02": "I think the most important thing about learning a language is practising every day, "
+                    "even if it is only for ten minutes.",
+    "synthetic_03": "Our company is planning to open a new office next year, so we are looking for people "
+                    "who can speak English and Spanish.",
+    "synthetic_04": "When I was a child my grandmother taught me how to cook, and now I make her vegetable soup "
+                    "every winter.",
+}
+
+
+def synthesize(text, path, voice="en-us", words_per_minute=150):
+    with tempfile.NamedTemporaryFile(suffix=".wav") as raw:
+        subprocess.run(["espeak-ng", "-v", voice, "-s", str(words_per_minute), "-w", raw.name, text], check=True)
+        subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", raw.name,
+                        "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le", path], check=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", default=DEFAULT_CLIPS_DIR, help="Directory to write the clips to")
+    args = parser.parse_args(argv)
+
+    for tool in ("espeak-ng", "ffmpeg"):
+        if shutil.which(tool) is None:
+            parser.error(f"{tool} is not installed")
+    os.makedirs(args.clips, exist_ok=True)
+    for name, text in SENTENCES.items():
+        synthesize(text, os.path.join(args.clips, name + ".wav"))
+        with open(os.path.join(args.clips, name + ".txt"), "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"wrote {name}.wav", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""End-to-end pipeline benchmark on synthetic audio with a local stub LLM.
+
+Speech-like fixtures (voiced syllables with pitch jitter, word gaps and
+phrase pauses) and matching transcripts are generated from a fixed seed, so
+every run measures the same input. Each pipeline stage is run several times
+per fixture:
+
+    decode        ffmpeg decode of the fixture's WAV bytes (skipped without ffmpeg)
+    transcribe    transcribe_audio with the configured Whisper backend (skipped when
+                  the ASR stack is not installed or the fixture is over --asr-max-seconds)
+    pauses        analyze_pauses_array on the decoded samples
+    phonetics     analyze_phonetics
+    text_metrics  compute_text_metrics
+    prompt        build_analysis_prompt
+    llm           analyze_speech against stub_openai_server (response cache off)
+
+and reported as p50/p95 latency, throughput (seconds of audio per second of
+processing) and peak traced allocation (one extra untimed run under
+tracemalloc). Results can be saved as a baseline; later runs are compared
+with it and stages whose p50 latency or memory grew by more than --threshold
+are flagged, with a non-zero exit status. Baselines are machine specific.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py --durations 10 60 600 --save-baseline
+    python benchmarks/pipeline_benchmark.py --durations 10 60 600
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from stub_openai_server import start_stub_server  # noqa: E402
+
+DEFAULT_DURATIONS = (10, 60, 300, 1800)
+DEFAULT_BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baselines", "pipeline.json")
+SAMPLE_RATE = 16000
+WORDS_PER_SECOND = 2.2
+# Stages faster than this are not flagged; their timings are mostly noise
+MIN_REGRESSION_SECONDS = 0.005
+MIN_REGRESSION_MB = 1.0
+
+SENTENCES = [
+    "I think learning English is really important because it opens many doors for my career.",
+    "Yesterday I went to the market with my brother and we bought vegetables for the whole week.",
+    "In my opinion the government should invest more money in public transport and education.",
+    "When I was a child I used to play football every afternoon after school with my friends.",
+    "The most difficult part of my job is explaining technical problems to customers clearly.",
+    "Um, I would like to travel to Japan next year, because the culture is very interesting.",
+    "Actually, my hometown is famous for its beautiful beaches and the delicious seafood.",
+    "So basically we have to finish the project before Friday, otherwise the client will complain.",
+    "I have been studying at this university for three years and I really enjoy the atmosphere.",
+    "Technology has changed the way people communicate, you know, especially young people.",
+]
+
+
+def synthesize_speech(duration, seed=0, sample_rate=SAMPLE_RATE):
+    """Speech-like mono float32 audio: harmonic syllables, short word gaps and longer phrase pauses."""
+    rng = np.random.default_rng(seed)
+    total = int(duration * sample_rate)
+    samples = np.zeros(total, dtype=np.float32)
+    position = int(0.3 * sample_rate)
+    words_in_phrase = 0
+    while position < total:
+        for _ in range(rng.integers(1, 4)):
+            length = int(rng.uniform(0.12, 0.28) * sample_rate)
+            end = min(position + length, total)
+            t = np.arange(end - position) / sample_rate
+            f0 = rng.uniform(100, 220)
+            pitch = f0 * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(2, 6) * t))
+            phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+            voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+            envelope = np.hanning(end - position)
+            samples[position:end] = 0.2 * envelope * voiced + 0.01 * rng.standard_normal(end - position)
+            position = end
+        words_in_phrase += 1
+        if words_in_phrase >= rng.integers(4, 12):
+            position += int(rng.uniform(0.35, 1.2) * sample_rate)
+            words_in_phrase = 0
+        else:
+            position += int(rng.uniform(0.03, 0.12) * sample_rate)
+    samples += 0.002 * rng.standard_normal(total).astype(np.float32)
+    return samples
+
+
+def synthesize_transcript(duration, seed=0):
+    """A transcript with a typical speaking rate for the duration, from a fixed sentence bank."""
+    rng = np.random.default_rng(seed)
+    target_words = max(1, int(duration * WORDS_PER_SECOND))
+    sentences, words = [], 0
+    while words < target_words:
+        sentence = SENTENCES[rng.integers(len(SENTENCES))]
+        sentences.append(sentence)
+        words += len(sentence.split())
+    return " ".join(sentences)
+
+
+def encode_wav(samples, sample_rate=SAMPLE_RATE):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def measure(fn, runs):
+    """Time fn over `runs` calls, then once more under tracemalloc. Returns (stats, last result)."""
+    timings, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "runs": runs,
+        "p50_seconds": round(float(np.percentile(timings, 50)), 5),
+        "p95_seconds": round(float(np.percentile(timings, 95)), 5),
+        "peak_alloc_mb": round(peak / 2 ** 20, 2),
+    }, result
+
+
+def benchmark_fixture(main, duration, runs, asr_runs, asr_model, asr_max_seconds):
+    from audio_io import DecodedAudio, decode_audio_bytes
+    from transcript_cache import audio_fingerprint
+
+    samples = synthesize_speech(duration, seed=int(duration))
+    wav = encode_wav(samples)
+    audio = DecodedAudio(samples=samples, sample_rate=SAMPLE_RATE, fingerprint=audio_fingerprint(wav))
+    text = synthesize_transcript(duration, seed=int(duration))
+    word_count = len(text.split())
+    stages, skipped = {}, {}
+
+    if shutil.which("ffmpeg"):
+        stages["decode"], _ = measure(lambda: decode_audio_bytes(wav), runs)
+    else:
+        skipped["decode"] = "ffmpeg not found"
+
+    if isinstance(asr_model, str):
+        skipped["transcribe"] = asr_model
+    elif duration > asr_max_seconds:
+        skipped["transcribe"] = f"longer than --asr-max-seconds {asr_max_seconds:g}"
+    else:
+        stages["transcribe"], _ = measure(lambda: main.transcribe_audio(audio, asr_model), asr_runs)
+
+    stages["pauses"], pause_metrics = measure(
+        lambda: main.analyze_pauses_array(audio.samples, audio.sample_rate, word_count=word_count), runs)
+    stages["phonetics"], phoneme_data = measure(lambda: main.analyze_phonetics(text), runs)
+    stages["text_metrics"], metrics = measure(
+        lambda: main.compute_text_metrics(text, phoneme_data, audio.duration), runs)
+    prompt_args = dict(text=text, phoneme_data=phoneme_data, audio_duration=audio.duration, word_count=word_count,
+                       metrics=metrics, pause_metrics=pause_metrics)
+    stages["prompt"], _ = measure(lambda: main.build_analysis_prompt(**prompt_args), runs)
+    stages["llm"], _ = measure(lambda: main.analyze_speech(**prompt_args), runs)
+
+    for stats in stages.values():
+        stats["audio_x_realtime"] = round(duration / stats["p50_seconds"], 1) if stats["p50_seconds"] else None
+    return {"audio_seconds": duration, "words": word_count, "stages": stages, "skipped": skipped}
+
+
+def load_asr_model_or_reason(main):
+    try:
+        return main.load_whisper_model()
+    except ImportError as e:
+        return f"ASR stack not installed ({e})"
+
+
+def compare(results, baseline, threshold):
+    """[(fixture, stage, metric, baseline value, current value)] for values that grew beyond the threshold."""
+    regressions = []
+    for fixture, result in results["fixtures"].items():
+        previous = baseline.get("fixtures", {}).get(fixture, {}).get("stages", {})
+        for stage, stats in result["stages"].items():
+            if stage not in previous:
+                continue
+            for metric, floor in (("p50_seconds", MIN_REGRESSION_SECONDS), ("peak_alloc_mb", MIN_REGRESSION_MB)):
+                old, new = previous[stage].get(metric), stats.get(metric)
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + threshold) and new - old > floor:
+                    regressions.append((fixture, stage, metric, old, new))
+    return regressions
+
+
+def fixture_name(duration):
+    return f"{duration / 60:g}min" if duration >= 60 else f"{duration:g}s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--durations", nargs="+", type=float, default=list(DEFAULT_DURATIONS),
+                        help="Fixture lengths in seconds")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per stage")
+    parser.add_argument("--asr-runs", type=int, default=1, help="Timed runs of the transcribe stage")
+    parser.add_argument("--asr-max-seconds", type=float, default=300, help="Skip transcription of longer fixtures")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM latency per request (seconds)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative growth of p50 latency or memory that counts as a regression")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    stub, base_url = start_stub_server(latency=args.llm_latency, response_text="Benchmark report. " * 40)
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "benchmark-placeholder",
+        "LLM_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3"),
+        "LLM_REQUESTS_PER_MINUTE": "1000000",
+        "LLM_TOKENS_PER_MINUTE": "1000000000",
+    })
+    import main as app
+    # Every run has to reach the (stub) API; a cache hit would only time SQLite
+    app.llm_client.cache = None
+
+    asr_model = load_asr_model_or_reason(app)
+    results = {
+        "machine": {"platform": platform.platform(), "processor": platform.processor() or platform.machine(),
+                    "python": platform.python_version(), "cpus": os.cpu_count()},
+        "asr_model": app.WHISPER_MODEL_NAME,
+        "llm_latency": args.llm_latency,
+        "fixtures": {},
+    }
+    for duration in args.durations:
+        name = fixture_name(duration)
+        print(f"benchmarking {name} fixture", file=sys.stderr)
+        results["fixtures"][name] = benchmark_fixture(app, duration, args.runs, args.asr_runs, asr_model,
+                                                      args.asr_max_seconds)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["peak_rss_mb"] = round((peak if sys.platform == "darwin" else peak * 1024) / 2 ** 20, 1)
+    stub.shutdown()
+
+    regressions = []
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != results["machine"]:
+            print("warning: the baseline was recorded on a different machine", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+    results["regressions"] = [dict(zip(("fixture", "stage", "metric", "baseline", "current"), r))
+                              for r in regressions]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"ASR model {results['asr_model']}, stub LLM latency {args.llm_latency:g} s, "
+              f"peak RSS {results['peak_rss_mb']} MB")
+        print(f"{'fixture':<8} {'stage':<13} {'p50 s':>9} {'p95 s':>9} {'x realtime':>11} {'peak MB':>8}")
+        for name, result in results["fixtures"].items():
+            for stage, stats in result["stages"].items():
+                print(f"{name:<8} {stage:<13} {stats['p50_seconds']:>9} {stats['p95_seconds']:>9} "
+                      f"{stats['audio_x_realtime'] or '-':>11} {stats['peak_alloc_mb']:>8}")
+            for stage, reason in result["skipped"].items():
+                print(f"{name:<8} {stage:<13} skipped: {reason}")
+        for fixture, stage, metric, old, new in regressions:
+            print(f"REGRESSION {fixture} {stage} {metric}: {old} -> {new}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Cold-start benchmark for the app module and the text-only analysis path.
+
+Each scenario runs in a fresh interpreter several times and reports the
+median wall time, peak RSS and whether the ASR stack (torch/whisper) was
+imported. The LLM call itself is not made; the text-only scenario stops after
+building the prompt.
+
+Usage:
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "import main": "import main",
+    "text-only request": """
+import main
+text = "I think learning English is really important because it opens many doors for my career."
+phoneme_data = main.analyze_phonetics(text)
+metrics = main.compute_text_metrics(text, phoneme_data)
+main.build_analysis_prompt(text, phoneme_data, metrics=metrics)
+""",
+    "load whisper model": """
+import main
+main.load_whisper_model()
+""",
+}
+
+CHILD_TEMPLATE = """
+import json, resource, sys, time
+sys.path.insert(0, {repo_root!r})
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "asr_stack_loaded": "torch" in sys.modules or "whisper" in sys.modules,
+}}))
+"""
+
+
+def run_scenario(body, runs, env):
+    script = CHILD_TEMPLATE.format(repo_root=REPO_ROOT, body=body)
+    samples = []
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env,
+                                 cwd=REPO_ROOT)
+        if process.returncode:
+            return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "failed"}
+        samples.append(json.loads(process.stdout.strip().splitlines()[-1]))
+    return {
+        "median_seconds": round(statistics.median(s["seconds"] for s in samples), 3),
+        "max_rss_mb": round(max(s["max_rss_mb"] for s in samples), 1),
+        "asr_stack_loaded": any(s["asr_stack_loaded"] for s in samples),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+    env["LLM_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3")
+
+    results = {name: run_scenario(body, args.runs, env) for name, body in SCENARIOS.items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<22} {'median s':>9} {'peak RSS MB':>12} {'ASR stack':>10}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<22} {'error: ' + result['error']}")
+            continue
+        print(f"{name:<22} {result['median_seconds']:>9} {result['max_rss_mb']:>12} "
+              f"{'loaded' if result['asr_stack_loaded'] else 'no':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Incremental re-analysis after the user edits a transcript.
+
+When a transcript is resubmitted with the same audio and options, the edited
+text is diffed word by word against the previous version. Phoneme lookups are
+reused for every word seen before, and if only a small share of words
+changed, only EDIT_SENSITIVE_SECTIONS of the report are regenerated and
+spliced into the previous report. Larger edits, changed options and long-form
+(map-reduce) reports get a full analysis.
+"""
+import difflib
+import os
+
+from metrics import tokenize
+from prompts import ANALYSIS_SECTIONS, EDIT_SENSITIVE_SECTIONS, split_sections
+
+# Edits changing at most this share of the words only regenerate the wording-dependent sections
+DEFAULT_MAX_CHANGED_SHARE = float(os.getenv("ANALYSIS_INCREMENTAL_MAX_CHANGE", "0.2"))
+# Job options that must match for the previous report to be reused
+SHARED_OPTIONS = ("language_hint", "expected_topic", "structured")
+
+
+def changed_share(old_text, new_text):
+    """Share of words inserted, deleted or replaced between two transcripts (0.0 when identical)."""
+    old, new = tokenize(old_text), tokenize(new_text)
+    if not old and not new:
+        return 0.0
+    matcher = difflib.SequenceMatcher(a=old, b=new, autojunk=False)
+    changed = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal")
+    return changed / max(len(old), len(new))
+
+
+def plan_update(previous_job, params, text, long_form, max_changed_share=DEFAULT_MAX_CHANGED_SHARE):
+    """Sections to regenerate for an edit of previous_job's transcript: [] reuses the whole report,
+    None means a full analysis is needed."""
+    previous = previous_job and previous_job.get("result")
+    if not previous or not previous.get("analysis") or previous.get("long_form") or long_form:
+        return None
+    if any(previous_job["params"].get(option) != params.get(option) for option in SHARED_OPTIONS):
+        return None
+    # Every section has to be recoverable from the previous report
+    if set(split_sections(previous["analysis"], sorted(ANALYSIS_SECTIONS))) != set(ANALYSIS_SECTIONS):
+        return None
+    share = changed_share(previous["transcription"], text)
+    if share > max_changed_share:
+        return None
+    return [] if share == 0 else list(EDIT_SENSITIVE_SECTIONS)
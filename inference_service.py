@@ -0,0 +1,213 @@
+"""In-process Whisper inference queue shared by all Streamlit sessions.
+
+Sessions submit clips to one worker thread that owns the model, so
+concurrent users no longer contend for the same torch threads. Clips of up to
+30 seconds that use default decode options (optionally with word_timestamps)
+are micro-batched: their log-mel spectrograms are padded to one window,
+stacked and decoded in a single batched forward pass, and word timings are
+then aligned per clip the way model.transcribe does it. Longer clips, clips
+with other options and batched results that fail Whisper's quality checks go
+through model.transcribe one at a time. Queue depth, wait time and batch size are tracked for display.
+
+The service has the same transcribe(audio, **options) call as a Whisper
+model, so it can be passed to transcribe_audio in its place.
+"""
+import collections
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, decode_audio_file
+
+# Whisper's input window
+MAX_BATCH_SECONDS = 30
+# Decode options the batched path supports; clips with any other option are transcribed on their own
+BATCHABLE_OPTIONS = {"word_timestamps"}
+
+# Whisper's default fallback thresholds
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+
+
+class _Request:
+    def __init__(self, audio, decode_options):
+        self.audio = audio
+        self.decode_options = decode_options
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+def default_num_threads(job_workers=0):
+    # Leave a core to each job worker thread so decoding and analysis do not oversubscribe the CPU
+    return max(1, (os.cpu_count() or 1) - job_workers)
+
+
+_active_service = None
+
+
+def active_service():
+    """The most recently started service, or None if Whisper has not been loaded yet."""
+    return _active_service
+
+
+class WhisperInferenceService:
+    def __init__(self, model, max_batch_size=4, max_wait_ms=50, num_threads=None):
+        self.model = model
+        # Only openai-whisper models (fp32 or int8) can be batch-decoded; other backends run one by one
+        self.batched = hasattr(model, "dims")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.num_threads = num_threads
+        if self.batched:
+            import torch
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            self.num_threads = torch.get_num_threads()
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._waits = collections.deque(maxlen=500)
+        self._batch_sizes = collections.deque(maxlen=500)
+        self._in_flight = 0
+        self._completed = 0
+        self._thread = threading.Thread(target=self._run, name="whisper-inference", daemon=True)
+        self._thread.start()
+
+        global _active_service
+        _active_service = self
+
+    @classmethod
+    def from_env(cls, model, job_workers=0):
+        """WHISPER_THREADS overrides the default of one torch thread per core not taken by a job worker."""
+        threads = os.getenv("WHISPER_THREADS")
+        return cls(
+            model,
+            max_batch_size=int(os.getenv("WHISPER_MAX_BATCH_SIZE", "4")),
+            max_wait_ms=float(os.getenv("WHISPER_BATCH_WAIT_MS", "50")),
+            num_threads=int(threads) if threads else default_num_threads(job_workers),
+        )
+
+    def transcribe(self, audio, **decode_options):
+        """Queue a clip (path or 16 kHz float32 samples) and block until its result is ready."""
+        request = _Request(audio, decode_options)
+        self._queue.put(request)
+        return request.future.result()
+
+    def stats(self):
+        with self._stats_lock:
+            waits = np.array(self._waits) if self._waits else np.zeros(1)
+            return {
+                "queue_depth": self._queue.qsize(),
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "mean_wait_ms": round(float(waits.mean()) * 1000, 1),
+                "p95_wait_ms": round(float(np.percentile(waits, 95)) * 1000, 1),
+                "mean_batch_size": round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else 0.0,
+                "torch_threads": self.num_threads,
+            }
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.monotonic()
+            with self._stats_lock:
+                self._in_flight = len(batch)
+                self._waits.extend(started - request.enqueued for request in batch)
+                self._batch_sizes.append(len(batch))
+            try:
+                self._process(batch)
+            except Exception as e:
+                # Never let one bad batch stop the only worker thread; its callers get the error
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            finally:
+                with self._stats_lock:
+                    self._in_flight = 0
+                    self._completed += len(batch)
+
+    def _process(self, batch):
+        # A clip that cannot be decoded only fails its own request
+        decoded = []
+        for request in batch:
+            try:
+                if isinstance(request.audio, str):
+                    request.audio = decode_audio_file(request.audio).samples
+                decoded.append(request)
+            except Exception as e:
+                request.future.set_exception(e)
+
+        batchable = [r for r in decoded if self.batched and set(r.decode_options) <= BATCHABLE_OPTIONS
+                     and len(r.audio) <= MAX_BATCH_SECONDS * SAMPLE_RATE]
+        sequential = [r for r in decoded if r not in batchable]
+        if len(batchable) > 1:
+            try:
+                sequential.extend(self._decode_batch(batchable))
+            except Exception:
+                sequential.extend(batchable)
+        else:
+            sequential.extend(batchable)
+
+        for request in sequential:
+            if request.future.done():
+                continue
+            try:
+                request.future.set_result(self.model.transcribe(request.audio, **request.decode_options))
+            except Exception as e:
+                request.future.set_exception(e)
+
+    def _decode_batch(self, requests):
+        """Decode several short clips in one forward pass. Returns the requests that need a full transcribe."""
+        import torch
+        import whisper
+        from whisper.audio import HOP_LENGTH
+        from whisper.timing import add_word_timestamps
+        from whisper.tokenizer import get_tokenizer
+
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(np.asarray(r.audio, np.float32))),
+                                        self.model.dims.n_mels)
+            for r in requests
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(task="transcribe", without_timestamps=True,
+                                          fp16=self.model.device.type != "cpu")
+        results = whisper.decode(self.model, mels, options)
+
+        retry = []
+        for request, mel, result in zip(requests, mels, results):
+            if result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD:
+                retry.append(request)
+                continue
+            duration = len(request.audio) / whisper.audio.SAMPLE_RATE
+            segment = {
+                "id": 0, "seek": 0, "start": 0.0, "end": duration, "text": result.text,
+                "tokens": result.tokens, "temperature": result.temperature,
+                "avg_logprob": result.avg_logprob, "compression_ratio": result.compression_ratio,
+                "no_speech_prob": result.no_speech_prob,
+            }
+            if request.decode_options.get("word_timestamps"):
+                # Cross-attention alignment of this clip's tokens, as model.transcribe does per window
+                tokenizer = get_tokenizer(self.model.is_multilingual, num_languages=self.model.num_languages,
+                                          language=result.language, task="transcribe")
+                add_word_timestamps(segments=[segment], model=self.model, tokenizer=tokenizer, mel=mel,
+                                    num_frames=min(len(request.audio) // HOP_LENGTH, mel.shape[-1]),
+                                    last_speech_timestamp=0.0)
+            request.future.set_result({"text": result.text, "segments": [segment], "language": result.language})
+        return retry
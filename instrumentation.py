@@ -0,0 +1,231 @@
+"""Per-request stage timing, metrics export and an optional profiling hook.
+
+A request runs inside trace(); each stage inside it runs in span(), which
+records wall time and the CPU time of the calling thread. Spans can carry
+extra attributes (audio seconds, tokens, retries, ...). When the trace ends
+the process peak RSS is added and the trace is:
+
+- aggregated into an in-process registry exposed in Prometheus text format,
+  served on METRICS_PORT (GET /metrics) when that is set
+- appended as one JSON line to METRICS_LOG_PATH when that is set
+
+trace(profile=True) also runs cProfile on the calling thread for the length
+of the request and writes the stats to PROFILE_DIR. Work that other threads
+or processes do for the request (the LLM event loop, ASR workers) shows up in
+the profile as time spent waiting.
+"""
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "speech_analysis", "profiles")
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Span attributes that are summed into counters, with their metric names
+COUNTED_ATTRIBUTES = {
+    "audio_seconds": "speech_audio_seconds_total",
+    "prompt_tokens": "speech_llm_prompt_tokens_total",
+    "completion_tokens": "speech_llm_completion_tokens_total",
+    "retries": "speech_llm_retries_total",
+    "requests": "speech_llm_requests_total",
+}
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Trace:
+    def __init__(self, name, attributes):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = dict(attributes)
+        self.spans = []
+        self.status = "ok"
+        self.started = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_bytes = None
+        self.profile_path = None
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        self.cpu_seconds = time.thread_time() - self._cpu_start
+        self.peak_rss_bytes = _peak_rss_bytes()
+
+    def to_dict(self):
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "started_at": self.started,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "profile_path": self.profile_path,
+            **self.attributes,
+            "spans": self.spans,
+        }
+
+
+class MetricsRegistry:
+    """Aggregates finished traces into Prometheus counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._stages = {}
+        self._counters = dict.fromkeys(COUNTED_ATTRIBUTES.values(), 0.0)
+        self._peak_rss = 0
+
+    def observe(self, trace):
+        with self._lock:
+            key = (trace.name, trace.status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for entry in [{"stage": "total", "wall_seconds": trace.wall_seconds, "cpu_seconds": trace.cpu_seconds},
+                          *trace.spans]:
+                stage = self._stages.setdefault((trace.name, entry["stage"]), {
+                    "count": 0, "wall": 0.0, "cpu": 0.0, "buckets": [0] * len(DURATION_BUCKETS)})
+                stage["count"] += 1
+                stage["wall"] += entry["wall_seconds"]
+                stage["cpu"] += entry["cpu_seconds"]
+                for i, bound in enumerate(DURATION_BUCKETS):
+                    if entry["wall_seconds"] <= bound:
+                        stage["buckets"][i] += 1
+                for attribute, metric in COUNTED_ATTRIBUTES.items():
+                    if isinstance(entry.get(attribute), (int, float)):
+                        self._counters[metric] += entry[attribute]
+            self._peak_rss = max(self._peak_rss, trace.peak_rss_bytes or 0)
+
+    def summary(self):
+        """{(trace name, stage): {"count", "mean_wall_seconds", "mean_cpu_seconds"}}"""
+        with self._lock:
+            return {key: {"count": stage["count"],
+                          "mean_wall_seconds": round(stage["wall"] / stage["count"], 3),
+                          "mean_cpu_seconds": round(stage["cpu"] / stage["count"], 3)}
+                    for key, stage in self._stages.items()}
+
+    def render_prometheus(self):
+        with self._lock:
+            lines = ["# HELP speech_requests_total Finished requests by trace name and status.",
+                     "# TYPE speech_requests_total counter"]
+            for (name, status), count in sorted(self._requests.items()):
+                lines.append(f'speech_requests_total{{trace="{name}",status="{status}"}} {count}')
+
+            lines += ["# HELP speech_stage_seconds Wall time per stage.", "# TYPE speech_stage_seconds histogram"]
+            for (name, stage_name), stage in sorted(self._stages.items()):
+                labels = f'trace="{name}",stage="{stage_name}"'
+                for bound, count in zip(DURATION_BUCKETS, stage["buckets"]):
+                    lines.append(f'speech_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'speech_stage_seconds_bucket{{{labels},le="+Inf"}} {stage["count"]}')
+                lines.append(f"speech_stage_seconds_sum{{{labels}}} {stage['wall']:.6f}")
+                lines.append(f"speech_stage_seconds_count{{{labels}}} {stage['count']}")
+
+            lines += ["# HELP speech_stage_cpu_seconds_total CPU time of the thread running each stage.",
+                      "# TYPE speech_stage_cpu_seconds_total counter"]
+            for (name, stage_name), stage in sorted(self._stages.items()):
+                lines.append(f'speech_stage_cpu_seconds_total{{trace="{name}",stage="{stage_name}"}} '
+                             f'{stage["cpu"]:.6f}')
+
+            for metric, value in self._counters.items():
+                lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+            lines += ["# HELP process_peak_rss_bytes Peak resident set size of this process.",
+                      "# TYPE process_peak_rss_bytes gauge", f"process_peak_rss_bytes {self._peak_rss}"]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def _log_trace(trace):
+    path = os.getenv("METRICS_LOG_PATH")
+    if not path:
+        return
+    line = json.dumps(trace.to_dict(), default=float) + "\n"
+    # One write per trace keeps lines from concurrent requests intact
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+@contextlib.contextmanager
+def trace(name, profile=False, **attributes):
+    """Instrument one request; yields the Trace. Nested traces are recorded on their own."""
+    current = Trace(name, attributes)
+    token = _current_trace.set(current)
+    profiler = None
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profile_dir = os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR)
+            os.makedirs(profile_dir, exist_ok=True)
+            current.profile_path = os.path.join(profile_dir, f"{name}-{current.id}.prof")
+            profiler.dump_stats(current.profile_path)
+        current.finish()
+        _current_trace.reset(token)
+        registry.observe(current)
+        _log_trace(current)
+
+
+@contextlib.contextmanager
+def span(stage, **attributes):
+    """Time one stage of the current trace; yields a dict for attributes known only at the end."""
+    current = _current_trace.get()
+    entry = {"stage": stage, **attributes}
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield entry
+    finally:
+        if current is not None:
+            entry["wall_seconds"] = round(time.perf_counter() - wall_start, 4)
+            entry["cpu_seconds"] = round(time.thread_time() - cpu_start, 4)
+            current.spans.append(entry)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serve /metrics from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def start_metrics_server_from_env():
+    port = os.getenv("METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
@@ -0,0 +1,289 @@
+"""Persistent background jobs for the analysis pipeline.
+
+Jobs live in a SQLite table (WAL), so a submitted analysis survives
+Streamlit reruns, browser refreshes and app restarts, and every app process
+pointed at the same database sees the same jobs. A JobWorkerPool claims
+queued jobs with an immediate transaction, runs them on its own threads and
+keeps a heartbeat on each running job; jobs whose heartbeat stops (the process
+died) are put back in the queue. Running jobs publish a stage and partial
+output that pollers can show before the result is ready.
+
+Submissions carry an optional dedupe key: submitting the same work again while
+an earlier job is queued, running or done returns the earlier job.
+
+Run headless workers next to (or instead of) the app's in-process pool with:
+    python job_queue.py --workers 2
+"""
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_JOB_DB_PATH = os.path.join(os.path.expanduser("~"), ".cache", "speech_analysis", "jobs.sqlite3")
+DEFAULT_STALE_SECONDS = 120
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 3600
+HEARTBEAT_SECONDS = 10
+MAX_ATTEMPTS = 3
+# Minimum interval between partial-output writes for one job
+PROGRESS_INTERVAL = 0.5
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobStore:
+    def __init__(self, path=DEFAULT_JOB_DB_PATH, stale_seconds=DEFAULT_STALE_SECONDS,
+                 retention_seconds=DEFAULT_RETENTION_SECONDS):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.retention_seconds = retention_seconds
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    payload BLOB,
+                    dedupe_key TEXT,
+                    stage TEXT,
+                    partial TEXT,
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe_key ON jobs (dedupe_key)")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv("JOB_DB_PATH", DEFAULT_JOB_DB_PATH),
+            stale_seconds=float(os.getenv("JOB_STALE_SECONDS", DEFAULT_STALE_SECONDS)),
+        )
+
+    @contextlib.contextmanager
+    def _connect(self, immediate=False):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def submit(self, kind, params, payload=None, dedupe_key=None):
+        """Queue a job and return its id (or the id of an earlier job with the same dedupe_key)."""
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            if dedupe_key:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE dedupe_key = ? AND status != ? ORDER BY created_at DESC LIMIT 1",
+                    (dedupe_key, FAILED)
+                ).fetchone()
+                if row is not None:
+                    return row["id"]
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, payload, dedupe_key, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), payload, dedupe_key, now)
+            )
+        return job_id
+
+    def claim(self, worker, kinds):
+        """Mark the oldest queued job of one of the given kinds as running and return it with its payload."""
+        now = time.time()
+        placeholders = ", ".join("?" for _ in kinds)
+        with self._connect(immediate=True) as conn:
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = ? AND kind IN ({placeholders}) ORDER BY created_at LIMIT 1",
+                (QUEUED, *kinds)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ?, "
+                "stage = NULL, partial = NULL WHERE id = ?",
+                (RUNNING, worker, now, now, row["id"])
+            )
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def heartbeat(self, job_ids):
+        if not job_ids:
+            return
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND id IN ({placeholders})",
+                         (time.time(), RUNNING, *job_ids))
+
+    def update_progress(self, job_id, stage=None, partial=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = COALESCE(?, stage), partial = COALESCE(?, partial), heartbeat_at = ? "
+                "WHERE id = ? AND status = ?",
+                (stage, partial, time.time(), job_id, RUNNING)
+            )
+
+    def complete(self, job_id, result):
+        # The payload (uploaded audio) is dropped once the job has its result
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, payload = NULL, partial = NULL, finished_at = ? WHERE id = ?",
+                (DONE, json.dumps(result, default=float), time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                         (FAILED, str(error), time.time(), job_id))
+
+    def get(self, job_id):
+        """The job without its payload, with params and result decoded; None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, params, stage, partial, result, error, attempts, created_at, started_at, "
+                "finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def requeue_stale(self):
+        """Put running jobs whose worker stopped sending heartbeats back in the queue. Returns the count.
+
+        A job that has already been started MAX_ATTEMPTS times fails instead, so one that crashes its
+        worker process cannot take down every worker in turn.
+        """
+        cutoff = time.time() - self.stale_seconds
+        with self._connect(immediate=True) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                (FAILED, "The worker running this job stopped responding", time.time(), RUNNING, cutoff, MAX_ATTEMPTS)
+            )
+            return conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, cutoff)
+            ).rowcount
+
+    def purge(self):
+        """Delete finished jobs older than the retention period."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                         (DONE, FAILED, time.time() - self.retention_seconds))
+
+    def counts(self):
+        with self._connect() as conn:
+            return {row["status"]: row["n"] for row in
+                    conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()}
+
+
+class JobWorkerPool:
+    """Worker threads that run queued jobs with handlers[kind](params, payload, progress).
+
+    progress(stage=None, partial=None) publishes the job's current stage and
+    partial output; partial writes are throttled to one per PROGRESS_INTERVAL.
+    partial may be a callable, which is only called when a write is due.
+    The handler's return value (JSON-serializable) becomes the job result.
+    """
+
+    def __init__(self, store, handlers, workers=2, poll_interval=0.5):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        self._threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _progress(self, job_id):
+        last_write = [0.0]
+
+        def progress(stage=None, partial=None):
+            now = time.monotonic()
+            if stage is None and now - last_write[0] < PROGRESS_INTERVAL:
+                return
+            last_write[0] = now
+            if callable(partial):
+                partial = partial()
+            self.store.update_progress(job_id, stage, partial)
+        return progress
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self.store.claim(self.worker_id, list(self.handlers))
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            with self._running_lock:
+                self._running.add(job["id"])
+            try:
+                result = self.handlers[job["kind"]](job["params"], job["payload"], self._progress(job["id"]))
+                self.store.complete(job["id"], result)
+            except Exception as e:
+                self.store.fail(job["id"], e)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job["id"])
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                self.store.heartbeat(running)
+                self.store.requeue_stale()
+                self.store.purge()
+            except sqlite3.Error:
+                pass
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background analysis workers against the job database.")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    from main import JOB_HANDLERS
+    pool = JobWorkerPool(JobStore.from_env(), JOB_HANDLERS, workers=args.workers)
+    print(f"{args.workers} worker(s) polling {pool.store.path}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pool.stop()
@@ -0,0 +1,105 @@
+"""SQLite-backed cache for LLM responses, with an offline replay mode.
+
+Responses are keyed by the exact prompt, model, temperature and response format. Entries expire
+after a TTL and the least recently used ones are evicted once the cache holds
+more than max_entries. In replay mode a cache miss raises ReplayCacheMiss
+instead of letting the caller reach the API.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "speech_analysis", "llm_responses.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class ReplayCacheMiss(LookupError):
+    """Raised in replay mode when no cached response exists for a request."""
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES,
+                 replay=False):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.replay = replay
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @classmethod
+    def from_env(cls):
+        ttl_hours = os.getenv("LLM_CACHE_TTL_HOURS")
+        max_entries = os.getenv("LLM_CACHE_MAX_ENTRIES")
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl_seconds=float(ttl_hours) * 3600 if ttl_hours else DEFAULT_TTL_SECONDS,
+            max_entries=int(max_entries) if max_entries else DEFAULT_MAX_ENTRIES,
+            replay=os.getenv("LLM_REPLAY", "").lower() in ("1", "true", "yes"),
+        )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(prompt, model, temperature, response_format=None):
+        request = f"{model}|{temperature!r}|{prompt}"
+        # Requests constrained to a response format (e.g. a JSON schema) get their own entries
+        if response_format is not None:
+            request += "|" + json.dumps(response_format, sort_keys=True)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            # Replayed runs keep serving stale entries rather than failing
+            if self.ttl_seconds and now - created_at > self.ttl_seconds and not self.replay:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return response
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            if self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            if self.max_entries:
+                conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,)
+                )
@@ -0,0 +1,365 @@
+"""Shared async OpenAI client for the analysis calls.
+
+All requests run on one background event loop that owns a pooled
+AsyncOpenAI/httpx client, so Streamlit sessions (threads) and the batch runner
+share the same connections, concurrency limit and rate limiters. Requests are
+throttled by token buckets for requests and tokens per minute and retried with
+jittered exponential backoff on 429s, timeouts and 5xx errors.
+
+Point OPENAI_BASE_URL at a local stub server to exercise it without the API.
+"""
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+import openai
+
+from llm_cache import ReplayCacheMiss, ResponseCache
+from prompt_budget import count_tokens
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+@dataclass
+class LLMResult:
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    retries: int = 0
+    cached: bool = False
+
+
+def estimate_tokens(prompt, max_tokens=None, model="gpt-4o-mini"):
+    """Token estimate (prompt plus expected completion) used for tokens-per-minute budgeting."""
+    return count_tokens(prompt, model) + (max_tokens or 1500)
+
+
+def new_usage():
+    return {"requests": 0, "cached_requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0,
+            "trimmed_prompts": 0}
+
+
+def record_usage(usage, result):
+    """Add one LLMResult to a usage dict from new_usage(); cached results spend no tokens."""
+    if usage is None:
+        return
+    usage["requests"] += 1
+    if result.cached:
+        usage["cached_requests"] += 1
+        return
+    usage["prompt_tokens"] += result.prompt_tokens or 0
+    usage["completion_tokens"] += result.completion_tokens or 0
+    usage["retries"] += result.retries
+
+
+def _usage_counts(reported, prompt, text, model):
+    """(prompt_tokens, completion_tokens) from the API's usage, counted locally if it sent none."""
+    if isinstance(reported, dict):
+        return reported.get("prompt_tokens"), reported.get("completion_tokens")
+    if reported is not None:
+        return reported.prompt_tokens, reported.completion_tokens
+    return count_tokens(prompt, model), count_tokens(text or "", model)
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # A single request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class StreamedCompletion:
+    """Synchronous iterator over text chunks produced on the client's event loop.
+
+    The chunks seen so far are available as .text, which holds the complete
+    response once iteration has finished.
+    """
+
+    _END = object()
+
+    def __init__(self, async_iterator, loop):
+        self._queue = queue.Queue()
+        self._pieces = []
+        self.done = False
+        self._future = asyncio.run_coroutine_threadsafe(self._pump(async_iterator), loop)
+
+    async def _pump(self, async_iterator):
+        try:
+            async for piece in async_iterator:
+                self._queue.put(piece)
+        except BaseException as e:
+            self._queue.put(e)
+        finally:
+            self._queue.put(self._END)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.done:
+            raise StopIteration
+        item = self._queue.get()
+        if isinstance(item, BaseException):
+            self.done = True
+            raise item
+        if item is self._END:
+            self.done = True
+            raise StopIteration
+        self._pieces.append(item)
+        return item
+
+    @property
+    def text(self):
+        return "".join(self._pieces)
+
+
+class AsyncLLMClient:
+    def __init__(self, api_key=None, base_url=None, max_concurrency=8, requests_per_minute=500,
+                 tokens_per_minute=200000, max_retries=5, base_delay=1.0, max_delay=30.0, timeout=120.0,
+                 max_connections=20, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache = cache
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Created on the background loop the first time a request needs the API
+        self._client = None
+        self._semaphore = None
+        self._request_bucket = None
+        self._token_bucket = None
+
+    @classmethod
+    def from_env(cls, cache=None):
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+            tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+            cache=cache,
+        )
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client-loop", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _ensure_client(self):
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=self.timeout,
+            )
+            # Retries are handled here so they can respect the shared rate limiters
+            self._client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                              http_client=http_client)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._request_bucket = TokenBucket(self.requests_per_minute)
+            self._token_bucket = TokenBucket(self.tokens_per_minute)
+        return self._client
+
+    def _retry_delay(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def _open(self, client, prompt, model, temperature, max_tokens=None, response_format=None, stream=False):
+        """Send one request through the rate limiters and retry policy. Returns (response, retries)."""
+        kwargs = {}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        if stream:
+            kwargs["stream"] = True
+            # Ask for a final chunk carrying token usage
+            kwargs["extra_body"] = {"stream_options": {"include_usage": True}}
+
+        await self._request_bucket.acquire(1)
+        await self._token_bucket.acquire(estimate_tokens(prompt, max_tokens, model))
+        attempt = 0
+        while True:
+            try:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    **kwargs
+                )
+                return response, attempt
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt, e))
+                attempt += 1
+                await self._request_bucket.acquire(1)
+
+    async def _create(self, prompt, model, temperature, max_tokens=None, response_format=None):
+        client = self._ensure_client()
+        async with self._semaphore:
+            response, retries = await self._open(client, prompt, model, temperature, max_tokens, response_format)
+
+        text = response.choices[0].message.content
+        prompt_tokens, completion_tokens = _usage_counts(response.usage, prompt, text, model)
+        return LLMResult(text=text, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, retries=retries)
+
+    async def _cached(self, prompt, model, temperature, response_format=None):
+        """Return (cache_key, cached_text); raises ReplayCacheMiss on a miss in replay mode."""
+        if self.cache is None:
+            return None, None
+        cache_key = self.cache.make_key(prompt, model, temperature, response_format)
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached is None and self.cache.replay:
+            raise ReplayCacheMiss(f"No cached response for request {cache_key[:12]} (replay mode)")
+        return cache_key, cached
+
+    async def _complete(self, prompt, model, temperature, max_tokens=None, response_format=None, validate=None):
+        cache_key, cached = await self._cached(prompt, model, temperature, response_format)
+        # Entries cached before validation existed are served only if they still pass (or in replay mode)
+        if cached is not None and (validate is None or self.cache.replay or validate(cached)):
+            return LLMResult(text=cached, cached=True)
+
+        result = await self._create(prompt, model, temperature, max_tokens, response_format)
+        if self.cache is not None and (validate is None or validate(result.text)):
+            await asyncio.to_thread(self.cache.put, cache_key, model, result.text)
+        return result
+
+    async def astream(self, prompt, model, temperature, max_tokens=None, usage=None):
+        """Yield completion text as it is generated. Must be iterated on the shared loop.
+
+        Retries only cover opening the stream; the full text is cached once the
+        stream finishes, and cached responses are yielded as a single chunk.
+        Token usage is added to `usage` (see new_usage) when the stream ends.
+        """
+        cache_key, cached = await self._cached(prompt, model, temperature)
+        if cached is not None:
+            record_usage(usage, LLMResult(text=cached, cached=True))
+            yield cached
+            return
+
+        client = self._ensure_client()
+        pieces = []
+        reported = None
+        async with self._semaphore:
+            response, retries = await self._open(client, prompt, model, temperature, max_tokens, stream=True)
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    pieces.append(chunk.choices[0].delta.content)
+                    yield pieces[-1]
+                reported = getattr(chunk, "usage", None) or reported
+
+        text = "".join(pieces)
+        prompt_tokens, completion_tokens = _usage_counts(reported, prompt, text, model)
+        record_usage(usage, LLMResult(text=text, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                      retries=retries))
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, model, text)
+
+    async def acomplete(self, prompt, model, temperature, max_tokens=None, response_format=None, validate=None):
+        """Complete a prompt from any event loop; the request itself runs on the shared loop.
+
+        validate(text) -> bool decides whether a response may be cached (and served from the cache);
+        rejected responses are still returned, so the caller can handle them.
+        """
+        loop = self._ensure_loop()
+        coro = self._complete(prompt, model, temperature, max_tokens, response_format, validate)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def complete(self, prompt, model, temperature, max_tokens=None, response_format=None, validate=None):
+        """Blocking wrapper for callers that are not running an event loop."""
+        loop = self._ensure_loop()
+        coro = self._complete(prompt, model, temperature, max_tokens, response_format, validate)
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def stream(self, prompt, model, temperature, max_tokens=None, usage=None):
+        """Blocking iterator over completion text chunks; see StreamedCompletion."""
+        return self.iterate(self.astream(prompt, model, temperature, max_tokens, usage))
+
+    def iterate(self, async_iterator):
+        """Consume an async iterator on the shared loop from synchronous code."""
+        return StreamedCompletion(async_iterator, self._ensure_loop())
+
+    def run(self, coro):
+        """Run a coroutine (e.g. a gather of acomplete calls) on the shared loop and wait for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = self._thread = self._client = None
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_client():
+    """Process-wide client; module state survives Streamlit script reruns."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = AsyncLLMClient.from_env(cache=ResponseCache.from_env())
+        return _shared_client
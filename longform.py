@@ -0,0 +1,135 @@
+"""Chunked, parallel transcription for long recordings.
+
+The decoded audio is cut near every chunk_seconds at the quietest frame
+(energy VAD from pause_analysis), each chunk is padded with a small overlap
+and transcribed with word timestamps in a pool of worker processes, one
+Whisper model per worker. Words and segments are shifted back to absolute
+time and each chunk keeps only those whose midpoint falls inside the part of
+the timeline it owns, which removes the duplicates from the overlaps.
+
+LongFormTranscriber exposes the same transcribe(samples, **options) call as a
+Whisper model, so it can be passed to transcribe_audio in its place.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pause_analysis import HOP_SECONDS, SAMPLE_RATE, frame_rms_db, iter_array_blocks
+
+DEFAULT_CHUNK_SECONDS = 30
+DEFAULT_OVERLAP_SECONDS = 1.0
+SEARCH_SECONDS = 5.0
+
+_worker_model = None
+
+
+def _init_worker(model_name, backend, threads):
+    global _worker_model
+    from asr_backends import load_asr_model
+    if backend != "faster-whisper":
+        import torch
+        torch.set_num_threads(threads)
+    _worker_model = load_asr_model(model_name, backend, threads=threads)
+
+
+def _transcribe_chunk(samples, offset, own_start, own_end, decode_options):
+    # Word timings are needed to stitch chunks; callers may ask for them too
+    options = {**decode_options, "word_timestamps": True, "condition_on_previous_text": False}
+    result = _worker_model.transcribe(samples, **options)
+    words, segments = [], []
+    for segment in result["segments"]:
+        start, end = segment["start"] + offset, segment["end"] + offset
+        segment_words = []
+        for word in segment.get("words", []):
+            word_start, word_end = word["start"] + offset, word["end"] + offset
+            if own_start <= (word_start + word_end) / 2 < own_end:
+                segment_words.append({**word, "start": word_start, "end": word_end})
+        # Segments without word timings fall back to their own midpoint
+        if segment_words or (not segment.get("words") and own_start <= (start + end) / 2 < own_end):
+            words.extend(segment_words)
+            segments.append({
+                "start": segment_words[0]["start"] if segment_words else start,
+                "end": segment_words[-1]["end"] if segment_words else end,
+                "text": "".join(w["word"] for w in segment_words) if segment_words else segment["text"],
+                "avg_logprob": segment.get("avg_logprob"),
+                "no_speech_prob": segment.get("no_speech_prob"),
+                "words": segment_words,
+            })
+    return {"segments": segments, "words": words, "language": result.get("language")}
+
+
+def plan_chunks(samples, sample_rate=SAMPLE_RATE, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+    """Return [(start_sample, end_sample, own_start_s, own_end_s)] with cuts at quiet frames."""
+    duration = len(samples) / sample_rate
+    if duration <= chunk_seconds * 1.5:
+        return [(0, len(samples), 0.0, float("inf"))]
+
+    energy_db, _ = frame_rms_db(iter_array_blocks(samples, sample_rate), sample_rate)
+    search_frames = int(min(SEARCH_SECONDS, chunk_seconds / 3) / HOP_SECONDS)
+    cuts = [0.0]
+    target = chunk_seconds
+    while target < duration - chunk_seconds / 3:
+        window_end = min(int(target / HOP_SECONDS), len(energy_db))
+        window_start = max(window_end - search_frames, int(cuts[-1] / HOP_SECONDS) + 1)
+        quietest = window_start + int(np.argmin(energy_db[window_start:window_end]))
+        cuts.append(quietest * HOP_SECONDS)
+        target = cuts[-1] + chunk_seconds
+    cuts.append(duration)
+
+    chunks = []
+    for i, (own_start, own_end) in enumerate(zip(cuts[:-1], cuts[1:])):
+        start = max(0, int((own_start - overlap_seconds) * sample_rate))
+        end = min(len(samples), int((own_end + overlap_seconds) * sample_rate))
+        chunks.append((start, end, own_start if i else float("-inf"),
+                       own_end if i < len(cuts) - 2 else float("inf")))
+    return chunks
+
+
+class LongFormTranscriber:
+    def __init__(self, model_name, backend="whisper", workers=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                 overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_worker, initargs=(model_name, backend, threads))
+
+    @classmethod
+    def from_env(cls, model_name, backend="whisper"):
+        workers = os.getenv("LONGFORM_WORKERS")
+        return cls(
+            model_name,
+            backend=backend,
+            workers=int(workers) if workers else None,
+            chunk_seconds=float(os.getenv("LONGFORM_CHUNK_SECONDS", DEFAULT_CHUNK_SECONDS)),
+            overlap_seconds=float(os.getenv("LONGFORM_OVERLAP_SECONDS", DEFAULT_OVERLAP_SECONDS)),
+        )
+
+    def transcribe(self, samples, **decode_options):
+        """Same call and result shape as whisper's model.transcribe, for 16 kHz mono float32 samples."""
+        chunks = plan_chunks(samples, SAMPLE_RATE, self.chunk_seconds, self.overlap_seconds)
+        futures = [
+            self._pool.submit(_transcribe_chunk, samples[start:end], start / SAMPLE_RATE, own_start, own_end,
+                              decode_options)
+            for start, end, own_start, own_end in chunks
+        ]
+        results = [future.result() for future in futures]
+
+        segments = [segment for result in results for segment in result["segments"]]
+        for i, segment in enumerate(segments):
+            segment["id"] = i
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "words": [word for result in results for word in result["words"]],
+            "language": next((result["language"] for result in results if result["language"]), None),
+        }
+
+    def close(self):
+        self._pool.shutdown()
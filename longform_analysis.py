@@ -0,0 +1,210 @@
+"""Map-reduce analysis for long recordings.
+
+The transcript is split into segments of about SEGMENT_TARGET_WORDS words,
+on Whisper segment boundaries when timestamps are available and on sentence
+boundaries otherwise. Each segment gets a short JSON-answering request (the
+map step, run concurrently on the shared client), and its fillers and
+speaking rate are measured locally. The findings are then reduced locally --
+error counts by type, median CEFR signals, example errors, topic outline --
+into a compact block that the final report prompt includes in place of the
+full transcript, next to evenly spaced excerpts of at most EXCERPT_TOKENS
+tokens for quoting. Per-segment prompts have a fixed size, so latency stays
+roughly flat as recordings get longer.
+"""
+import asyncio
+import json
+import os
+import re
+
+import numpy as np
+
+from llm_cache import ReplayCacheMiss
+from llm_client import record_usage
+from metrics import compute_text_metrics
+from prompts import SEGMENT_FINDINGS_HEADER, SEGMENT_PROMPT
+
+SEGMENT_TARGET_WORDS = 250
+# Transcript excerpts kept in the final report prompt next to the findings
+EXCERPT_TOKENS = int(os.getenv("LONGFORM_EXCERPT_TOKENS", "1000"))
+CEFR_LEVELS = ("A1", "A2", "B1", "B2", "C1", "C2")
+CEFR_CATEGORIES = ("grammar", "vocabulary", "fluency", "coherence")
+MAX_EXAMPLES = 12
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _format_time(seconds):
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+
+def _group(pieces, target_words):
+    """Group consecutive (text, start, end) pieces into segments of about target_words words."""
+    segments, current, words = [], [], 0
+    for piece in pieces:
+        current.append(piece)
+        words += len(piece[0].split())
+        if words >= target_words:
+            segments.append(current)
+            current, words = [], 0
+    # A short tail joins the previous segment instead of becoming its own request
+    if current:
+        if segments and words < target_words / 3:
+            segments[-1].extend(current)
+        else:
+            segments.append(current)
+    return [{"text": " ".join(p[0].strip() for p in group).strip(), "start": group[0][1], "end": group[-1][2]}
+            for group in segments]
+
+
+def segment_transcript(text, transcript_segments=None, audio_duration=None, target_words=SEGMENT_TARGET_WORDS):
+    """Split a transcript into [{"text", "start", "end"}]; times are None when unknown.
+
+    Whisper segments are used when they still match the text (i.e. it was not
+    edited); otherwise sentences are grouped and times are interpolated from
+    audio_duration by word position.
+    """
+    if transcript_segments and " ".join(" ".join(s["text"].split()) for s in transcript_segments) == \
+            " ".join(text.split()):
+        return _group([(s["text"], s["start"], s["end"]) for s in transcript_segments], target_words)
+
+    pieces = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        words = sentence.split()
+        # Unpunctuated transcripts are cut every target_words words
+        for i in range(0, len(words), target_words):
+            pieces.append(" ".join(words[i:i + target_words]))
+    segments = _group([(piece, None, None) for piece in pieces if piece], target_words)
+    if audio_duration:
+        word_counts = np.array([len(segment["text"].split()) for segment in segments])
+        bounds = np.concatenate([[0], np.cumsum(word_counts)]) / max(1, word_counts.sum()) * audio_duration
+        for segment, start, end in zip(segments, bounds[:-1], bounds[1:]):
+            segment["start"], segment["end"] = float(start), float(end)
+    return segments
+
+
+def parse_findings(text):
+    """The JSON object in a map response, or {} if there is none."""
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return {}
+    try:
+        findings = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    return findings if isinstance(findings, dict) else {}
+
+
+def segment_prompt(segment, position, total, language_hint=None):
+    time_range = ""
+    if segment["start"] is not None:
+        time_range = f" ({_format_time(segment['start'])}-{_format_time(segment['end'])})"
+    language_hint_text = f"The speaker's likely native language is {language_hint}." if language_hint else ""
+    return SEGMENT_PROMPT.format(position=position, total=total, time_range=time_range,
+                                 language_hint_text=language_hint_text, transcript=segment["text"])
+
+
+async def analyze_segments_async(client, segments, model, temperature, language_hint=None, usage=None):
+    """Map step: one request per segment, concurrently. Failed segments get empty findings."""
+    async def analyze_one(position, segment):
+        prompt = segment_prompt(segment, position, len(segments), language_hint)
+        try:
+            result = await client.acomplete(prompt, model, temperature, max_tokens=800,
+                                            response_format={"type": "json_object"})
+        except ReplayCacheMiss:
+            raise
+        except Exception:
+            return {}
+        record_usage(usage, result)
+        return parse_findings(result.text)
+
+    return await asyncio.gather(*(analyze_one(i, segment) for i, segment in enumerate(segments, 1)))
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else []
+
+
+def reduce_findings(segments, findings):
+    """Reduce step: combine per-segment findings and local measurements into one summary dict."""
+    error_counts, errors, misused, risks, advanced = {}, [], [], {}, []
+    levels = {category: [] for category in CEFR_CATEGORIES}
+    outline = []
+    for segment, found in zip(segments, findings):
+        when = _format_time(segment["start"]) if segment["start"] is not None else None
+        for error in _as_list(found.get("grammar_errors")):
+            if not isinstance(error, dict):
+                continue
+            error_type = str(error.get("type") or "other").lower()
+            error_counts[error_type] = error_counts.get(error_type, 0) + 1
+            errors.append({**error, "at": when})
+        vocabulary = found.get("vocabulary") if isinstance(found.get("vocabulary"), dict) else {}
+        advanced.extend(str(word) for word in _as_list(vocabulary.get("advanced")))
+        misused.extend(item for item in _as_list(vocabulary.get("misused")) if isinstance(item, dict))
+        for risk in _as_list(found.get("pronunciation_risks")):
+            if isinstance(risk, dict) and risk.get("word"):
+                risks.setdefault(str(risk["word"]).lower(), risk.get("issue"))
+        signals = found.get("cefr_signals") if isinstance(found.get("cefr_signals"), dict) else {}
+        for category in CEFR_CATEGORIES:
+            level = str(signals.get(category, "")).upper()[:2]
+            if level in CEFR_LEVELS:
+                levels[category].append(CEFR_LEVELS.index(level))
+
+        metrics = compute_text_metrics(segment["text"], audio_duration=(
+            segment["end"] - segment["start"] if segment["start"] is not None else None))
+        outline.append({
+            "at": when,
+            "words": metrics["word_count"],
+            "fillers": metrics.get("total_fillers", 0),
+            "words_per_minute": metrics.get("words_per_minute"),
+            "topics": [str(topic) for topic in _as_list(found.get("topics"))][:3],
+            "assessed": bool(found),
+        })
+
+    cefr = {}
+    for category, values in levels.items():
+        if values:
+            cefr[category] = {
+                "median": CEFR_LEVELS[int(np.median(values))],
+                "range": f"{CEFR_LEVELS[min(values)]}-{CEFR_LEVELS[max(values)]}",
+            }
+    return {
+        "segments": len(segments),
+        "segments_assessed": sum(1 for found in findings if found),
+        "grammar_error_counts": dict(sorted(error_counts.items(), key=lambda item: -item[1])),
+        "grammar_error_examples": errors[:MAX_EXAMPLES],
+        "advanced_vocabulary": list(dict.fromkeys(advanced))[:MAX_EXAMPLES * 2],
+        "misused_vocabulary": misused[:MAX_EXAMPLES],
+        "pronunciation_risks": [{"word": word, "issue": issue} for word, issue in list(risks.items())[:MAX_EXAMPLES]],
+        "cefr_signals": cefr,
+        "outline": outline,
+    }
+
+
+def format_findings_for_prompt(summary):
+    lines = [SEGMENT_FINDINGS_HEADER,
+             f"- Segments assessed: {summary['segments_assessed']} of {summary['segments']}"]
+    if summary["cefr_signals"]:
+        lines.append("- CEFR signals across segments: " + "; ".join(
+            f"{category} {signal['median']} (range {signal['range']})"
+            for category, signal in summary["cefr_signals"].items()))
+    counts = summary["grammar_error_counts"]
+    lines.append(f"- Grammar errors found: {sum(counts.values())}"
+                 + (" (" + ", ".join(f"{kind}: {count}" for kind, count in counts.items()) + ")" if counts else ""))
+    for error in summary["grammar_error_examples"]:
+        at = f"[{error['at']}] " if error.get("at") else ""
+        lines.append(f"  - {at}\"{error.get('quote', '')}\" -> \"{error.get('correction', '')}\" "
+                     f"({error.get('type', 'other')})")
+    if summary["advanced_vocabulary"]:
+        lines.append("- Advanced vocabulary used well: " + ", ".join(summary["advanced_vocabulary"]))
+    for item in summary["misused_vocabulary"]:
+        lines.append(f"  - Misused: \"{item.get('quote', '')}\" -> {item.get('suggestion', '')}")
+    if summary["pronunciation_risks"]:
+        lines.append("- Likely pronunciation difficulties: " + "; ".join(
+            f"{risk['word']} ({risk['issue']})" if risk["issue"] else risk["word"]
+            for risk in summary["pronunciation_risks"]))
+    lines.append("- Segment outline:")
+    for i, segment in enumerate(summary["outline"], 1):
+        at = f" [{segment['at']}]" if segment["at"] else ""
+        rate = f", {segment['words_per_minute']} wpm" if segment["words_per_minute"] else ""
+        topics = ", ".join(segment["topics"]) or ("not assessed" if not segment["assessed"] else "-")
+        lines.append(f"  {i}.{at} {segment['words']} words, {segment['fillers']} fillers{rate}: {topics}")
+    return "\n".join(lines) + "\n"
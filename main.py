@@ -1,57 +1,163 @@
-import streamlit as st
-import tempfile
-import os
-import json
-import whisper
-import pronouncing
-from openai import OpenAI
+import asyncio
 import base64
-import librosa
+import hashlib
+import json
+import os
+import time
 
-# Set page config
-st.set_page_config(
-    page_title="English Pronunciation Analyzer",
-    page_icon="🎙️",
-    layout="wide"
-)
+import streamlit as st
 
-import os
-from openai import OpenAI
+from asr_backends import DEFAULT_BACKEND, DEFAULT_MODEL_SIZE, backend_tag, load_asr_model
+from audio_io import DecodedAudio, decode_audio_bytes, decode_audio_file
+from incremental_analysis import plan_update
+from inference_service import WhisperInferenceService, active_service
+from instrumentation import registry, span, start_metrics_server_from_env, trace
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobStore, JobWorkerPool
+from llm_cache import ReplayCacheMiss
+from llm_client import get_shared_client, new_usage, record_usage
+from longform import LongFormTranscriber
+from longform_analysis import (EXCERPT_TOKENS, analyze_segments_async, format_findings_for_prompt, reduce_findings,
+                               segment_transcript)
+from metrics import compute_text_metrics, format_metrics_for_prompt, tokenize
+from pause_analysis import analyze_pauses_array, format_pauses_for_prompt
+from prompt_budget import DEFAULT_PROMPT_TOKEN_BUDGET, PHONEME_SHARE, count_tokens, encode_phonemes, sample_transcript
+from prompts import (ANALYSIS_SECTIONS, FORMAT_INSTRUCTION, LEVEL_GUIDELINES, PRECOMPUTED_METRICS_HEADER, PROMPT_INTRO,
+                     PRONUNCIATION_EVIDENCE_HEADER, SECTION_GROUPS, closing_instructions, group_instruction,
+                     merge_sections, sections_text, split_sections)
+from pronunciation_index import get_shared_index
+from pronunciation_scoring import format_scores_for_prompt, recognized_words, score_pronunciation
+from recording_stream import RecordingStreams, start_recording_server_from_env
+from structured_report import (ReportValidationError, json_instruction, order_report, parse_report, render_markdown,
+                               repair_prompt, response_format)
+from transcript_cache import TranscriptCache, audio_fingerprint
+
+ANALYSIS_MODEL = "gpt-4o-mini"
+ANALYSIS_TEMPERATURE = 0.2
+
+# Shared async OpenAI client with rate limiting, retries and the response cache.
+# LLM_REPLAY=1 serves only cached responses and never calls the API.
+llm_client = get_shared_client()
 
 api_key = os.getenv("OPENAI_API_KEY")  # Ensure this is set in Streamlit Cloud secrets
-if not api_key:
+if not api_key and not llm_client.cache.replay:
     raise ValueError("API key is missing!")
-client = OpenAI(api_key=api_key)
 
 
-# Load Whisper model (cache it)
+# Model size (tiny/base/small) and CPU backend, from WHISPER_MODEL / WHISPER_BACKEND.
+# WHISPER_MODEL_NAME tags cached transcripts, so each size/backend keeps its own entries.
+WHISPER_MODEL_SIZE = DEFAULT_MODEL_SIZE
+WHISPER_BACKEND = DEFAULT_BACKEND
+WHISPER_MODEL_NAME = backend_tag(WHISPER_MODEL_SIZE, WHISPER_BACKEND)
+
+
+# Load Whisper model (cache it). whisper/torch are imported by the loader, not at module load,
+# so the text-only path never pays for the ASR stack.
 @st.cache_resource
 def load_whisper_model():
-    return whisper.load_model("base")
+    return load_asr_model(WHISPER_MODEL_SIZE, WHISPER_BACKEND)
 
 
-# Transcribe audio with Whisper
-def transcribe_audio(audio_path, model):
-    result = model.transcribe(audio_path)
-    return result["text"]
+# Shared inference queue in front of the Whisper model, used by every session
+@st.cache_resource
+def get_inference_service():
+    return WhisperInferenceService.from_env(load_whisper_model(), job_workers=JOB_WORKERS)
 
 
-# Phonetic analysis
-def analyze_phonetics(text):
-    words = text.lower().split()
-    phoneme_analysis = {}
-    for word in words:
-        clean_word = ''.join(e for e in word if e.isalnum())
-        if clean_word:
-            phonemes = pronouncing.phones_for_word(clean_word)
-            phoneme_analysis[clean_word] = phonemes if phonemes else "No phoneme found"
-    return phoneme_analysis
+# Ask Whisper for word timings and probabilities, used for local pronunciation scoring.
+# The inference service still micro-batches these clips and aligns their words afterwards.
+WORD_CONFIDENCE_ENABLED = os.getenv("WORD_CONFIDENCE", "1").lower() in ("1", "true", "yes")
 
+# Recordings at least this long are transcribed in parallel chunks
+LONGFORM_ENABLED = os.getenv("LONGFORM_ENABLED", "1").lower() in ("1", "true", "yes")
+LONGFORM_MIN_SECONDS = float(os.getenv("LONGFORM_MIN_SECONDS", "120"))
+
+
+# Worker pool for chunked long-form transcription (one model per worker process)
+@st.cache_resource
+def load_long_form_transcriber():
+    return LongFormTranscriber.from_env(WHISPER_MODEL_SIZE, WHISPER_BACKEND)
 
-# Analyze speech with GPT
-def analyze_speech(text, phoneme_data, audio_duration=None, word_count=None, language_hint=None, expected_topic=None):
-    """Use GPT to analyze pronunciation, grammar & MTI with comprehensive metrics"""
 
+# Recordings streamed from the browser while the user speaks. The recorder submits the browser's own
+# transcript, so Whisper only runs on the pieces as they arrive when RECORDING_TRANSCRIBE asks for it
+# (e.g. when that transcript is not trusted); otherwise the model is loaded only if a job needs it.
+RECORDING_TRANSCRIBE = os.getenv("RECORDING_TRANSCRIBE", "").lower() in ("1", "true", "yes")
+
+
+def transcribe_recording_piece(samples):
+    decode_options = {"word_timestamps": True} if WORD_CONFIDENCE_ENABLED else {}
+    return get_inference_service().transcribe(samples, **decode_options)
+
+
+@st.cache_resource
+def get_recording_streams():
+    return RecordingStreams.from_env(transcribe=transcribe_recording_piece if RECORDING_TRANSCRIBE else None)
+
+
+# Chunk upload endpoint for the recorder (RECORDING_PORT); None means the recorder posts the whole recording at Stop
+@st.cache_resource
+def start_recording_ingest():
+    return start_recording_server_from_env(get_recording_streams())
+
+
+# Pick (and load on first use) the transcriber for a recording; returns (transcriber, model name for the cache key)
+def select_transcriber(audio):
+    if LONGFORM_ENABLED and audio.duration >= LONGFORM_MIN_SECONDS:
+        return load_long_form_transcriber(), f"{WHISPER_MODEL_NAME}-longform"
+    return get_inference_service(), WHISPER_MODEL_NAME
+
+
+# Persistent transcript cache shared by all sessions
+@st.cache_resource
+def get_transcript_cache():
+    return TranscriptCache.from_env()
+
+
+# Transcribe audio with Whisper, reusing a cached transcript for identical audio.
+# `audio` is a DecodedAudio (preferred: no second decode) or a file path.
+# With return_result=True the whole result (text, segments, language) is returned instead of the text.
+def transcribe_audio(audio, model, cache=None, model_name=WHISPER_MODEL_NAME, return_result=False, **decode_options):
+    cache_key = None
+    if cache is not None:
+        if isinstance(audio, DecodedAudio):
+            fingerprint = audio.fingerprint
+        else:
+            with open(audio, "rb") as f:
+                fingerprint = audio_fingerprint(f.read())
+        cache_key = cache.make_key(fingerprint, model_name, decode_options)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached if return_result else cached["text"]
+
+    result = model.transcribe(audio.samples if isinstance(audio, DecodedAudio) else audio, **decode_options)
+    if cache is not None:
+        cache.put(cache_key, result)
+    return result if return_result else result["text"]
+
+
+# Phonetic analysis; words in `known` (the phoneme data of an earlier version of the text) are not looked up again
+def analyze_phonetics(text, known=None):
+    words = tokenize(text)
+    known = known or {}
+    # One batch lookup over the distinct words; out-of-dictionary words get a spelling-based estimate
+    pronunciations = get_shared_index().lookup([word for word in words if word not in known])
+    return {word: known[word] if word in known else pronunciations[word] or "No phoneme found" for word in words}
+
+
+# Build the analysis prompt sent to GPT
+def build_analysis_prompt(text, phoneme_data, audio_duration=None, word_count=None, language_hint=None,
+                          expected_topic=None, metrics=None, pause_metrics=None, pronunciation_scores=None,
+                          segment_findings=None, section_numbers=None, token_budget=None, usage=None,
+                          structured=False):
+    """Full 15-section protocol, or only the given sections when section_numbers is set
+
+    structured=True asks for the sections as JSON (see structured_report) instead of markdown.
+    With segment_findings (long form) the transcript itself is cut to excerpts of at most LONGFORM_EXCERPT_TOKENS.
+
+    Prompts over token_budget (ANALYSIS_PROMPT_TOKEN_BUDGET by default) get a shorter phonetic table and
+    transcript excerpts; trimmed prompts are counted in usage["trimmed_prompts"].
+    """
+    token_budget = token_budget or DEFAULT_PROMPT_TOKEN_BUDGET
     # Calculate speaking rate if available
     speaking_rate = None
     if audio_duration and word_count:
@@ -60,279 +166,659 @@ def analyze_speech(text, phoneme_data, audio_duration=None, word_count=None, lan
     language_hint_text = f"The speaker's likely native language is {language_hint}." if language_hint else ""
     expected_topic_text = f"Expected speaking topic: {expected_topic}" if expected_topic else "No specific topic was provided for relevance assessment."
 
-    prompt = f"""
-    # Comprehensive English Speech Analysis Protocol
-
-    Analyze the provided English speech transcript according to these precise guidelines to generate a standardized assessment report.
-
-    ## Input Data
-
-    - **Speech Transcript:** "{text}"
-    - **Phonetic Data:** {json.dumps(phoneme_data, indent=2)}
-    - **Speaking Rate:** {speaking_rate} words per minute (if available)
-    - **Language Background:** {language_hint_text}
-    - **Expected Topic:** {expected_topic_text}
-
-    ## Advanced Level Differentiation Guidelines
-
-    ### CEFR Level Granular Markers
-
-    #### A1-A2 Specific Indicators:
-    - Vocabulary Range: 300-1500 words
-    - Primarily simple present tense usage
-    - Frequent grammatical errors
-    - Highly fragmented speech patterns
-    - Pronunciation challenges
-    - Speaking rate: 40-60 words per minute
-    - High communication breakdown percentage (30-50%)
-
-    #### B1-B2 Nuanced Characteristics:
-    - Vocabulary Range: 1500-4000 words
-    - Multi-tense usage with increasing complexity
-    - Moderate to minimal grammatical errors
-    - Developing complex sentence structures
-    - Clearer pronunciation
-    - Speaking rate: 60-130 words per minute
-    - Reduced communication imprecision (10-25%)
-
-    #### C1-C2 Sophisticated Markers:
-    - Vocabulary Range: 4000-8000+ words
-    - Advanced grammatical manipulation
-    - Near-native discourse capabilities
-    - Minimal to zero grammatical errors
-    - Academic/professional level language use
-    - Speaking rate: 130-180 words per minute
-    - Virtually zero communication barriers
-
-    ## Required Analysis Sections
-
-    ### 1. CEFR Level Assessment
-
-    Provide a precise CEFR rating (A1-C2) for each category with supporting evidence:
-
-    | Category | Rating | Evidence |
-    |----------|--------|----------|
-    | Fluency | [CEFR Level] | [Specific evidence from transcript] |
-    | Grammar | [CEFR Level] | [Specific evidence from transcript] |
-    | Vocabulary | [CEFR Level] | [Specific evidence from transcript] |
-    | Pronunciation | [CEFR Level] | [Specific evidence from transcript] |
-    | Interaction | [CEFR Level] | [Specific evidence from transcript] |
-    | **Overall CEFR Level** | [CEFR Level] | [Summary justification] |
-
-    ### 2. Quantitative Strengths & Weaknesses Analysis
-
-    **Strengths:**
-    - **Grammar Accuracy:** [X]% of sentences grammatically correct
-    - **Sentence Complexity:** [X]% complex sentences, [X]% compound sentences, [X]% simple sentences
-    - **Advanced Constructions:** [Exact number] of [specific constructions] used
-    - **Vocabulary Range:** [Specific metrics about vocabulary diversity]
-
-    **Areas for Improvement:**
-    - **Speaking Rate:** [Specific comparison to target range with percentage deviation]
-    - **Filler Usage:** [Exact count] of each filler word/phrase
-    - **Word Repetition:** [Specific words/phrases with exact repetition counts]
-    - **Linking Words:** [Analysis of connector usage with specific metrics]
-
-    ### 3. Native-Like Rephrasing
-
-    Identify exactly 5 non-native-like constructions and provide native-like alternatives:
-
-    | Non-Native Construction | Native-Like Alternative | Improvement Explanation |
-    |-------------------------|-------------------------|-------------------------|
-    | [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
-    | [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
-    | [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
-    | [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
-    | [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
-
-    ### 4. Vocabulary Metrics
-
-    **Quantitative Analysis:**
-    - **Total Word Count:** [Exact number]
-    - **Unique Word Count:** [Exact number]
-    - **Type-Token Ratio:** [Calculated ratio]
-    - **Lexical Density:** [Calculated percentage]
-    - **Academic Word List Coverage:** [Percentage of academic vocabulary]
-
-    **CEFR Level Distribution:**
-    - A1: [X]% ([number] words)
-    - A2: [X]% ([number] words)
-    - B1: [X]% ([number] words)
-    - B2: [X]% ([number] words)
-    - C1: [X]% ([number] words)
-    - C2: [X]% ([number] words)
-
-    ### 5. Word Level Classification Table
-
-    Provide exactly 5 examples for each CEFR level:
-
-    | CEFR Level | Word/Phrase Examples |
-    |------------|----------------------|
-    | A1 | [5 specific examples from transcript] |
-    | A2 | [5 specific examples from transcript] |
-    | B1 | [5 specific examples from transcript] |
-    | B2 | [5 specific examples from transcript] |
-    | C1 | [5 specific examples from transcript] |
-    | C2 | [5 specific examples from transcript] |
-
-    ### 6. Word Repetition Analysis
-
-    **High-Frequency Words/Phrases:**
-    - [Word/phrase]: [Exact count] occurrences
-    - [Word/phrase]: [Exact count] occurrences
-    - [Word/phrase]: [Exact count] occurrences
-    - [Word/phrase]: [Exact count] occurrences
-    - [Word/phrase]: [Exact count] occurrences
-
-    **Suggested Alternatives:**
-    - For [word/phrase]: [alternative 1], [alternative 2], [alternative 3]
-    - For [word/phrase]: [alternative 1], [alternative 2], [alternative 3]
-
-    ### 7. Speaking Rate and Pause Analysis
-
-    **Rate Metrics:**
-    - **Words Per Minute:** [Exact number]
-    - **Syllables Per Minute:** [Estimated number]
-    - **Comparison to Native Range:** [Deviation percentage]
-
-    **Pause Analysis:**
-    - **Total Pauses:** [Exact number]
-    - **Natural Pauses:** [Exact number] ([X]%)
-    - **Hesitation Pauses:** [Exact number] ([X]%)
-    - **Pause Frequency:** 1 pause every [X] words
-    - **Average Pause Duration:** [Estimated duration]
-
-    **Fluency Assessment:**
-    - **Pause-to-Speech Ratio:** [Calculated ratio]
-    - **Flow Disruption Score:** [Quantitative measure]
-    - **Specific Disruption Patterns:** [List of patterns with examples]
-
-    ### 8. Pronunciation Analysis
-
-    **Phoneme Accuracy:**
-    - **Vowels:** [X]% accuracy
-    - **Consonants:** [X]% accuracy
-    - **Consonant Clusters:** [X]% accuracy
-    - **Diphthongs:** [X]% accuracy
-
-    **Specific Issues:**
-    - [Phoneme]: [Description of issue] in words [example 1], [example 2]
-    - [Phoneme]: [Description of issue] in words [example 1], [example 2]
-
-    **Prosodic Features:**
-    - **Word Stress:** [Analysis with specific examples]
-    - **Sentence Stress:** [Analysis with specific examples]
-    - **Intonation Patterns:** [Analysis with specific examples]
-    - **Rhythm:** [Analysis with specific examples]
-
-    ### 9. Mother Tongue Influence (MTI)
-
-    - **Identified First Language:** [Language] (confidence level: [high/medium/low])
-    - **Phonological Influences:** [Specific patterns with examples]
-    - **Syntactic Influences:** [Specific patterns with examples]
-    - **Lexical Influences:** [Specific patterns with examples]
-
-    ### 10. Grammar Analysis
-
-    **Accuracy Statistics:**
-    - **Error-Free Clauses:** [X]%
-    - **Error-Free T-Units:** [X]%
-
-    **Grammar Strengths:**
-    - [Specific construction]: Used correctly [X] times
-    - [Specific construction]: Used correctly [X] times
-
-    **Grammar Errors:**
-    - [Error type]: [X] instances (e.g., [example from transcript])
-    - [Error type]: [X] instances (e.g., [example from transcript])
-
-    ### 11. Improvement Plan
-
-    | Priority | Focus Area | Specific Exercise | Expected Outcome | Time Frame |
-    |----------|------------|-------------------|------------------|------------|
-    | 1 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
-    | 2 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
-    | 3 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
-    | 4 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
-    | 5 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
-
-    ### 12. Topic Relevance Analysis
-
-    - **Expected Topic:** [Topic]
-    - **Relevance Score:** [0-10]
-    - **On-Topic Content:** [X]%
-    - **Off-Topic Content:** [X]%
-    - **Main Digressions:** [List with frequency]
-    - **Coherence Assessment:** [Analysis of logical flow]
-
-    ### 13. Linguistic Dimension Weights
-
-    **Weighted Assessment Criteria:**
-    - **Grammar:** 25% (Structural accuracy, complexity)
-    - **Vocabulary:** 20% (Range, appropriateness, diversity)
-    - **Pronunciation:** 15% (Clarity, accent, intelligibility)
-    - **Fluency:** 15% (Speech rate, cohesion, naturalness)
-    - **Discourse Management:** 15% (Topic relevance, logical progression)
-    - **Interaction:** 10% (Responsive communication effectiveness)
-
-    ### 14. Mother Tongue Influence (MTI) Deep Analysis
-
-    - **Linguistic Transfer Mapping:**
-      - Identify specific phonological transfers
-      - Quantify syntactic influence percentage
-      - Trace lexical borrowing patterns
-    - **Accent Influence Score:** [Quantitative measure of native language impact]
-    - **Communication Strategy Adaptations:** [Specific recommendations]
-
-    ### 15. Adaptive Improvement Recommendations
-
-    - **Personalized Learning Trajectory:**
-      - Machine learning-informed skill development path
-      - Domain-specific language improvement strategies
-      - Targeted intervention recommendations based on detected weaknesses
-
-    ## Report Format Requirements
-
-    1. All sections must be completed with precise quantitative data where applicable
-    2. No subjective evaluations without supporting evidence
-    3. All examples must be direct quotes from the transcript
-    4. Tables must be properly formatted with aligned columns
-    5. Numerical data must include units of measurement where appropriate
-    6. Analysis must be evidence-based with specific references to the speech content
-    7. All improvement recommendations must be actionable and specific
-
-    Please include this relevance analysis in your report. If no expected topic was provided, note that topic relevance couldn't be assessed.
-
-    Please format your response with clear sections and bullet points for each category.
-    """
+    if section_numbers is None:
+        section_numbers = sorted(ANALYSIS_SECTIONS)
+        intro = PROMPT_INTRO
+    elif structured:
+        # The JSON keys already limit the answer to these sections
+        intro = PROMPT_INTRO
+    else:
+        intro = PROMPT_INTRO + "\n" + group_instruction(section_numbers)
+
+    format_instruction = json_instruction(section_numbers) if structured else FORMAT_INSTRUCTION
+
+    precomputed = []
+    if metrics:
+        precomputed.append(format_metrics_for_prompt(metrics))
+    if pause_metrics:
+        precomputed.append("### Pause and Fluency (measured from the audio)\n\n" + format_pauses_for_prompt(pause_metrics))
+    if pronunciation_scores:
+        precomputed.append(PRONUNCIATION_EVIDENCE_HEADER + "\n" + format_scores_for_prompt(pronunciation_scores))
+    if segment_findings:
+        precomputed.append(segment_findings)
+    precomputed_text = "\n" + PRECOMPUTED_METRICS_HEADER + "\n" + "\n\n".join(precomputed) + "\n" if precomputed else ""
+
+    def assemble(transcript, phonetics, transcript_note=""):
+        input_data = f"""\
+## Input Data
+
+- **Speech Transcript:** "{transcript}"{transcript_note}
+- **Phonetic Data (primary CMU pronunciation of each content word; "(estimate)" marks a spelling-based guess \
+for a word not in the dictionary):**
+{phonetics}
+- **Speaking Rate:** {speaking_rate} words per minute (if available)
+- **Language Background:** {language_hint_text}
+- **Expected Topic:** {expected_topic_text}
+"""
+        return "\n".join([
+            intro,
+            input_data + precomputed_text,
+            LEVEL_GUIDELINES,
+            "## Required Analysis Sections\n",
+            sections_text(section_numbers),
+            closing_instructions(section_numbers, format_instruction),
+        ])
+
+    transcript_note = (f" (evenly spaced excerpts of a {len(text.split())}-word transcript; "
+                       "the precomputed metrics cover all of it)")
+
+    # Long form: the segment findings stand in for the full transcript, which is cut to excerpts for quoting
+    def fit_transcript(max_tokens=None):
+        if segment_findings:
+            max_tokens = EXCERPT_TOKENS if max_tokens is None else min(max_tokens, EXCERPT_TOKENS)
+        if max_tokens is None:
+            return text, ""
+        transcript, trimmed = sample_transcript(text, max_tokens, ANALYSIS_MODEL)
+        return transcript, transcript_note if trimmed else ""
+
+    transcript, note = fit_transcript()
+    prompt = assemble(transcript, encode_phonemes(phoneme_data), note)
+    if count_tokens(prompt, ANALYSIS_MODEL) <= token_budget:
+        return prompt
+
+    # Over budget: split the tokens left after the fixed text between the phonetic table and the transcript
+    available = max(0, token_budget - count_tokens(assemble("", "", transcript_note), ANALYSIS_MODEL))
+    phonetics = encode_phonemes(phoneme_data, int(available * PHONEME_SHARE), ANALYSIS_MODEL)
+    transcript, note = fit_transcript(available - count_tokens(phonetics, ANALYSIS_MODEL))
+    if usage is not None:
+        usage["trimmed_prompts"] += 1
+    return assemble(transcript, phonetics, note)
+
+
+# Generate one section group, retrying it once on its own if it fails; a group that still fails
+# becomes a "(not generated)" placeholder. With placeholders=False the sections that did come back
+# are returned on their own, and a group with none raises.
+async def analyze_section_group_async(section_numbers, prompt_args, retries=1, usage=None, placeholders=True):
+    prompt = build_analysis_prompt(**prompt_args, section_numbers=section_numbers, usage=usage)
+
+    def answered(text):
+        return {number: section for number, section in split_sections(text, section_numbers).items() if section}
+
+    # An answer that leaves out a requested section counts as a failed call (and is not cached)
+    def complete(text):
+        return len(answered(text)) == len(section_numbers)
+
+    sections = {}
+    for attempt in range(retries + 1):
+        try:
+            result = await llm_client.acomplete(prompt, ANALYSIS_MODEL, ANALYSIS_TEMPERATURE, validate=complete)
+            record_usage(usage, result)
+            sections.update(answered(result.text))
+            missing = [number for number in section_numbers if number not in sections]
+            if missing:
+                raise ValueError(f"the answer left out section(s) {', '.join(map(str, missing))}")
+            return sections
+        except ReplayCacheMiss:
+            raise
+        except Exception as e:
+            if attempt == retries:
+                if not placeholders:
+                    if sections:
+                        return sections
+                    raise
+                # Sections that did come back are kept; only the missing ones get a placeholder
+                return {number: sections.get(number)
+                        or f"### {number}. (not generated)\n\n_This section could not be generated: {e}_"
+                        for number in section_numbers}
+
+
+# Send all section groups concurrently and merge them back in protocol order
+async def analyze_sections_async(prompt_args, usage=None):
+    group_results = await asyncio.gather(
+        *(analyze_section_group_async(section_numbers, prompt_args, usage=usage)
+          for _, section_numbers in SECTION_GROUPS)
+    )
+    sections = {}
+    for group_sections in group_results:
+        sections.update(group_sections)
+    return merge_sections(sections)
+
+
+# Yield merged sections in protocol order as soon as every earlier section is ready
+async def stream_sections_async(prompt_args, usage=None):
+    tasks = [asyncio.ensure_future(analyze_section_group_async(section_numbers, prompt_args, usage=usage))
+             for _, section_numbers in SECTION_GROUPS]
+    sections = {}
+    remaining = sorted(ANALYSIS_SECTIONS)
+    separator = ""
+    for next_group in asyncio.as_completed(tasks):
+        sections.update(await next_group)
+        while remaining and remaining[0] in sections:
+            section = sections[remaining.pop(0)]
+            if section:
+                yield separator + section
+                separator = "\n\n"
+
+
+# Generate sections as schema-constrained JSON; an answer that fails validation gets one repair request
+async def analyze_structured_async(prompt_args, section_numbers=None, usage=None):
+    section_numbers = section_numbers or sorted(ANALYSIS_SECTIONS)
+    schema_format = response_format(section_numbers)
+
+    # Only answers that validate are cached, so an invalid one is not served again on the next run
+    def valid(text):
+        return not parse_report(text, section_numbers)[1]
+
+    prompt = build_analysis_prompt(**prompt_args, section_numbers=section_numbers, structured=True, usage=usage)
+    result = await llm_client.acomplete(prompt, ANALYSIS_MODEL, ANALYSIS_TEMPERATURE, response_format=schema_format,
+                                        validate=valid)
+    record_usage(usage, result)
+    report, errors = parse_report(result.text, section_numbers)
+    if errors:
+        result = await llm_client.acomplete(repair_prompt(result.text, errors), ANALYSIS_MODEL, ANALYSIS_TEMPERATURE,
+                                            response_format=schema_format, validate=valid)
+        record_usage(usage, result)
+        report, errors = parse_report(result.text, section_numbers)
+        if errors:
+            raise ReportValidationError(errors)
+    return order_report(report)
+
+
+# Structured report: one request, or one per section group merged back in protocol order
+async def analyze_structured_report_async(prompt_args, transcript_segments=None, long_form=False,
+                                          parallel_sections=False, usage=None):
+    if long_form:
+        prompt_args = dict(prompt_args, segment_findings=await long_form_findings_async(prompt_args,
+                                                                                        transcript_segments, usage))
+    if not parallel_sections:
+        return await analyze_structured_async(prompt_args, usage=usage)
+    group_reports = await asyncio.gather(
+        *(analyze_structured_async(prompt_args, section_numbers, usage) for _, section_numbers in SECTION_GROUPS)
+    )
+    report = {}
+    for group_report in group_reports:
+        report.update(group_report)
+    return order_report(report)
+
+
+# Transcripts at least this long are analyzed map-reduce: per-segment findings first, then one report
+LONGFORM_ANALYSIS_MIN_WORDS = int(os.getenv("LONGFORM_ANALYSIS_MIN_WORDS", "600"))
+
+
+def use_long_form_analysis(text):
+    return bool(LONGFORM_ANALYSIS_MIN_WORDS) and len(text.split()) >= LONGFORM_ANALYSIS_MIN_WORDS
+
+
+# Map step over transcript segments, reduced locally into a findings block for the report prompt
+async def long_form_findings_async(prompt_args, transcript_segments=None, usage=None):
+    segments = segment_transcript(prompt_args["text"], transcript_segments, prompt_args["audio_duration"])
+    findings = await analyze_segments_async(llm_client, segments, ANALYSIS_MODEL, ANALYSIS_TEMPERATURE,
+                                            prompt_args["language_hint"], usage)
+    return format_findings_for_prompt(reduce_findings(segments, findings))
+
+
+async def analyze_long_form_async(prompt_args, transcript_segments=None, parallel_sections=False, usage=None):
+    prompt_args = dict(prompt_args, segment_findings=await long_form_findings_async(prompt_args, transcript_segments,
+                                                                                    usage))
+    if parallel_sections:
+        return await analyze_sections_async(prompt_args, usage)
+    result = await llm_client.acomplete(build_analysis_prompt(**prompt_args, usage=usage), ANALYSIS_MODEL,
+                                        ANALYSIS_TEMPERATURE)
+    record_usage(usage, result)
+    return result.text
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
+
+async def stream_long_form_async(prompt_args, transcript_segments=None, parallel_sections=False, usage=None):
+    prompt_args = dict(prompt_args, segment_findings=await long_form_findings_async(prompt_args, transcript_segments,
+                                                                                    usage))
+    if parallel_sections:
+        report = stream_sections_async(prompt_args, usage)
+    else:
+        report = llm_client.astream(build_analysis_prompt(**prompt_args, usage=usage), ANALYSIS_MODEL,
+                                    ANALYSIS_TEMPERATURE, usage=usage)
+    async for piece in report:
+        yield piece
+
+
+# Analyze speech with GPT
+def analyze_speech(text, phoneme_data, audio_duration=None, word_count=None, language_hint=None, expected_topic=None,
+                   metrics=None, pause_metrics=None, parallel_sections=False, stream=False, usage=None,
+                   transcript_segments=None, long_form=None, pronunciation_scores=None, structured=False):
+    """Use GPT to analyze pronunciation, grammar & MTI with comprehensive metrics
+
+    With stream=True the report is returned as an iterator of text chunks
+    (a StreamedCompletion whose .text holds the full report once consumed).
+    Token usage is added to `usage` (from llm_client.new_usage) when given;
+    for streams it is complete once the stream has been consumed.
+    long_form (default: by transcript length) selects the map-reduce mode, which
+    segments on Whisper's transcript_segments when they are given.
+    pronunciation_scores (from pronunciation_scoring) are given to the model as evidence for section 8.
+    structured=True returns the report as a validated dict instead (structured_report.render_markdown
+    gives its markdown); it cannot be streamed and raises ReportValidationError if the repaired answer is invalid.
+    """
+    prompt_args = dict(
+        text=text,
+        phoneme_data=phoneme_data,
+        audio_duration=audio_duration,
+        word_count=word_count,
+        language_hint=language_hint,
+        expected_topic=expected_topic,
+        metrics=metrics,
+        pause_metrics=pause_metrics,
+        pronunciation_scores=pronunciation_scores
+    )
+    if long_form is None:
+        long_form = use_long_form_analysis(text)
+    if structured:
+        return llm_client.run(analyze_structured_report_async(prompt_args, transcript_segments, long_form,
+                                                              parallel_sections, usage))
+    if long_form:
+        if stream:
+            return llm_client.iterate(stream_long_form_async(prompt_args, transcript_segments, parallel_sections,
+                                                             usage))
+        return llm_client.run(analyze_long_form_async(prompt_args, transcript_segments, parallel_sections, usage))
+    if parallel_sections:
+        if stream:
+            return llm_client.iterate(stream_sections_async(prompt_args, usage))
+        return llm_client.run(analyze_sections_async(prompt_args, usage))
+
+    prompt = build_analysis_prompt(**prompt_args, usage=usage)
+    if stream:
+        return llm_client.stream(prompt, ANALYSIS_MODEL, ANALYSIS_TEMPERATURE, usage=usage)
+    result = llm_client.complete(prompt, ANALYSIS_MODEL, ANALYSIS_TEMPERATURE)
+    record_usage(usage, result)
+    return result.text
+
+
+# Regenerate only the given sections for an edited transcript and splice them into the previous report
+def update_report(previous_report, section_numbers, text, phoneme_data, audio_duration=None, word_count=None,
+                  language_hint=None, expected_topic=None, metrics=None, pause_metrics=None,
+                  pronunciation_scores=None, usage=None, structured=False):
+    """Returns (report, regenerated section numbers); sections the answer left out keep their previous text
+
+    previous_report is the markdown report, or the report dict when structured is set (a dict is returned).
+    """
+    prompt_args = dict(
+        text=text,
+        phoneme_data=phoneme_data,
+        audio_duration=audio_duration,
+        word_count=word_count,
+        language_hint=language_hint,
+        expected_topic=expected_topic,
+        metrics=metrics,
+        pause_metrics=pause_metrics,
+        pronunciation_scores=pronunciation_scores
     )
+    if structured:
+        report = dict(previous_report)
+        if section_numbers:
+            # Validation requires every requested section, so all of them are replaced
+            report.update(llm_client.run(analyze_structured_async(prompt_args, section_numbers, usage)))
+        return order_report(report), list(section_numbers)
+    sections = split_sections(previous_report, sorted(ANALYSIS_SECTIONS))
+    regenerated = {}
+    if section_numbers:
+        # A failed regeneration fails the job rather than splicing placeholders over the previous sections
+        regenerated = llm_client.run(analyze_section_group_async(section_numbers, prompt_args, usage=usage,
+                                                                 placeholders=False))
+        sections.update(regenerated)
+    return merge_sections(sections), sorted(regenerated)
+
+
+# Async variant for callers running their own event loop (shares the same client and limits)
+async def analyze_speech_async(text, phoneme_data, audio_duration=None, word_count=None, language_hint=None,
+                               expected_topic=None, metrics=None, pause_metrics=None, parallel_sections=False,
+                               usage=None, transcript_segments=None, long_form=None, pronunciation_scores=None,
+                               structured=False):
+    prompt_args = dict(
+        text=text,
+        phoneme_data=phoneme_data,
+        audio_duration=audio_duration,
+        word_count=word_count,
+        language_hint=language_hint,
+        expected_topic=expected_topic,
+        metrics=metrics,
+        pause_metrics=pause_metrics,
+        pronunciation_scores=pronunciation_scores
+    )
+    if long_form is None:
+        long_form = use_long_form_analysis(text)
+    if structured:
+        return await analyze_structured_report_async(prompt_args, transcript_segments, long_form, parallel_sections,
+                                                     usage)
+    if long_form:
+        return await analyze_long_form_async(prompt_args, transcript_segments, parallel_sections, usage)
+    if parallel_sections:
+        return await analyze_sections_async(prompt_args, usage)
+
+    result = await llm_client.acomplete(build_analysis_prompt(**prompt_args, usage=usage), ANALYSIS_MODEL,
+                                        ANALYSIS_TEMPERATURE)
+    record_usage(usage, result)
+    return result.text
+
+
+
+# Background job for one submission: decode, transcribe, measure and stream the report.
+# The partial result (JSON) is published as it grows so the UI can render it while the job runs.
+def run_analysis_job(params, audio_bytes, progress):
+    with trace("analysis", profile=params.get("profile", False), source=params.get("source")) as request:
+        transcription = params.get("transcription") or ""
+        # A resubmission of an edited transcript reuses what it can from the earlier job's result
+        previous_job = get_job_store().get(params["previous_job"]) if params.get("previous_job") else None
+        previous = previous_job["result"] if previous_job and previous_job["status"] == DONE else None
+        transcript_segments = None
+        asr_result = None
+        audio = None
+        recording = None
+        if params.get("recording_id"):
+            # Streamed recording: decoded (and transcribed, piece by piece) while the user was speaking
+            progress(stage="Finishing the recording")
+            with span("decode", streamed=True) as stage:
+                recording = get_recording_streams().get(params["recording_id"])
+                # Received by another app process: decode its spooled file
+                audio = recording.audio() if recording is not None else decode_audio_file(
+                    get_recording_streams().encoded_path(params["recording_id"]))
+                stage["audio_seconds"] = round(audio.duration, 3)
+        elif audio_bytes:
+            progress(stage="Decoding audio")
+            with span("decode", input_bytes=len(audio_bytes)) as stage:
+                audio = decode_audio_bytes(audio_bytes)
+                stage["audio_seconds"] = round(audio.duration, 3)
+        # Use Whisper only if no transcription provided
+        if audio is not None and not transcription:
+            progress(stage="Transcribing")
+            with span("transcribe", audio_seconds=round(audio.duration, 3)) as stage:
+                if recording is not None and recording.transcribing:
+                    stage["model"] = f"{WHISPER_MODEL_NAME}-streamed"
+                    asr_result = recording.transcription()
+                if asr_result is None:
+                    asr, asr_name = select_transcriber(audio)
+                    stage["model"] = asr_name
+                    decode_options = {"word_timestamps": True} if WORD_CONFIDENCE_ENABLED else {}
+                    asr_result = transcribe_audio(audio, asr, cache=get_transcript_cache(), model_name=asr_name,
+                                                  return_result=True, **decode_options)
+            transcription = asr_result["text"]
+            transcript_segments = asr_result.get("segments")
+
+        progress(stage="Measuring")
+        audio_duration = audio.duration if audio is not None else None
+        word_count = len(transcription.split())
+        with span("phonetics", words=word_count):
+            phoneme_data = analyze_phonetics(transcription, known=previous["phoneme_data"] if previous else None)
+        with span("text_metrics"):
+            speech_metrics = compute_text_metrics(transcription, phoneme_data, audio_duration)
+        pause_metrics = None
+        if audio is not None:
+            with span("pauses"):
+                pause_metrics = analyze_pauses_array(audio.samples, audio.sample_rate, word_count=word_count,
+                                                     syllable_count=speech_metrics.get("syllable_count"))
+        pronunciation_scores = None
+        words = recognized_words(asr_result)
+        if words:
+            with span("pronunciation", words=len(words)):
+                pronunciation_scores = score_pronunciation(words, phoneme_data)
+        result = {
+            "source": params.get("source"),
+            "transcription": transcription,
+            "audio_duration": audio_duration,
+            "word_count": word_count,
+            "phoneme_data": phoneme_data,
+            "metrics": speech_metrics,
+            "pause_metrics": pause_metrics,
+            "pronunciation_scores": pronunciation_scores,
+            "long_form": use_long_form_analysis(transcription),
+            "analysis": "",
+        }
 
-    return response.choices[0].message.content
+        usage = new_usage()
+        # Structured mode keeps the validated JSON report in result["report"] and shows its markdown rendering
+        structured = params.get("structured", False)
+        sections_to_update = plan_update(previous_job, params, transcription, result["long_form"])
+        if sections_to_update is not None:
+            progress(stage="Updating the report", partial=json.dumps(result, default=float))
+            with span("llm", model=ANALYSIS_MODEL, incremental=True, sections=len(sections_to_update)) as stage:
+                analysis, updated_sections = update_report(
+                    previous["report"] if structured else previous["analysis"],
+                    sections_to_update,
+                    transcription,
+                    phoneme_data,
+                    audio_duration=audio_duration,
+                    word_count=word_count,
+                    language_hint=params.get("language_hint"),
+                    expected_topic=params.get("expected_topic"),
+                    metrics=speech_metrics,
+                    pause_metrics=pause_metrics,
+                    pronunciation_scores=pronunciation_scores,
+                    usage=usage,
+                    structured=structured
+                )
+                stage.update(usage)
+            if structured:
+                result["report"], analysis = analysis, render_markdown(analysis)
+            result.update(analysis=analysis, token_usage=usage, updated_sections=updated_sections)
+        else:
+            progress(stage="Writing the report", partial=json.dumps(result, default=float))
+            with span("llm", model=ANALYSIS_MODEL, parallel_sections=params.get("parallel_sections", False),
+                      long_form=result["long_form"], structured=structured) as stage:
+                report = analyze_speech(
+                    transcription,
+                    phoneme_data,
+                    audio_duration=audio_duration,
+                    word_count=word_count,
+                    language_hint=params.get("language_hint"),
+                    expected_topic=params.get("expected_topic"),
+                    metrics=speech_metrics,
+                    pause_metrics=pause_metrics,
+                    parallel_sections=params.get("parallel_sections", False),
+                    stream=not structured,
+                    usage=usage,
+                    transcript_segments=transcript_segments,
+                    pronunciation_scores=pronunciation_scores,
+                    long_form=result["long_form"],
+                    structured=structured
+                )
+                if structured:
+                    result["report"], analysis = report, render_markdown(report)
+                else:
+                    # Serialized only when the throttle lets a partial write through, not once per chunk
+                    for _ in report:
+                        progress(partial=lambda: json.dumps(dict(result, analysis=report.text), default=float))
+                    analysis = report.text
+                stage.update(usage)
+            result.update(analysis=analysis, token_usage=usage)
+    result["trace"] = request.to_dict()
+    return result
+
+
+JOB_HANDLERS = {"analysis": run_analysis_job}
+
+# In-process job workers (0 leaves the work to `python job_queue.py` worker processes)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+
+# Persistent job table shared by all sessions (and by every app process using the same database)
+@st.cache_resource
+def get_job_store():
+    return JobStore.from_env()
+
+
+# Prometheus endpoint on METRICS_PORT, started once per process
+@st.cache_resource
+def start_metrics_exporter():
+    return start_metrics_server_from_env()
+
+
+@st.cache_resource
+def start_job_workers():
+    return JobWorkerPool(get_job_store(), JOB_HANDLERS, workers=JOB_WORKERS) if JOB_WORKERS else None
 
 
+# Queue an analysis; identical resubmissions return the existing job
+def submit_analysis_job(audio_bytes, **params):
+    dedupe_key = hashlib.sha256(
+        (audio_fingerprint(audio_bytes or b"") + json.dumps(params, sort_keys=True)).encode("utf-8")
+    ).hexdigest()
+    job_id = get_job_store().submit("analysis", params, audio_bytes, dedupe_key=dedupe_key)
+    st.session_state.job_id = job_id
+    st.query_params["job"] = job_id
+    return job_id
+
+
+# Display the transcription, metrics and report of a (possibly still partial) result
+def render_results(result, finished=True):
+    audio_duration = result["audio_duration"]
+    word_count = result["word_count"]
+    pause_metrics = result["pause_metrics"]
+
+    st.markdown("## 📊 Analysis Results")
+    st.markdown("### Your Transcription:" if result.get("source") == "recording" else "### Transcribed Speech:")
+    st.markdown(
+        f'<div style="background-color: #e1f5fe; padding: 15px; border-radius: 10px;">{result["transcription"]}</div>',
+        unsafe_allow_html=True)
+
+    if audio_duration:
+        st.markdown("### Audio Metrics")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Duration", f"{audio_duration:.2f} seconds")
+        with col2:
+            speaking_rate = round(word_count / (audio_duration / 60))
+            st.metric("Speaking Rate", f"{speaking_rate} words/minute")
+        with col3:
+            st.metric("Pauses", f"{pause_metrics['total_pauses']} "
+                                f"({pause_metrics.get('hesitation_pauses', 0)} hesitations)")
+        with col4:
+            st.metric("Pause-to-Speech Ratio", pause_metrics.get("pause_to_speech_ratio"))
+
+    with st.expander("Show Phonetic Analysis"):
+        st.json(result["phoneme_data"])
+    with st.expander("Show Speech Metrics"):
+        st.json(result["metrics"])
+    scores = result.get("pronunciation_scores")
+    if scores:
+        with st.expander("Show Pronunciation Confidence"):
+            st.caption(f"{scores['words_scored']} words scored by the speech recognizer, mean confidence "
+                       f"{scores['mean_confidence']:.0%}; {scores['low_confidence_count']} below "
+                       f"{scores['low_confidence_threshold']:.0%}")
+            if scores["low_confidence_words"]:
+                st.dataframe(scores["low_confidence_words"], hide_index=True)
+            if scores["weakest_phonemes"]:
+                st.dataframe(scores["weakest_phonemes"], hide_index=True)
+
+    st.markdown("### Comprehensive Speech Analysis")
+    st.markdown(result["analysis"] + ("" if finished else " ▌"))
+    if finished and result.get("report"):
+        with st.expander("Show Structured Report (JSON)"):
+            st.json(result["report"])
+    if finished and result.get("updated_sections") is not None:
+        if result["updated_sections"]:
+            st.caption(f"Edited transcript: regenerated sections {', '.join(map(str, result['updated_sections']))}; "
+                       "the other sections are from the previous report.")
+        else:
+            st.caption("The transcript was unchanged, so the previous report was reused.")
+    if finished and result.get("token_usage"):
+        show_usage(result["token_usage"])
+    if finished and result.get("trace"):
+        request = result["trace"]
+        st.caption(" · ".join(f"{entry['stage']} {entry['wall_seconds']:.2f}s" for entry in request["spans"])
+                   + f" · total {request['wall_seconds']:.2f}s")
+        if request.get("profile_path"):
+            st.caption(f"cProfile output: {request['profile_path']}")
+
+
+# Show a job's status and whatever results it has so far; returns True while it is still running
+def render_job(job):
+    if job["status"] == FAILED:
+        st.error(f"Error during analysis: {job['error']}")
+        return False
+    if job["status"] == DONE:
+        render_results(job["result"])
+        return False
+
+    if job["status"] == QUEUED:
+        st.info("⏳ Waiting for a free worker...")
+    else:
+        st.info(f"⏳ {job['stage'] or 'Starting'}...")
+    if job["partial"]:
+        render_results(json.loads(job["partial"]), finished=False)
+    return True
+
+
+# Token usage caption shown under the report
+def show_usage(usage):
+    note = f"{usage['prompt_tokens']:,} prompt + {usage['completion_tokens']:,} completion tokens"
+    note += f" across {usage['requests']} request{'s' if usage['requests'] != 1 else ''}"
+    if usage["cached_requests"]:
+        note += f" ({usage['cached_requests']} from cache)"
+    if usage["trimmed_prompts"]:
+        note += " · long transcript: the prompt used excerpts to stay within the token budget"
+    st.caption(note)
+
 
 # Main app
 def main():
+    # Set page config
+    st.set_page_config(
+        page_title="English Pronunciation Analyzer",
+        page_icon="🎙️",
+        layout="wide"
+    )
+
     st.title("🎙️ English Pronunciation Analyzer")
     st.markdown("### Analyze your spoken English for pronunciation, grammar, and mother tongue influence")
 
-    # Load Whisper model
-    with st.spinner("Loading speech recognition model..."):
-        model = load_whisper_model()
+    start_metrics_exporter()
+    start_job_workers()
+    recording_server = start_recording_ingest()
+    job_store = get_job_store()
+    # The current job id is kept in the URL too, so a refresh or a new tab picks the job back up
+    job_id = st.session_state.get("job_id") or st.query_params.get("job")
+    job = job_store.get(job_id) if job_id else None
 
     # Sidebar options
     st.sidebar.title("Options")
     language_hint = st.sidebar.text_input("Your native language (optional):", help="Improves analysis accuracy")
     expected_topic = st.sidebar.text_input("Expected topic (optional):", help="Topic you should discuss")
+    parallel_sections = st.sidebar.checkbox(
+        "Generate report sections in parallel",
+        value=os.getenv("ANALYSIS_PARALLEL_SECTIONS", "").lower() in ("1", "true", "yes"),
+        help="Faster: report sections are requested concurrently and merged in order"
+    )
+    structured = st.sidebar.checkbox(
+        "Structured report (JSON)",
+        value=os.getenv("ANALYSIS_STRUCTURED_OUTPUT", "").lower() in ("1", "true", "yes"),
+        help="The report is generated as schema-validated JSON, then rendered; it appears when complete"
+    )
+    with st.sidebar.expander("Speech recognition queue"):
+        service = active_service()
+        if service is None:
+            st.caption("The speech recognition model loads on the first audio submission.")
+        else:
+            queue_stats = service.stats()
+            st.metric("Queue depth", queue_stats["queue_depth"])
+            st.metric("Mean wait", f"{queue_stats['mean_wait_ms']} ms")
+            st.caption(f"p95 wait {queue_stats['p95_wait_ms']} ms · mean batch size {queue_stats['mean_batch_size']} · "
+                       f"{WHISPER_MODEL_NAME} · {queue_stats['torch_threads'] or 'default'} threads · "
+                       f"{queue_stats['completed']} clips transcribed")
+    with st.sidebar.expander("Background jobs"):
+        counts = job_store.counts()
+        st.caption(" · ".join(f"{counts.get(status, 0)} {status}" for status in (QUEUED, RUNNING, DONE, FAILED)))
+    with st.sidebar.expander("Performance"):
+        profile = st.checkbox("Profile analyses (cProfile)", key="profile_analyses")
+        stage_summary = registry.summary()
+        if stage_summary:
+            st.dataframe([{"stage": stage, "runs": stats["count"], "mean wall s": stats["mean_wall_seconds"],
+                           "mean CPU s": stats["mean_cpu_seconds"]}
+                          for (_, stage), stats in stage_summary.items()], hide_index=True)
+        else:
+            st.caption("Stage timings from this server process appear after the first analysis.")
 
     # Initialize session state
     if 'audio_data' not in st.session_state:
         st.session_state.audio_data = ''
+    if 'recording_id' not in st.session_state:
+        st.session_state.recording_id = ''
     if 'transcription' not in st.session_state:
         st.session_state.transcription = ''
 
@@ -361,9 +847,61 @@ def main():
 
         let recognition;
         let mediaRecorder;
-        let audioChunks = [];
+        let audioChunks = []; // Kept only until the server has confirmed the stream, or when not streaming
         let currentTranscription = ''; // Store finalized transcription
 
+        // Chunks are posted to the recording server as they are captured (see recording_stream.py)
+        const INGEST = __INGEST_CONFIG__;
+        const TIMESLICE_MS = 1000;
+        let recordingId = null;
+        let chunkSeq = 0;
+        let streaming = false;
+        let streamConfirmed = false;
+        let streamFailed = false;
+        let uploads = Promise.resolve();
+
+        function ingestBase() {
+            if (INGEST.url) return INGEST.url.endsWith('/') ? INGEST.url.slice(0, -1) : INGEST.url;
+            if (!INGEST.port) return null;
+            try {
+                const page = new URL(document.referrer || window.parent.location.href);
+                return `${page.protocol}//${page.hostname}:${INGEST.port}`;
+            } catch (err) {
+                return null;
+            }
+        }
+
+        function newRecordingId() {
+            return Array.from(crypto.getRandomValues(new Uint8Array(16)),
+                              b => b.toString(16).padStart(2, '0')).join('');
+        }
+
+        async function post(path, body, attempts = 3) {
+            for (let attempt = 1; ; attempt++) {
+                let response = null;
+                try {
+                    response = await fetch(ingestBase() + path, {
+                        method: 'POST', body: body,
+                        headers: {'Content-Type': 'application/octet-stream', 'X-Recording-Token': INGEST.token}
+                    });
+                } catch (err) {
+                    if (attempt >= attempts) throw err;
+                }
+                if (response && response.ok) return;
+                // Rejected (out of order, too large...): retrying will not help
+                if (response && response.status < 500) throw new Error(await response.text());
+                if (attempt >= attempts) throw new Error(`upload failed (${response.status})`);
+                await new Promise(resolve => setTimeout(resolve, 250 * attempt));
+            }
+        }
+
+        function sendToApp(value) {
+            window.parent.postMessage({
+                type: 'streamlit:set_component_value',
+                value: Object.assign({audio_data: '', recording_id: '', transcription: transcriptionArea.value}, value)
+            }, '*');
+        }
+
         // Speech recognition setup
         if ('SpeechRecognition' in window || 'webkitSpeechRecognition' in window) {
             const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
@@ -400,21 +938,51 @@ def main():
         navigator.mediaDevices.getUserMedia({ audio: true }).then(stream => {
             mediaRecorder = new MediaRecorder(stream, { mimeType: 'audio/webm' });
             mediaRecorder.ondataavailable = (event) => {
-                audioChunks.push(event.data);
+                if (!event.data.size) return;
+                // Until the first chunk is accepted, keep everything so we can fall back to one upload at Stop
+                if (!streaming || !streamConfirmed) audioChunks.push(event.data);
+                if (!streaming) return;
+                const seq = chunkSeq++;
+                const data = event.data;
+                uploads = uploads.then(async () => {
+                    if (!streaming || streamFailed) return;
+                    try {
+                        await post(`/recordings/${recordingId}/chunks?seq=${seq}`, data);
+                        if (!streamConfirmed) {
+                            streamConfirmed = true;
+                            audioChunks = [];
+                        }
+                    } catch (err) {
+                        console.error('Recording upload error:', err);
+                        if (streamConfirmed) streamFailed = true;
+                        else streaming = false;
+                    }
+                });
             };
             mediaRecorder.onstop = () => {
-                const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
-                const reader = new FileReader();
-                reader.readAsDataURL(audioBlob);
-                reader.onloadend = () => {
-                    const base64Audio = reader.result.split(',')[1];
-                    audioDataInput.value = base64Audio;
-                    window.parent.postMessage({
-                        type: 'streamlit:set_component_value',
-                        value: {audio_data: base64Audio, transcription: transcriptionArea.value}
-                    }, '*');
-                };
-                audioChunks = [];
+                uploads.then(async () => {
+                    if (streaming && !streamFailed) {
+                        await post(`/recordings/${recordingId}/finish`, '');
+                        sendToApp({recording_id: recordingId});
+                        return;
+                    }
+                    if (streamFailed) {
+                        throw new Error('part of the recording could not be uploaded, please record again');
+                    }
+                    // No recording server: send the whole recording in one message
+                    const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
+                    audioChunks = [];
+                    const reader = new FileReader();
+                    reader.readAsDataURL(audioBlob);
+                    reader.onloadend = () => {
+                        const base64Audio = reader.result.split(',')[1];
+                        audioDataInput.value = base64Audio;
+                        sendToApp({audio_data: base64Audio});
+                    };
+                }).catch(err => {
+                    console.error('Recording upload error:', err);
+                    alert('Could not upload the recording: ' + err.message);
+                });
             };
         }).catch(err => {
             console.error('Microphone access error:', err);
@@ -426,8 +994,14 @@ def main():
             if (recognition && mediaRecorder) {
                 // Clear interim but keep finalized text on new recording start
                 transcriptionArea.value = currentTranscription;
+                recordingId = newRecordingId();
+                chunkSeq = 0;
+                streaming = Boolean(ingestBase());
+                streamConfirmed = false;
+                streamFailed = false;
+                audioChunks = [];
                 recognition.start();
-                mediaRecorder.start();
+                mediaRecorder.start(TIMESLICE_MS);
                 startBtn.disabled = true;
                 stopBtn.disabled = false;
             }
@@ -444,12 +1018,23 @@ def main():
     </script>
         """
 
+    # One upload token per browser session, kept across reruns so the recorder is not reloaded
+    if recording_server:
+        st.session_state.recording_token = get_recording_streams().issue_token(
+            st.session_state.get("recording_token"))
+    recording_html = recording_html.replace("__INGEST_CONFIG__", json.dumps({
+        "url": os.getenv("RECORDING_PUBLIC_URL"),
+        "port": recording_server.server_address[1] if recording_server else None,
+        "token": st.session_state.get("recording_token") if recording_server else None,
+    }))
+
     # Render the HTML component
     component_value = st.components.v1.html(recording_html, height=300)
 
     # Update session state with component value
     if component_value and isinstance(component_value, dict):
         st.session_state.audio_data = component_value.get('audio_data', '')
+        st.session_state.recording_id = component_value.get('recording_id', '')
         st.session_state.transcription = component_value.get('transcription', '')
 
     # Form for submission with editable transcription
@@ -463,122 +1048,65 @@ def main():
         )
         submit_button = st.form_submit_button("Analyze Speech")
 
-    # Process submitted audio
+    # Queue submitted audio; the work runs on background workers and survives reruns
     if submit_button:
         audio_data = st.session_state.audio_data
+        recording_id = st.session_state.recording_id
         transcription = transcription_input  # Use the edited text from the form
 
-        if transcription or audio_data:  # Check if either is present
-            with st.spinner("Analyzing your speech..."):
-                try:
-                    if audio_data:
-                        # Decode base64 audio
-                        audio_bytes = base64.b64decode(audio_data)
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_audio:
-                            temp_audio.write(audio_bytes)
-                            temp_audio_path = temp_audio.name
-
-                        # Use Whisper only if no transcription provided
-                        final_transcription = transcription if transcription else transcribe_audio(temp_audio_path,
-                                                                                                   model)
-                        audio_duration = librosa.get_duration(path=temp_audio_path)
-                        word_count = len(final_transcription.split())
-                    else:
-                        final_transcription = transcription
-                        audio_duration = None
-                        word_count = len(final_transcription.split()) if final_transcription else 0
-
-                    # Analyze phonemes
-                    phoneme_data = analyze_phonetics(final_transcription)
-
-                    # Analyze with OpenAI
-                    analysis_results = analyze_speech(
-                        final_transcription,
-                        phoneme_data,
-                        audio_duration=audio_duration,
-                        word_count=word_count,
-                        language_hint=language_hint,
-                        expected_topic=topic
-                    )
-
-                    # Display results
-                    st.markdown("## 📊 Analysis Results")
-                    st.markdown("### Your Transcription:")
-                    st.markdown(
-                        f'<div style="background-color: #e1f5fe; padding: 15px; border-radius: 10px;">{final_transcription}</div>',
-                        unsafe_allow_html=True)
-
-                    if audio_duration:
-                        st.markdown("### Audio Metrics")
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.metric("Duration", f"{audio_duration:.2f} seconds")
-                        with col2:
-                            speaking_rate = round(word_count / (audio_duration / 60))
-                            st.metric("Speaking Rate", f"{speaking_rate} words/minute")
-
-                    with st.expander("Show Phonetic Analysis"):
-                        st.json(phoneme_data)
-
-                    st.markdown("### Comprehensive Speech Analysis")
-                    st.markdown(analysis_results)
-
-                    # Clean up
-                    if 'temp_audio_path' in locals():
-                        os.remove(temp_audio_path)
-
-                except Exception as e:
-                    st.error(f"Error during analysis: {str(e)}")
-                    if 'temp_audio_path' in locals():
-                        os.remove(temp_audio_path)
+        if transcription or audio_data or recording_id:  # Check if either is present
+            audio_bytes = base64.b64decode(audio_data) if audio_data else None
+            # A streamed recording is already on the server; only its id goes into the job
+            extra = {"recording_id": recording_id} if recording_id else {}
+            # Resubmitting the same audio with an edited transcript updates the previous report
+            audio_key = recording_id or (audio_fingerprint(audio_bytes) if audio_bytes else "")
+            last = st.session_state.get("last_recording_job")
+            if last and last["audio"] == audio_key:
+                extra["previous_job"] = last["job_id"]
+            job = job_store.get(submit_analysis_job(
+                audio_bytes,
+                source="recording",
+                **extra,
+                transcription=transcription,
+                language_hint=language_hint,
+                expected_topic=topic,
+                parallel_sections=parallel_sections,
+                structured=structured,
+                profile=profile
+            ))
+            st.session_state.last_recording_job = {"job_id": job["id"], "audio": audio_key}
         else:
             st.error("No audio or transcription provided. Please record or enter text before analyzing.")
 
+    in_progress = False
+    if job and job["params"].get("source") == "recording":
+        in_progress = render_job(job)
+
     # File upload section
     st.markdown("---")
     st.markdown("### 🎤 Or Upload an Audio File")
     audio_file = st.file_uploader("Upload your audio file (WAV/MP3)", type=["wav", "mp3"])
     if audio_file is not None:
-        with st.spinner("Analyzing your speech..."):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
-                temp_audio.write(audio_file.read())
-                temp_audio_path = temp_audio.name
-            try:
-                transcribed_text = transcribe_audio(temp_audio_path, model)
-                word_count = len(transcribed_text.split())
-                audio_duration = librosa.get_duration(path=temp_audio_path)
-                phoneme_data = analyze_phonetics(transcribed_text)
-                analysis_results = analyze_speech(
-                    transcribed_text,
-                    phoneme_data,
-                    audio_duration=audio_duration,
-                    word_count=word_count,
-                    language_hint=language_hint,
-                    expected_topic=expected_topic
-                )
-                st.markdown("## 📊 Analysis Results")
-                st.markdown("### Transcribed Speech:")
-                st.markdown(
-                    f'<div style="background-color: #e1f5fe; padding: 15px; border-radius: 10px;">{transcribed_text}</div>',
-                    unsafe_allow_html=True)
-                if audio_duration:
-                    st.markdown("### Audio Metrics")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.metric("Duration", f"{audio_duration:.2f} seconds")
-                    with col2:
-                        speaking_rate = round(word_count / (audio_duration / 60))
-                        st.metric("Speaking Rate", f"{speaking_rate} words/minute")
-                with st.expander("Show Phonetic Analysis"):
-                    st.json(phoneme_data)
-                st.markdown("### Comprehensive Speech Analysis")
-                st.markdown(analysis_results)
-                os.remove(temp_audio_path)
-            except Exception as e:
-                st.error(f"Error during analysis: {str(e)}")
-                if os.path.exists(temp_audio_path):
-                    os.remove(temp_audio_path)
-
+        audio_bytes = audio_file.getvalue()
+        # The uploader keeps its file across reruns; queue each upload once
+        if st.session_state.get("submitted_upload") != audio_fingerprint(audio_bytes):
+            st.session_state.submitted_upload = audio_fingerprint(audio_bytes)
+            job = job_store.get(submit_analysis_job(
+                audio_bytes,
+                source="upload",
+                language_hint=language_hint,
+                expected_topic=expected_topic,
+                parallel_sections=parallel_sections,
+                structured=structured,
+                profile=profile
+            ))
+    if job and job["params"].get("source") == "upload":
+        in_progress = render_job(job)
+
+    # Poll until the current job finishes
+    if in_progress:
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
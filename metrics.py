@@ -0,0 +1,164 @@
+"""Deterministic text metrics computed locally instead of by the LLM.
+
+Counts are computed over NumPy arrays of vocabulary indices, and syllables
+come from the CMU stress digits in analyze_phonetics output. The results are
+injected into the analysis prompt so the model reuses them rather than
+estimating them.
+"""
+import re
+
+import numpy as np
+
+FILLER_WORDS = {"um", "uh", "uhm", "umm", "er", "erm", "ah", "hmm", "mm"}
+# Words that are fillers only in a filler position ("it was, like, great", "basically, ...", "like like");
+# elsewhere ("I like English") they are ordinary words and are reported separately as possible fillers
+CONTEXT_FILLER_WORDS = {"like", "basically", "actually", "literally"}
+FILLER_PHRASES = {("you", "know"), ("i", "mean"), ("kind", "of"), ("sort", "of")}
+
+# Closed-class words; everything else counts as a content word for lexical density
+FUNCTION_WORDS = {
+    "a", "an", "the", "and", "or", "but", "nor", "so", "yet", "for", "if", "because", "as", "than", "that",
+    "though", "although", "while", "when", "whether", "of", "in", "on", "at", "to", "from", "by", "with",
+    "about", "into", "over", "after", "before", "under", "between", "through", "during", "without", "within",
+    "up", "down", "out", "off", "i", "me", "my", "mine", "you", "your", "yours", "he", "him", "his", "she", "her",
+    "hers", "it", "its", "we", "us", "our", "ours", "they", "them", "their", "theirs", "this", "these", "those",
+    "who", "whom", "whose", "which", "what", "there", "here", "be", "am", "is", "are", "was", "were", "been",
+    "being", "have", "has", "had", "do", "does", "did", "will", "would", "shall", "should", "can", "could",
+    "may", "might", "must", "not", "no", "im", "dont", "cant", "wont", "isnt", "arent", "very", "too",
+    "just", "also", "some", "any", "all", "each", "every", "such", "own", "same", "other", "then", "how",
+}
+
+VOWEL_GROUPS = re.compile(r"[aeiouy]+")
+# Punctuation marking a pause after a word; sentence-final stops are left out ("the things I like.")
+PAUSE_AFTER = re.compile(r"(,|;|:|-|\u2013|\u2014|\.\.\.|\u2026)$")
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens, cleaned the same way as analyze_phonetics keys."""
+    tokens = []
+    for word in text.lower().split():
+        clean_word = ''.join(e for e in word if e.isalnum())
+        if clean_word:
+            tokens.append(clean_word)
+    return tokens
+
+
+def syllables_for_word(word, phoneme_data):
+    """Syllable count from the CMU stress digits of the primary pronunciation."""
+    pronunciations = phoneme_data.get(word) if phoneme_data else None
+    if isinstance(pronunciations, list) and pronunciations:
+        return sum(1 for phone in pronunciations[0].split() if phone[-1].isdigit())
+    # Not in the dictionary: count vowel groups, ignoring a silent final 'e'
+    stem = word[:-1] if word.endswith("e") and len(word) > 2 else word
+    return max(1, len(VOWEL_GROUPS.findall(stem)))
+
+
+def _context_filler_positions(text, tokens):
+    """Boolean mask over tokens: context-dependent filler words used as fillers (a pause right after, or a repeat)."""
+    pause_after = []
+    for word in text.lower().split():
+        if any(c.isalnum() for c in word):
+            pause_after.append(bool(PAUSE_AFTER.search(word)))
+        elif pause_after and PAUSE_AFTER.search(word):
+            # A free-standing dash or ellipsis
+            pause_after[-1] = True
+    candidate = np.array([token in CONTEXT_FILLER_WORDS for token in tokens])
+    repeat = np.zeros(len(tokens), dtype=bool)
+    repeat[1:] = np.array(tokens[1:]) == np.array(tokens[:-1])
+    return candidate & (np.array(pause_after, dtype=bool) | repeat)
+
+
+def compute_text_metrics(text, phoneme_data=None, audio_duration=None, top_n=10):
+    tokens = tokenize(text)
+    metrics = {"word_count": len(tokens)}
+    if not tokens:
+        return metrics
+
+    vocabulary, inverse, counts = np.unique(np.array(tokens), return_inverse=True, return_counts=True)
+    is_function = np.array([word in FUNCTION_WORDS for word in vocabulary])
+    is_filler = np.array([word in FILLER_WORDS for word in vocabulary])
+    syllables = np.array([syllables_for_word(word, phoneme_data) for word in vocabulary])
+    filler_position = _context_filler_positions(text, tokens)
+    context_fillers = np.bincount(inverse[filler_position], minlength=len(vocabulary))
+    is_context = np.array([word in CONTEXT_FILLER_WORDS for word in vocabulary])
+
+    content_words = int(counts[~is_function & ~is_filler].sum() - context_fillers[~is_function].sum())
+    syllable_count = int(syllables[inverse].sum())
+    metrics.update({
+        "unique_word_count": int(len(vocabulary)),
+        "type_token_ratio": round(len(vocabulary) / len(tokens), 3),
+        "content_word_count": content_words,
+        "lexical_density": round(100 * content_words / len(tokens), 1),
+        "syllable_count": syllable_count,
+    })
+
+    # Fillers: single words plus two-word phrases found on adjacent token pairs
+    filler_counts = {str(word): int(count) for word, count in zip(vocabulary[is_filler], counts[is_filler])}
+    filler_counts.update({str(vocabulary[i]): int(context_fillers[i]) for i in np.flatnonzero(context_fillers)})
+    if len(tokens) > 1:
+        for first, second in FILLER_PHRASES:
+            first_index = np.searchsorted(vocabulary, first)
+            second_index = np.searchsorted(vocabulary, second)
+            if first_index < len(vocabulary) and vocabulary[first_index] == first \
+                    and second_index < len(vocabulary) and vocabulary[second_index] == second:
+                phrase_count = int(np.count_nonzero((inverse[:-1] == first_index) & (inverse[1:] == second_index)))
+                if phrase_count:
+                    filler_counts[f"{first} {second}"] = phrase_count
+    metrics["filler_counts"] = dict(sorted(filler_counts.items(), key=lambda item: -item[1]))
+    metrics["total_fillers"] = sum(filler_counts.values())
+    # Other uses of the context-dependent words, for the model to judge instead of counting as fillers
+    metrics["possible_filler_counts"] = {str(vocabulary[i]): int(counts[i] - context_fillers[i])
+                                         for i in np.flatnonzero(is_context & (counts > context_fillers))}
+
+    # Repetition: repeated content words, repeated two-word phrases and immediate repeats ("I I think")
+    word_counts = counts - context_fillers
+    repeated = np.flatnonzero((word_counts > 1) & ~is_function & ~is_filler)
+    repeated = repeated[np.argsort(-word_counts[repeated], kind="stable")][:top_n]
+    metrics["repeated_words"] = {str(vocabulary[i]): int(word_counts[i]) for i in repeated}
+
+    if len(tokens) > 1:
+        pair_ids = inverse[:-1].astype(np.int64) * len(vocabulary) + inverse[1:]
+        pairs, pair_counts = np.unique(pair_ids, return_counts=True)
+        content_pair = ~(is_function[pairs // len(vocabulary)] & is_function[pairs % len(vocabulary)])
+        top_pairs = np.flatnonzero((pair_counts > 1) & content_pair)
+        top_pairs = top_pairs[np.argsort(-pair_counts[top_pairs], kind="stable")][:top_n]
+        metrics["repeated_phrases"] = {
+            f"{vocabulary[pairs[i] // len(vocabulary)]} {vocabulary[pairs[i] % len(vocabulary)]}": int(pair_counts[i])
+            for i in top_pairs
+        }
+        metrics["immediate_repetitions"] = int(np.count_nonzero(inverse[:-1] == inverse[1:]))
+    else:
+        metrics["repeated_phrases"] = {}
+        metrics["immediate_repetitions"] = 0
+
+    if audio_duration:
+        minutes = audio_duration / 60
+        metrics["words_per_minute"] = round(len(tokens) / minutes, 1)
+        metrics["syllables_per_minute"] = round(syllable_count / minutes, 1)
+
+    return metrics
+
+
+def format_metrics_for_prompt(metrics):
+    """Render metrics as a compact bullet list for the analysis prompt."""
+    labels = [
+        ("word_count", "Total Word Count"),
+        ("unique_word_count", "Unique Word Count"),
+        ("type_token_ratio", "Type-Token Ratio"),
+        ("lexical_density", "Lexical Density (%)"),
+        ("syllable_count", "Syllable Count"),
+        ("words_per_minute", "Words Per Minute"),
+        ("syllables_per_minute", "Syllables Per Minute"),
+        ("total_fillers", "Total Fillers"),
+        ("immediate_repetitions", "Immediate Word Repetitions"),
+    ]
+    lines = [f"- **{label}:** {metrics[key]}" for key, label in labels if key in metrics]
+    for key, label in [("filler_counts", "Filler Counts"),
+                       ("possible_filler_counts", "Possible Fillers (context-dependent, not counted above)"),
+                       ("repeated_words", "Repeated Words"), ("repeated_phrases", "Repeated Phrases")]:
+        values = metrics.get(key)
+        if values:
+            lines.append(f"- **{label}:** " + ", ".join(f"{word}: {count}" for word, count in values.items()))
+        elif key in metrics:
+            lines.append(f"- **{label}:** none")
+    return "\n".join(lines)
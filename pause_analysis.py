@@ -0,0 +1,131 @@
+"""Pause and fluency statistics measured from the audio waveform.
+
+Decoded 16 kHz mono samples (see audio_io) are consumed in fixed-size blocks
+and only one RMS value per 10 ms frame is kept, so the frame buffers stay
+small for hour-long files. Frames are classified as silent against an
+adaptive energy threshold, and silent runs between speech are reported as
+pauses. Everything is NumPy array arithmetic, with no per-sample Python loops.
+"""
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.025
+HOP_SECONDS = 0.010
+
+MIN_PAUSE_SECONDS = 0.25       # shorter silences are articulation gaps, not pauses
+HESITATION_SECONDS = 1.0       # silences at least this long count as hesitation pauses
+MIN_SPEECH_SECONDS = 0.10      # shorter bursts inside silence are treated as noise
+
+
+def iter_array_blocks(samples, sample_rate=SAMPLE_RATE, block_seconds=60):
+    block = int(block_seconds * sample_rate)
+    for start in range(0, len(samples), block):
+        yield samples[start:start + block]
+
+
+def frame_rms_db(blocks, sample_rate=SAMPLE_RATE):
+    """Per-frame RMS energy in dB over a stream of sample blocks."""
+    frame_length = int(FRAME_SECONDS * sample_rate)
+    hop_length = int(HOP_SECONDS * sample_rate)
+    carry = np.zeros(0, dtype=np.float32)
+    energies = []
+    total_samples = 0
+    for block in blocks:
+        total_samples += len(block)
+        buffer = np.concatenate([carry, block.astype(np.float32, copy=False)])
+        if len(buffer) < frame_length:
+            carry = buffer
+            continue
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, frame_length)[::hop_length]
+        energies.append(np.sqrt(np.mean(np.square(frames), axis=1)))
+        carry = buffer[len(frames) * hop_length:]
+
+    rms = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+    return 20 * np.log10(np.maximum(rms, 1e-5)), total_samples / sample_rate
+
+
+def _runs(mask):
+    """Start and end frame indices of the True runs in a boolean array."""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_pauses(energy_db, threshold_db=None):
+    """Return (pause_starts, pause_ends, speech_mask) in frame units."""
+    if threshold_db is None:
+        # Adaptive: 30% of the way from the noise floor to typical speech level
+        noise_floor, speech_level = np.percentile(energy_db, [10, 95])
+        threshold_db = noise_floor + 0.3 * (speech_level - noise_floor)
+    speech = energy_db > threshold_db
+
+    # Drop speech bursts too short to be speech (clicks, breaths)
+    starts, ends = _runs(speech)
+    short = (ends - starts) < int(MIN_SPEECH_SECONDS / HOP_SECONDS)
+    if short.any():
+        cover = np.zeros(len(speech) + 1, dtype=np.int32)
+        np.add.at(cover, starts[short], 1)
+        np.add.at(cover, ends[short], -1)
+        speech[np.cumsum(cover[:-1]) > 0] = False
+
+    silent_starts, silent_ends = _runs(~speech)
+    # Leading and trailing silence are not pauses
+    inner = (silent_starts > 0) & (silent_ends < len(speech))
+    long_enough = (silent_ends - silent_starts) >= int(MIN_PAUSE_SECONDS / HOP_SECONDS)
+    keep = inner & long_enough
+    return silent_starts[keep], silent_ends[keep], speech
+
+
+def summarize_pauses(energy_db, duration, word_count=None, syllable_count=None, threshold_db=None):
+    if len(energy_db) == 0 or duration <= 0:
+        return {"total_pauses": 0, "audio_duration": duration}
+
+    starts, ends, speech = detect_pauses(energy_db, threshold_db)
+    durations = (ends - starts) * HOP_SECONDS
+    hesitations = durations >= HESITATION_SECONDS
+
+    # Speech time runs from the first to the last voiced frame, minus the pauses in between
+    voiced = np.flatnonzero(speech)
+    span = (voiced[-1] - voiced[0] + 1) * HOP_SECONDS if len(voiced) else 0.0
+    pause_time = float(durations.sum())
+    speech_time = max(span - pause_time, 0.0)
+
+    stats = {
+        "audio_duration": round(duration, 2),
+        "total_pauses": int(len(durations)),
+        "natural_pauses": int(np.count_nonzero(~hesitations)),
+        "hesitation_pauses": int(np.count_nonzero(hesitations)),
+        "mean_pause_duration": round(float(durations.mean()), 2) if len(durations) else 0.0,
+        "longest_pause": round(float(durations.max()), 2) if len(durations) else 0.0,
+        "total_pause_time": round(pause_time, 2),
+        "speech_time": round(speech_time, 2),
+        "pause_to_speech_ratio": round(pause_time / speech_time, 3) if speech_time else None,
+    }
+    if word_count and len(durations):
+        stats["words_per_pause"] = round(word_count / len(durations), 1)
+    if speech_time:
+        if syllable_count:
+            stats["articulation_rate"] = round(syllable_count / speech_time, 2)
+        if word_count:
+            stats["words_per_minute_excluding_pauses"] = round(word_count / (speech_time / 60), 1)
+    return stats
+
+
+def analyze_pauses_array(samples, sample_rate=SAMPLE_RATE, word_count=None, syllable_count=None):
+    """Pause statistics for already-decoded mono samples."""
+    energy_db, duration = frame_rms_db(iter_array_blocks(samples, sample_rate), sample_rate)
+    return summarize_pauses(energy_db, duration, word_count, syllable_count)
+
+
+def format_pauses_for_prompt(stats):
+    labels = [
+        ("total_pauses", "Total Pauses"),
+        ("natural_pauses", f"Natural Pauses ({MIN_PAUSE_SECONDS}-{HESITATION_SECONDS} s)"),
+        ("hesitation_pauses", f"Hesitation Pauses (>= {HESITATION_SECONDS} s)"),
+        ("words_per_pause", "Pause Frequency (words per pause)"),
+        ("mean_pause_duration", "Average Pause Duration (s)"),
+        ("longest_pause", "Longest Pause (s)"),
+        ("pause_to_speech_ratio", "Pause-to-Speech Ratio"),
+        ("articulation_rate", "Articulation Rate (syllables/s, excluding pauses)"),
+        ("words_per_minute_excluding_pauses", "Words Per Minute Excluding Pauses"),
+    ]
+    return "\n".join(f"- **{label}:** {stats[key]}" for key, label in labels if stats.get(key) is not None)
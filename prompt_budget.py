@@ -0,0 +1,100 @@
+"""Token counting and compact, budgeted encoding of the prompt inputs.
+
+The phonetic data goes into the prompt as a deduplicated table: one line per
+word that matters for pronunciation feedback (content words, first
+occurrence order), primary pronunciation only, and a single line listing the
+words with no pronunciation. When a prompt would exceed the token budget the
+table is cut back to the most informative words and the transcript is
+replaced by evenly spaced excerpts; the precomputed metrics still cover the
+full recording.
+
+Token counts use tiktoken when it is installed and a characters-per-token
+estimate otherwise.
+"""
+import functools
+import os
+
+import numpy as np
+
+from metrics import FILLER_WORDS, FUNCTION_WORDS, syllables_for_word
+
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv("ANALYSIS_PROMPT_TOKEN_BUDGET", "12000"))
+CHARS_PER_TOKEN = 4
+NO_PHONEME = "No phoneme found"
+# Share of the tokens left for inputs that the phonetic table may use when trimming
+PHONEME_SHARE = 0.35
+TRANSCRIPT_EXCERPTS = 3
+EXCERPT_SEPARATOR = " [...] "
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def phoneme_entries(phoneme_data):
+    """[(word, primary pronunciation, estimated)] for words worth assessing, plus the words with no pronunciation.
+
+    estimated is True for spelling-based guesses ({"estimated": phones}) of words not in the dictionary.
+    """
+    entries, missing = [], []
+    for word, pronunciations in phoneme_data.items():
+        if word in FUNCTION_WORDS or word in FILLER_WORDS:
+            continue
+        if isinstance(pronunciations, list) and pronunciations:
+            entries.append((word, pronunciations[0], False))
+        elif isinstance(pronunciations, dict) and pronunciations.get("estimated"):
+            entries.append((word, pronunciations["estimated"], True))
+        else:
+            missing.append(word)
+    return entries, missing
+
+
+def encode_phonemes(phoneme_data, max_tokens=None, model="gpt-4o-mini"):
+    """Compact text table of primary pronunciations, cut to max_tokens keeping multi-syllable words first."""
+    entries, missing = phoneme_entries(phoneme_data)
+    lines = [f"{word}: {phones}{' (estimate)' if estimated else ''}" for word, phones, estimated in entries]
+    missing_line = f"{NO_PHONEME}: {', '.join(missing)}" if missing else ""
+
+    if max_tokens is not None:
+        budget = max_tokens - (count_tokens(missing_line, model) if missing_line else 0)
+        # Longer words carry more pronunciation information; keep them first, then restore transcript order
+        syllables = np.array([syllables_for_word(word, phoneme_data) for word, _, _ in entries], dtype=int)
+        order = np.argsort(-syllables, kind="stable")
+        line_tokens = np.array([count_tokens(lines[i] + "\n", model) for i in order], dtype=int)
+        kept = np.sort(order[np.cumsum(line_tokens) <= budget])
+        lines = [lines[i] for i in kept]
+        if missing_line and budget < 0:
+            missing_line = ""
+
+    if missing_line:
+        lines.append(missing_line)
+    return "\n".join(lines)
+
+
+def sample_transcript(text, max_tokens, model="gpt-4o-mini", excerpts=TRANSCRIPT_EXCERPTS):
+    """The transcript if it fits, otherwise evenly spaced excerpts (start, middle, end) that do."""
+    total_tokens = count_tokens(text, model)
+    if total_tokens <= max_tokens:
+        return text, False
+    words = text.split()
+    separators = count_tokens(EXCERPT_SEPARATOR, model) * (excerpts - 1)
+    words_per_excerpt = max(1, int(len(words) * (max_tokens - separators) / total_tokens / excerpts))
+    starts = np.linspace(0, len(words) - words_per_excerpt, excerpts).astype(int)
+    sampled = EXCERPT_SEPARATOR.join(" ".join(words[start:start + words_per_excerpt]) for start in starts)
+    return sampled, True
+
@@ -0,0 +1,404 @@
+"""Text of the speech analysis prompt, split into parts that can be recombined.
+
+build_analysis_prompt in main.py assembles the full 15-section protocol from
+these parts; the parallel section mode sends each SECTION_GROUPS entry as its
+own request with the same input data and guidelines.
+"""
+import re
+
+PROMPT_INTRO = """\
+# Comprehensive English Speech Analysis Protocol
+
+Analyze the provided English speech transcript according to these precise guidelines to generate a standardized assessment report.
+"""
+
+LEVEL_GUIDELINES = """\
+## Advanced Level Differentiation Guidelines
+
+### CEFR Level Granular Markers
+
+#### A1-A2 Specific Indicators:
+- Vocabulary Range: 300-1500 words
+- Primarily simple present tense usage
+- Frequent grammatical errors
+- Highly fragmented speech patterns
+- Pronunciation challenges
+- Speaking rate: 40-60 words per minute
+- High communication breakdown percentage (30-50%)
+
+#### B1-B2 Nuanced Characteristics:
+- Vocabulary Range: 1500-4000 words
+- Multi-tense usage with increasing complexity
+- Moderate to minimal grammatical errors
+- Developing complex sentence structures
+- Clearer pronunciation
+- Speaking rate: 60-130 words per minute
+- Reduced communication imprecision (10-25%)
+
+#### C1-C2 Sophisticated Markers:
+- Vocabulary Range: 4000-8000+ words
+- Advanced grammatical manipulation
+- Near-native discourse capabilities
+- Minimal to zero grammatical errors
+- Academic/professional level language use
+- Speaking rate: 130-180 words per minute
+- Virtually zero communication barriers
+"""
+
+ANALYSIS_SECTIONS = {
+    1: """\
+### 1. CEFR Level Assessment
+
+Provide a precise CEFR rating (A1-C2) for each category with supporting evidence:
+
+| Category | Rating | Evidence |
+|----------|--------|----------|
+| Fluency | [CEFR Level] | [Specific evidence from transcript] |
+| Grammar | [CEFR Level] | [Specific evidence from transcript] |
+| Vocabulary | [CEFR Level] | [Specific evidence from transcript] |
+| Pronunciation | [CEFR Level] | [Specific evidence from transcript] |
+| Interaction | [CEFR Level] | [Specific evidence from transcript] |
+| **Overall CEFR Level** | [CEFR Level] | [Summary justification] |
+""",
+    2: """\
+### 2. Quantitative Strengths & Weaknesses Analysis
+
+**Strengths:**
+- **Grammar Accuracy:** [X]% of sentences grammatically correct
+- **Sentence Complexity:** [X]% complex sentences, [X]% compound sentences, [X]% simple sentences
+- **Advanced Constructions:** [Exact number] of [specific constructions] used
+- **Vocabulary Range:** [Specific metrics about vocabulary diversity]
+
+**Areas for Improvement:**
+- **Speaking Rate:** [Specific comparison to target range with percentage deviation]
+- **Filler Usage:** [Exact count] of each filler word/phrase
+- **Word Repetition:** [Specific words/phrases with exact repetition counts]
+- **Linking Words:** [Analysis of connector usage with specific metrics]
+""",
+    3: """\
+### 3. Native-Like Rephrasing
+
+Identify exactly 5 non-native-like constructions and provide native-like alternatives:
+
+| Non-Native Construction | Native-Like Alternative | Improvement Explanation |
+|-------------------------|-------------------------|-------------------------|
+| [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
+| [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
+| [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
+| [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
+| [Direct quote from transcript] | [Improved version] | [Specific linguistic explanation] |
+""",
+    4: """\
+### 4. Vocabulary Metrics
+
+**Quantitative Analysis:**
+- **Total Word Count:** [Exact number]
+- **Unique Word Count:** [Exact number]
+- **Type-Token Ratio:** [Calculated ratio]
+- **Lexical Density:** [Calculated percentage]
+- **Academic Word List Coverage:** [Percentage of academic vocabulary]
+
+**CEFR Level Distribution:**
+- A1: [X]% ([number] words)
+- A2: [X]% ([number] words)
+- B1: [X]% ([number] words)
+- B2: [X]% ([number] words)
+- C1: [X]% ([number] words)
+- C2: [X]% ([number] words)
+""",
+    5: """\
+### 5. Word Level Classification Table
+
+Provide exactly 5 examples for each CEFR level:
+
+| CEFR Level | Word/Phrase Examples |
+|------------|----------------------|
+| A1 | [5 specific examples from transcript] |
+| A2 | [5 specific examples from transcript] |
+| B1 | [5 specific examples from transcript] |
+| B2 | [5 specific examples from transcript] |
+| C1 | [5 specific examples from transcript] |
+| C2 | [5 specific examples from transcript] |
+""",
+    6: """\
+### 6. Word Repetition Analysis
+
+**High-Frequency Words/Phrases:**
+- [Word/phrase]: [Exact count] occurrences
+- [Word/phrase]: [Exact count] occurrences
+- [Word/phrase]: [Exact count] occurrences
+- [Word/phrase]: [Exact count] occurrences
+- [Word/phrase]: [Exact count] occurrences
+
+**Suggested Alternatives:**
+- For [word/phrase]: [alternative 1], [alternative 2], [alternative 3]
+- For [word/phrase]: [alternative 1], [alternative 2], [alternative 3]
+""",
+    7: """\
+### 7. Speaking Rate and Pause Analysis
+
+**Rate Metrics:**
+- **Words Per Minute:** [Exact number]
+- **Syllables Per Minute:** [Estimated number]
+- **Comparison to Native Range:** [Deviation percentage]
+
+**Pause Analysis:**
+- **Total Pauses:** [Exact number]
+- **Natural Pauses:** [Exact number] ([X]%)
+- **Hesitation Pauses:** [Exact number] ([X]%)
+- **Pause Frequency:** 1 pause every [X] words
+- **Average Pause Duration:** [Estimated duration]
+
+**Fluency Assessment:**
+- **Pause-to-Speech Ratio:** [Calculated ratio]
+- **Flow Disruption Score:** [Quantitative measure]
+- **Specific Disruption Patterns:** [List of patterns with examples]
+""",
+    8: """\
+### 8. Pronunciation Analysis
+
+**Phoneme Accuracy:**
+- **Vowels:** [X]% accuracy
+- **Consonants:** [X]% accuracy
+- **Consonant Clusters:** [X]% accuracy
+- **Diphthongs:** [X]% accuracy
+
+**Specific Issues:**
+- [Phoneme]: [Description of issue] in words [example 1], [example 2]
+- [Phoneme]: [Description of issue] in words [example 1], [example 2]
+
+**Prosodic Features:**
+- **Word Stress:** [Analysis with specific examples]
+- **Sentence Stress:** [Analysis with specific examples]
+- **Intonation Patterns:** [Analysis with specific examples]
+- **Rhythm:** [Analysis with specific examples]
+""",
+    9: """\
+### 9. Mother Tongue Influence (MTI)
+
+- **Identified First Language:** [Language] (confidence level: [high/medium/low])
+- **Phonological Influences:** [Specific patterns with examples]
+- **Syntactic Influences:** [Specific patterns with examples]
+- **Lexical Influences:** [Specific patterns with examples]
+""",
+    10: """\
+### 10. Grammar Analysis
+
+**Accuracy Statistics:**
+- **Error-Free Clauses:** [X]%
+- **Error-Free T-Units:** [X]%
+
+**Grammar Strengths:**
+- [Specific construction]: Used correctly [X] times
+- [Specific construction]: Used correctly [X] times
+
+**Grammar Errors:**
+- [Error type]: [X] instances (e.g., [example from transcript])
+- [Error type]: [X] instances (e.g., [example from transcript])
+""",
+    11: """\
+### 11. Improvement Plan
+
+| Priority | Focus Area | Specific Exercise | Expected Outcome | Time Frame |
+|----------|------------|-------------------|------------------|------------|
+| 1 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
+| 2 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
+| 3 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
+| 4 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
+| 5 | [Area] | [Detailed exercise] | [Measurable outcome] | [Duration] |
+""",
+    12: """\
+### 12. Topic Relevance Analysis
+
+- **Expected Topic:** [Topic]
+- **Relevance Score:** [0-10]
+- **On-Topic Content:** [X]%
+- **Off-Topic Content:** [X]%
+- **Main Digressions:** [List with frequency]
+- **Coherence Assessment:** [Analysis of logical flow]
+""",
+    13: """\
+### 13. Linguistic Dimension Weights
+
+**Weighted Assessment Criteria:**
+- **Grammar:** 25% (Structural accuracy, complexity)
+- **Vocabulary:** 20% (Range, appropriateness, diversity)
+- **Pronunciation:** 15% (Clarity, accent, intelligibility)
+- **Fluency:** 15% (Speech rate, cohesion, naturalness)
+- **Discourse Management:** 15% (Topic relevance, logical progression)
+- **Interaction:** 10% (Responsive communication effectiveness)
+""",
+    14: """\
+### 14. Mother Tongue Influence (MTI) Deep Analysis
+
+- **Linguistic Transfer Mapping:**
+  - Identify specific phonological transfers
+  - Quantify syntactic influence percentage
+  - Trace lexical borrowing patterns
+- **Accent Influence Score:** [Quantitative measure of native language impact]
+- **Communication Strategy Adaptations:** [Specific recommendations]
+""",
+    15: """\
+### 15. Adaptive Improvement Recommendations
+
+- **Personalized Learning Trajectory:**
+  - Machine learning-informed skill development path
+  - Domain-specific language improvement strategies
+  - Targeted intervention recommendations based on detected weaknesses
+""",
+}
+
+REPORT_REQUIREMENTS = """\
+## Report Format Requirements
+
+1. All sections must be completed with precise quantitative data where applicable
+2. No subjective evaluations without supporting evidence
+3. All examples must be direct quotes from the transcript
+4. Tables must be properly formatted with aligned columns
+5. Numerical data must include units of measurement where appropriate
+6. Analysis must be evidence-based with specific references to the speech content
+7. All improvement recommendations must be actionable and specific
+"""
+
+PRECOMPUTED_METRICS_HEADER = """\
+## Precomputed Metrics
+
+These values were computed exactly from the transcript and audio. Copy them wherever the report asks for them \
+(word counts, type-token ratio, lexical density, filler and repetition counts, words and syllables per minute, \
+pause counts and durations, pause-to-speech ratio). \
+Do not recount, recalculate or estimate them.
+"""
+
+TOPIC_RELEVANCE_INSTRUCTION = (
+    "Please include this relevance analysis in your report. If no expected topic was provided, "
+    "note that topic relevance couldn't be assessed."
+)
+
+FORMAT_INSTRUCTION = "Please format your response with clear sections and bullet points for each category."
+
+# Structured mode: the sections are returned as one JSON object (schemas in structured_report.py)
+STRUCTURED_FORMAT_INSTRUCTION = """\
+Return the report as a single JSON object matching the response schema, with one key per section:
+{section_keys}
+Fill each section's fields with the content its template above asks for; quotes must be exact words from the \
+transcript, percentages are numbers from 0 to 100, and values that cannot be determined (no audio, no expected \
+topic) are null. Do not add markdown or any text outside the JSON object.
+"""
+
+# Sent once when a structured report fails to parse or validate
+STRUCTURED_REPAIR_PROMPT = """\
+The JSON report below does not match its schema. Return the corrected JSON object only, keeping all content \
+that is valid and changing only what the errors require.
+
+Errors:
+{errors}
+
+Report:
+{report}
+"""
+
+# Map step of the long-form mode: one short request per transcript segment, answered in JSON
+SEGMENT_PROMPT = """\
+You are assessing one segment of a longer English speech recording by a language learner.
+Segment {position} of {total}{time_range}. {language_hint_text}
+
+Transcript segment:
+"{transcript}"
+
+Return a JSON object with exactly these keys and nothing else:
+- "grammar_errors": list of {{"quote": exact words from the segment, "correction": corrected form, \
+"type": one of "tense", "agreement", "article", "preposition", "word order", "word form", "other"}}
+- "vocabulary": {{"advanced": list of well-used advanced words or phrases, \
+"misused": list of {{"quote": ..., "suggestion": ...}}}}
+- "pronunciation_risks": list of {{"word": ..., "issue": likely difficulty for this speaker}}
+- "cefr_signals": {{"grammar": CEFR level, "vocabulary": CEFR level, "fluency": CEFR level, \
+"coherence": CEFR level}}
+- "topics": list of up to 3 short phrases describing what the segment is about
+Use only evidence from this segment. Do not count fillers or words; they are measured separately.
+"""
+
+PRONUNCIATION_EVIDENCE_HEADER = """\
+### Pronunciation Evidence (speech recognizer confidence per word)
+
+Confidence is how sure the speech recognizer was of each word, lowered for words held much longer or shorter \
+than the speaker's usual time per phone. In section 8, report the confidence by phoneme class as the accuracy \
+percentages, and take Specific Issues from the lowest-confidence phonemes and words below instead of guessing \
+from the transcript.
+"""
+
+SEGMENT_FINDINGS_HEADER = """\
+### Findings per Segment (first pass over the whole recording)
+
+The recording was too long to assess in one pass, so each segment was assessed separately. \
+Base the report on these findings together with the transcript and metrics above; \
+quote errors from the lists below.
+"""
+
+# Independent section groups for the parallel mode, in report order of their first section
+SECTION_GROUPS = [
+    ("cefr", [1, 2]),
+    ("rephrasing", [3]),
+    ("vocabulary", [4, 5, 6]),
+    ("fluency", [7]),
+    ("pronunciation", [8, 9, 14]),
+    ("grammar", [10]),
+    ("improvement", [11, 15]),
+    ("topic", [12, 13]),
+]
+
+# Sections that quote the transcript or report counts taken from it (CEFR evidence, filler/repetition/accuracy
+# counts, vocabulary metrics, speaking rate and words per pause, grammar). A small edit to the transcript (a typo,
+# a misrecognized word) only regenerates these; the rest of the previous report is kept.
+EDIT_SENSITIVE_SECTIONS = [1, 2, 3, 4, 5, 6, 7, 10]
+
+SECTION_HEADING = re.compile(r"^\s*#{1,4}\s*\**\s*(\d{1,2})\.", re.MULTILINE)
+
+
+def sections_text(section_numbers):
+    return "\n".join(ANALYSIS_SECTIONS[number] for number in section_numbers)
+
+
+def closing_instructions(section_numbers, format_instruction=FORMAT_INSTRUCTION):
+    parts = [REPORT_REQUIREMENTS]
+    if 12 in section_numbers:
+        parts.append(TOPIC_RELEVANCE_INSTRUCTION + "\n")
+    parts.append(format_instruction.rstrip("\n") + "\n")
+    return "\n".join(parts)
+
+
+def group_instruction(section_numbers):
+    numbers = ", ".join(str(number) for number in section_numbers)
+    noun = "section" if len(section_numbers) == 1 else "sections"
+    return (
+        f"Produce ONLY {noun} {numbers} of the report below. Other sections are generated separately, "
+        "so do not add an introduction, a summary or any other section. Start each section with its "
+        "original '### <number>. <title>' heading.\n"
+    )
+
+
+def split_sections(report, section_numbers):
+    """Split a generated report into {section number: markdown} using its '### N.' headings.
+
+    Text that cannot be attributed to an expected heading is kept with the
+    first section so nothing the model wrote is dropped.
+    """
+    matches = [m for m in SECTION_HEADING.finditer(report) if int(m.group(1)) in section_numbers]
+    if not matches:
+        return {section_numbers[0]: report.strip()}
+
+    sections = {}
+    preamble = report[:matches[0].start()].strip()
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(report)
+        number = int(match.group(1))
+        body = report[match.start():end].strip()
+        sections[number] = f"{sections[number]}\n\n{body}" if number in sections else body
+    if preamble:
+        first = int(matches[0].group(1))
+        sections[first] = f"{preamble}\n\n{sections[first]}"
+    return sections
+
+
+def merge_sections(sections):
+    """Join {section number: markdown} back into one report in protocol order."""
+    return "\n\n".join(sections[number] for number in sorted(sections) if sections[number])
@@ -0,0 +1,251 @@
+"""Precompiled, memory-mapped CMU pronunciation index.
+
+The CMU dictionary (the same data `pronouncing` reads) is compiled once into
+a directory of flat NumPy arrays:
+
+- words.npy: sorted, unique words as fixed-width bytes
+- entry_offsets.npy: per word, the range of its pronunciations
+- pron_offsets.npy: per pronunciation, the range of its phones
+- phones.npy: interned phone IDs (uint8) for every pronunciation
+- inventory.json: the phone symbol for each ID
+
+Loading maps the arrays read-only, which takes milliseconds and lets every
+worker process share the same pages. Lookups deduplicate the tokens and
+binary-search them all at once. Words that are not in the dictionary get a
+rule-based grapheme-to-phoneme estimate instead of nothing, returned as
+{"estimated": phones} so it is never mistaken for a dictionary entry.
+
+Build ahead of time with `python pronunciation_index.py build`; otherwise the
+index is built on first use. The location is PRONUNCIATION_INDEX_DIR. Builds
+hold an exclusive lock on <index dir>.lock and loads a shared one, so
+processes starting together never read an index that is being replaced.
+"""
+import contextlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+import numpy as np
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "speech_analysis", "pronunciation_index")
+ARRAYS = ("words", "entry_offsets", "pron_offsets", "phones")
+
+DIGIT_WORDS = ("zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine")
+
+# Grapheme-to-phoneme rules, tried longest first at each position. Vowel phones get stress digits added later.
+G2P_RULES = {
+    "tion": "SH AH N", "sion": "ZH AH N", "ough": "AO", "augh": "AO", "eigh": "EY", "igh": "AY",
+    "tch": "CH", "dge": "JH", "sch": "S K", "que": "K", "ph": "F", "sh": "SH", "ch": "CH", "th": "TH",
+    "wh": "W", "ck": "K", "ng": "NG", "qu": "K W", "kn": "N", "wr": "R", "gh": "G",
+    "ee": "IY", "ea": "IY", "ie": "IY", "ai": "EY", "ay": "EY", "ey": "EY", "oa": "OW", "oo": "UW",
+    "ou": "AW", "ow": "OW", "oi": "OY", "oy": "OY", "au": "AO", "aw": "AO", "ew": "UW", "ue": "UW",
+    "ar": "AA R", "er": "ER", "ir": "ER", "ur": "ER", "or": "AO R",
+    "a": "AE", "b": "B", "c": "K", "d": "D", "e": "EH", "f": "F", "g": "G", "h": "HH", "i": "IH",
+    "j": "JH", "k": "K", "l": "L", "m": "M", "n": "N", "o": "AA", "p": "P", "q": "K", "r": "R",
+    "s": "S", "t": "T", "u": "AH", "v": "V", "w": "W", "x": "K S", "y": "IY", "z": "Z",
+}
+G2P_MAX_LENGTH = max(len(grapheme) for grapheme in G2P_RULES)
+# Vowel sound before a consonant and a silent final e ("make", "time", "home")
+LONG_VOWELS = {"a": "EY", "e": "IY", "i": "AY", "o": "OW", "u": "UW"}
+SOFT_BEFORE = re.compile(r"[eiy]")
+VOWEL_PHONES = {"AA", "AE", "AH", "AO", "AW", "AY", "EH", "ER", "EY", "IH", "IY", "OW", "OY", "UH", "UW"}
+
+
+def guess_phones(word):
+    """Rule-based ARPAbet estimate for a lowercase alphabetic word, stress on the first vowel."""
+    magic_e = len(word) > 3 and word.endswith("e") and word[-2] not in "aeiouy" and word[-3] in LONG_VOWELS
+    if magic_e:
+        word = word[:-1]
+    phones = []
+    i = 0
+    while i < len(word):
+        if magic_e and i == len(word) - 2:
+            phones.append(LONG_VOWELS[word[i]])
+            i += 1
+            continue
+        for length in range(min(G2P_MAX_LENGTH, len(word) - i), 0, -1):
+            grapheme = word[i:i + length]
+            if grapheme in G2P_RULES:
+                break
+        else:
+            i += 1
+            continue
+        if grapheme in ("c", "g") and SOFT_BEFORE.match(word[i + 1:i + 2]):
+            phones.append("S" if grapheme == "c" else "JH")
+        elif grapheme == "y" and i == 0:
+            phones.append("Y")
+        else:
+            phones.extend(G2P_RULES[grapheme].split())
+        i += length
+    # Collapse doubled letters ("ll", "ss") into one phone
+    phones = [phone for j, phone in enumerate(phones) if j == 0 or phone != phones[j - 1]]
+
+    stressed = []
+    first_vowel = True
+    for phone in phones:
+        if phone in VOWEL_PHONES:
+            phone += "1" if first_vowel else "0"
+            first_vowel = False
+        stressed.append(phone)
+    return " ".join(stressed)
+
+
+@contextlib.contextmanager
+def _index_lock(index_dir, exclusive):
+    if fcntl is None:
+        yield
+        return
+    lock_path = os.path.abspath(index_dir) + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _index_version(index_dir):
+    try:
+        with open(os.path.join(index_dir, "inventory.json")) as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def build_index(index_dir=DEFAULT_INDEX_DIR, force=True):
+    """Compile the CMU dictionary into index_dir (written to a temp dir, then swapped in).
+
+    With force=False an up-to-date index (e.g. one another process just built) is kept.
+    """
+    with _index_lock(index_dir, exclusive=True):
+        if force or _index_version(index_dir) != INDEX_VERSION:
+            _compile_index(index_dir)
+
+
+def _compile_index(index_dir):
+    import cmudict
+    import pronouncing
+
+    pronunciations = {}
+    for word, phones in pronouncing.parse_cmu(cmudict.dict_stream()):
+        pronunciations.setdefault(word, []).append(phones)
+
+    words = sorted(pronunciations)
+    inventory = sorted({phone for entries in pronunciations.values() for phones in entries for phone in phones.split()})
+    phone_ids = {phone: i for i, phone in enumerate(inventory)}
+
+    entry_offsets, pron_offsets, phone_list = [0], [0], []
+    for word in words:
+        for phones in pronunciations[word]:
+            phone_list.extend(phone_ids[phone] for phone in phones.split())
+            pron_offsets.append(len(phone_list))
+        entry_offsets.append(len(pron_offsets) - 1)
+
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent)
+    np.save(os.path.join(tmp_dir, "words.npy"), np.array([word.encode("utf-8") for word in words]))
+    np.save(os.path.join(tmp_dir, "entry_offsets.npy"), np.array(entry_offsets, dtype=np.int32))
+    np.save(os.path.join(tmp_dir, "pron_offsets.npy"), np.array(pron_offsets, dtype=np.int32))
+    np.save(os.path.join(tmp_dir, "phones.npy"), np.array(phone_list, dtype=np.uint8))
+    with open(os.path.join(tmp_dir, "inventory.json"), "w") as f:
+        json.dump({"version": INDEX_VERSION, "inventory": inventory}, f)
+
+    # Readers hold the shared lock while opening the arrays, and mapped files stay readable after the swap
+    old_dir = None
+    if os.path.exists(index_dir):
+        old_dir = tempfile.mkdtemp(dir=parent)
+        os.replace(index_dir, os.path.join(old_dir, "index"))
+    os.replace(tmp_dir, index_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class PronunciationIndex:
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        while not self._load():
+            build_index(index_dir, force=False)
+
+    def _load(self):
+        """Map the arrays; False if the index is missing or outdated."""
+        with _index_lock(self.index_dir, exclusive=False):
+            if _index_version(self.index_dir) != INDEX_VERSION:
+                return False
+            with open(os.path.join(self.index_dir, "inventory.json")) as f:
+                self.inventory = np.array(json.load(f)["inventory"], dtype=object)
+            for name in ARRAYS:
+                setattr(self, name, np.load(os.path.join(self.index_dir, f"{name}.npy"), mmap_mode="r"))
+        return True
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("PRONUNCIATION_INDEX_DIR", DEFAULT_INDEX_DIR))
+
+    def _pronunciations(self, position):
+        start, end = self.entry_offsets[position], self.entry_offsets[position + 1]
+        return [" ".join(self.inventory[self.phones[self.pron_offsets[p]:self.pron_offsets[p + 1]]])
+                for p in range(start, end)]
+
+    def lookup(self, words, fallback=True):
+        """Map each distinct word to its CMU pronunciations (same strings as pronouncing.phones_for_word).
+
+        Missing words get {"estimated": phones}, a rule-based estimate, when fallback is set and the word
+        has Latin letters or digits, [] otherwise.
+        """
+        unique = sorted(set(words))
+        if not unique:
+            return {}
+        query = np.array([word.encode("utf-8") for word in unique])
+        positions = np.searchsorted(self.words, query)
+        found = positions < len(self.words)
+        found[found] = self.words[positions[found]] == query[found]
+
+        results = {}
+        for word, position, is_found in zip(unique, positions, found):
+            if is_found:
+                results[word] = self._pronunciations(position)
+            else:
+                guess = self._guess(word) if fallback else None
+                results[word] = {"estimated": guess} if guess else []
+        return results
+
+    def _guess(self, word):
+        # Numbers are read digit by digit; other words go through the spelling rules
+        if word.isdigit():
+            digit_phones = self.lookup([DIGIT_WORDS[int(d)] for d in set(word)], fallback=False)
+            return " ".join(digit_phones[DIGIT_WORDS[int(d)]][0] for d in word)
+        letters = "".join(c for c in word if "a" <= c <= "z")
+        return guess_phones(letters) if letters else None
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_index():
+    """One index per process; the arrays themselves are shared between processes through the page cache."""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = PronunciationIndex.from_env()
+        return _shared_index
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["build"]:
+        sys.exit("Usage: python pronunciation_index.py build")
+    target = os.getenv("PRONUNCIATION_INDEX_DIR", DEFAULT_INDEX_DIR)
+    build_index(target)
+    print(f"Pronunciation index written to {target}")
@@ -0,0 +1,154 @@
+"""Per-word and per-phoneme pronunciation confidence from the recognizer's word output.
+
+With word_timestamps=True Whisper reports the start, end and probability of
+every word it transcribes. A word the model was unsure of, or one that took
+far longer or shorter than the speaker's usual time per phone, was probably
+hard to understand. Each word's confidence is its probability scaled down by
+that duration anomaly. The confidences are then spread over the word's CMU
+phones (from analyze_phonetics), so phonemes and phoneme classes that are
+consistently recognized with low confidence stand out. Everything is array
+arithmetic over all words at once.
+
+These are recognizer confidences, not a phonetic transcription of what was
+said: they show where the speech was hard to decode, and the report uses
+them as evidence instead of guessing from the text.
+"""
+import numpy as np
+
+from metrics import tokenize
+
+LOW_CONFIDENCE = 0.5
+# Time per phone within this factor of the speaker's median is not penalized
+DURATION_TOLERANCE = 2.0
+MIN_PHONEME_OCCURRENCES = 3
+MAX_LISTED_WORDS = 15
+MAX_LISTED_PHONEMES = 8
+MAX_EXAMPLES = 3
+DIPHTHONGS = {"AW", "AY", "EY", "OW", "OY"}
+
+
+def recognized_words(asr_result):
+    """Words that carry a probability, from the top level of a transcription result or from its segments."""
+    if not asr_result:
+        return []
+    words = asr_result.get("words") or [word for segment in asr_result.get("segments", [])
+                                        for word in segment.get("words", [])]
+    return [word for word in words if word.get("probability") is not None]
+
+
+def _format_time(seconds):
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+
+def _primary_phones(word, phoneme_data):
+    # Spelling-based estimates ({"estimated": phones}) get no phones, so they stay out of the phoneme figures
+    pronunciations = phoneme_data.get(word)
+    if isinstance(pronunciations, list) and pronunciations:
+        return pronunciations[0].split()
+    return []
+
+
+def score_pronunciation(words, phoneme_data, low_confidence=LOW_CONFIDENCE):
+    """Score Whisper words ({"word", "start", "end", "probability"}); None when there are none."""
+    entries = []
+    for word in words:
+        tokens = tokenize(word["word"])
+        if tokens:
+            entries.append((tokens[0], word["start"], word["end"], word["probability"],
+                            _primary_phones(tokens[0], phoneme_data)))
+    if not entries:
+        return None
+
+    tokens = [entry[0] for entry in entries]
+    starts = np.array([entry[1] for entry in entries], dtype=float)
+    durations = np.maximum(np.array([entry[2] for entry in entries], dtype=float) - starts, 0.0)
+    probabilities = np.clip(np.array([entry[3] for entry in entries], dtype=float), 0.0, 1.0)
+    phone_counts = np.array([max(1, len(entry[4])) for entry in entries])
+
+    # Words held much longer (hesitation, drawn-out sounds) or much shorter (swallowed) than usual lose confidence
+    per_phone = durations / phone_counts
+    timed = per_phone > 0
+    duration_ratio = np.ones(len(entries))
+    if timed.any():
+        duration_ratio[timed] = per_phone[timed] / np.median(per_phone[timed])
+    excess = np.maximum(np.abs(np.log(duration_ratio)) - np.log(DURATION_TOLERANCE), 0.0)
+    scores = probabilities * np.exp(-excess)
+
+    # Spread word scores over their phones
+    word_index = np.array([i for i, entry in enumerate(entries) for _ in entry[4]], dtype=int)
+    raw_phones = [phone for entry in entries for phone in entry[4]]
+    phoneme_classes, weakest = {}, []
+    if raw_phones:
+        names = np.array([phone.rstrip("012") for phone in raw_phones])
+        inventory, phone_ids = np.unique(names, return_inverse=True)
+        occurrence_scores = scores[word_index]
+        counts = np.bincount(phone_ids, minlength=len(inventory))
+        means = np.bincount(phone_ids, weights=occurrence_scores, minlength=len(inventory)) / counts
+
+        vowel = np.array([phone[-1].isdigit() for phone in raw_phones])
+        diphthong = np.isin(names, list(DIPHTHONGS))
+        consonant = ~vowel
+        same_word = word_index[1:] == word_index[:-1]
+        pair = consonant[1:] & consonant[:-1] & same_word
+        cluster = np.zeros(len(raw_phones), dtype=bool)
+        cluster[1:] |= pair
+        cluster[:-1] |= pair
+        for name, mask in (("vowels", vowel & ~diphthong), ("diphthongs", diphthong), ("consonants", consonant),
+                           ("consonant_clusters", cluster)):
+            if mask.any():
+                phoneme_classes[name] = {"mean_confidence": round(float(occurrence_scores[mask].mean()), 3),
+                                         "occurrences": int(mask.sum())}
+
+        frequent = np.flatnonzero(counts >= MIN_PHONEME_OCCURRENCES)
+        for phone_id in frequent[np.argsort(means[frequent])][:MAX_LISTED_PHONEMES]:
+            occurrences = word_index[phone_ids == phone_id]
+            examples = [tokens[i] for i in occurrences[np.argsort(scores[occurrences])]]
+            weakest.append({
+                "phoneme": str(inventory[phone_id]),
+                "occurrences": int(counts[phone_id]),
+                "mean_confidence": round(float(means[phone_id]), 3),
+                "examples": list(dict.fromkeys(examples))[:MAX_EXAMPLES],
+            })
+
+    low = np.flatnonzero(scores < low_confidence)
+    return {
+        "words_scored": len(entries),
+        "mean_confidence": round(float(scores.mean()), 3),
+        "low_confidence_threshold": low_confidence,
+        "low_confidence_count": int(len(low)),
+        "low_confidence_words": [{
+            "word": tokens[i],
+            "at": round(float(starts[i]), 2),
+            "confidence": round(float(scores[i]), 3),
+            "probability": round(float(probabilities[i]), 3),
+            "duration_ratio": round(float(duration_ratio[i]), 2),
+            "phones": " ".join(entries[i][4]),
+        } for i in low[np.argsort(scores[low])][:MAX_LISTED_WORDS]],
+        "phoneme_classes": phoneme_classes,
+        "weakest_phonemes": weakest,
+        "words": [{"word": token, "start": round(float(start), 2), "confidence": round(float(score), 3)}
+                  for token, start, score in zip(tokens, starts, scores)],
+    }
+
+
+def format_scores_for_prompt(scores):
+    lines = [f"- **Words Scored:** {scores['words_scored']}, mean recognition confidence "
+             f"{scores['mean_confidence']:.0%}",
+             f"- **Words Below {scores['low_confidence_threshold']:.0%} Confidence:** {scores['low_confidence_count']}"]
+    if scores["phoneme_classes"]:
+        lines.append("- **Confidence by Phoneme Class:** " + ", ".join(
+            f"{name.replace('_', ' ')} {entry['mean_confidence']:.0%} ({entry['occurrences']} phones)"
+            for name, entry in scores["phoneme_classes"].items()))
+    if scores["weakest_phonemes"]:
+        lines.append("- **Lowest-Confidence Phonemes:** " + "; ".join(
+            f"{entry['phoneme']} {entry['mean_confidence']:.0%} over {entry['occurrences']} "
+            f"(e.g. {', '.join(entry['examples'])})" for entry in scores["weakest_phonemes"]))
+    for entry in scores["low_confidence_words"]:
+        timing = ""
+        if entry["duration_ratio"] >= DURATION_TOLERANCE:
+            timing = f", held {entry['duration_ratio']:.1f}x the usual time per phone"
+        elif entry["duration_ratio"] <= 1 / DURATION_TOLERANCE:
+            timing = f", {entry['duration_ratio']:.1f}x the usual time per phone"
+        lines.append(f"  - [{_format_time(entry['at'])}] \"{entry['word']}\" /{entry['phones']}/ "
+                     f"{entry['confidence']:.0%}{timing}")
+    return "\n".join(lines)
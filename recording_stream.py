@@ -0,0 +1,427 @@
+"""Streaming upload of browser recordings.
+
+The recorder posts every MediaRecorder chunk (raw webm bytes, not base64) as
+soon as it is captured, to a small HTTP server running next to the app:
+
+    POST /recordings/<id>/chunks?seq=<n>   the next chunk, in order
+    POST /recordings/<id>/finish           the user pressed Stop
+
+Chunks are appended to a spool file and piped into one ffmpeg process per
+recording, whose 16 kHz mono float32 output goes to a second spool file.
+When a transcribe function is given, whenever another PIECE_SECONDS of audio
+has been decoded that piece (cut at the quietest frame near its end, so words
+are not split) is transcribed on a background thread. By the time the user
+presses Stop most of the recording is already decoded (and transcribed), and
+only the last piece is left.
+
+Neither side holds the whole recording in memory: the browser drops each
+chunk once the server has it, and the server reads the finished samples
+back through a memory map.
+
+The server is off unless RECORDING_PORT is set, and listens on localhost
+unless RECORDING_HOST says otherwise (put it behind the same proxy as the
+app). A recording can only be opened with an upload token the Streamlit page
+issued (sent as X-Recording-Token); the number of recordings being received
+and the bytes spooled on disk are capped.
+"""
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, DecodedAudio, decode_audio_file
+from pause_analysis import HOP_SECONDS, frame_rms_db, iter_array_blocks
+
+DEFAULT_RECORDING_DIR = os.path.join(os.path.expanduser("~"), ".cache", "speech_analysis", "recordings")
+DEFAULT_RECORDING_HOST = "127.0.0.1"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_SESSIONS = 4
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_TOKEN_TTL_SECONDS = 12 * 3600
+# A page's token is replaced once less than this is left, so a recording never starts on an expiring token
+TOKEN_RENEW_SECONDS = 3600
+PURGE_INTERVAL_SECONDS = 60
+MAX_CHUNK_BYTES = 8 * 1024 * 1024
+PIECE_SECONDS = 30
+SEARCH_SECONDS = 5.0
+READ_BYTES = 64 * 1024
+RECORDING_ID = re.compile(r"[0-9a-f]{32}")
+PATH = re.compile(r"/recordings/([0-9a-f]{32})/(chunks|finish)")
+
+
+class RecordingLimitError(RuntimeError):
+    """Raised when the server is already receiving as many recordings (or bytes) as it allows."""
+
+
+class RecordingSession:
+    """One recording being received, decoded and (optionally) transcribed piece by piece."""
+
+    def __init__(self, recording_id, directory, transcribe=None, piece_seconds=PIECE_SECONDS, token=None):
+        os.makedirs(directory, exist_ok=True)
+        self.id = recording_id
+        self.token = token
+        self.directory = directory
+        self.encoded_path = os.path.join(directory, "audio.webm")
+        self.samples_path = os.path.join(directory, "samples.f32")
+        self.transcribe = transcribe
+        self.piece_seconds = piece_seconds
+        self.next_seq = 0
+        self.bytes_received = 0
+        self.finished = False
+        self.last_activity = time.monotonic()
+        self._hash = hashlib.sha256()
+        self._lock = threading.Lock()
+        self._finish_lock = threading.Lock()
+        self._encoded = open(self.encoded_path, "wb")
+        self._samples = open(self.samples_path, "wb")
+        self._decoded_bytes = 0
+        self._transcribed_until = 0
+        self._pieces = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"recording-{recording_id[:8]}")
+        self._decoder = subprocess.Popen(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(SAMPLE_RATE), "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self._reader = threading.Thread(target=self._read_decoded, name=f"recording-decoder-{recording_id[:8]}",
+                                        daemon=True)
+        self._reader.start()
+
+    def add_chunk(self, seq, data):
+        with self._lock:
+            if self.finished:
+                raise ValueError("The recording has already finished")
+            # A chunk the browser resent after a lost response
+            if seq < self.next_seq:
+                return
+            if seq != self.next_seq:
+                raise ValueError(f"Expected chunk {self.next_seq}, got {seq}")
+            self._encoded.write(data)
+            self._hash.update(data)
+            try:
+                self._decoder.stdin.write(data)
+                self._decoder.stdin.flush()
+            except (BrokenPipeError, ValueError):
+                # The decoder gave up; finish() decodes the spooled file instead
+                pass
+            self.next_seq += 1
+            self.bytes_received += len(data)
+            self.last_activity = time.monotonic()
+
+    def _read_decoded(self):
+        while True:
+            data = self._decoder.stdout.read(READ_BYTES)
+            if not data:
+                break
+            self._samples.write(data)
+            self._samples.flush()
+            self._decoded_bytes += len(data)
+            self._schedule_pieces()
+
+    def _read_samples(self, start, end):
+        return np.fromfile(self.samples_path, dtype=np.float32, count=end - start, offset=start * 4)
+
+    def _schedule_pieces(self, final=False):
+        if self.transcribe is None:
+            return
+        available = self._decoded_bytes // 4
+        piece = int(self.piece_seconds * SAMPLE_RATE)
+        search = int(SEARCH_SECONDS * SAMPLE_RATE)
+        # Cut within the last SEARCH_SECONDS of each piece, so pieces fit one Whisper window
+        while available - self._transcribed_until >= piece:
+            window_start = self._transcribed_until + piece - search
+            window = self._read_samples(window_start, window_start + search)
+            energy_db, _ = frame_rms_db(iter_array_blocks(window))
+            cut = window_start + int(np.argmin(energy_db) * HOP_SECONDS * SAMPLE_RATE)
+            self._submit_piece(self._transcribed_until, cut)
+        if final and available > self._transcribed_until:
+            self._submit_piece(self._transcribed_until, available)
+
+    def _submit_piece(self, start, end):
+        self._pieces.append((start / SAMPLE_RATE,
+                             self._executor.submit(lambda: self.transcribe(self._read_samples(start, end)))))
+        self._transcribed_until = end
+
+    def finish(self):
+        """Stop receiving, wait for the decoder to drain and queue the last piece for transcription."""
+        with self._finish_lock:
+            with self._lock:
+                if self.finished:
+                    return
+                self.finished = True
+                self._encoded.close()
+                try:
+                    self._decoder.stdin.close()
+                except BrokenPipeError:
+                    pass
+            self._reader.join()
+            self._decoder.wait()
+            self._samples.close()
+            if self._decoder.returncode:
+                # Decode the whole spooled recording in one go; the pieces may have been cut short
+                decoded = decode_audio_file(self.encoded_path)
+                decoded.samples.astype(np.float32).tofile(self.samples_path)
+                self._decoded_bytes = len(decoded.samples) * 4
+                self._pieces, self._transcribed_until = [], 0
+            self._schedule_pieces(final=True)
+            self.last_activity = time.monotonic()
+
+    @property
+    def transcribing(self):
+        return self.transcribe is not None
+
+    def audio(self):
+        """The finished recording, memory-mapped from its spool file."""
+        self.finish()
+        samples = (np.memmap(self.samples_path, dtype=np.float32, mode="r") if self._decoded_bytes
+                   else np.zeros(0, dtype=np.float32))
+        return DecodedAudio(samples=samples, sample_rate=SAMPLE_RATE, fingerprint=self._hash.hexdigest())
+
+    def transcription(self):
+        """Whisper-shaped result stitched from the pieces; None if pieces were not transcribed or one failed."""
+        self.finish()
+        if not self.transcribing:
+            return None
+        try:
+            results = [(offset, future.result()) for offset, future in self._pieces]
+        except Exception:
+            return None
+        segments, language = [], None
+        for offset, result in results:
+            for segment in result.get("segments", []):
+                shifted = {**segment, "start": segment["start"] + offset, "end": segment["end"] + offset}
+                if segment.get("words"):
+                    shifted["words"] = [{**word, "start": word["start"] + offset, "end": word["end"] + offset}
+                                        for word in segment["words"]]
+                segments.append(shifted)
+            language = language or result.get("language")
+        for i, segment in enumerate(segments):
+            segment["id"] = i
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "words": [word for segment in segments for word in segment.get("words", [])],
+            "language": language,
+        }
+
+    def close(self):
+        with self._lock:
+            self.finished = True
+            if self._decoder.poll() is None:
+                self._decoder.kill()
+        self._reader.join(timeout=5)
+        for f in (self._encoded, self._samples):
+            f.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class RecordingStreams:
+    """All recordings this process is receiving, keyed by the id the browser chose.
+
+    Recordings are opened with a token from issue_token(), signed with `secret`
+    (RECORDING_SECRET; random per process if unset, so set it when several app
+    processes share one recording server).
+    """
+
+    def __init__(self, directory=DEFAULT_RECORDING_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 transcribe=None, piece_seconds=PIECE_SECONDS, secret=None, token_ttl_seconds=DEFAULT_TOKEN_TTL_SECONDS,
+                 max_sessions=DEFAULT_MAX_SESSIONS, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.transcribe = transcribe
+        self.piece_seconds = piece_seconds
+        self.secret = secret or secrets.token_bytes(32)
+        self.token_ttl_seconds = token_ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_total_bytes = max_total_bytes
+        self._sessions = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, transcribe=None):
+        secret = os.getenv("RECORDING_SECRET")
+        return cls(
+            directory=os.getenv("RECORDING_DIR", DEFAULT_RECORDING_DIR),
+            max_bytes=int(os.getenv("RECORDING_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            ttl_seconds=float(os.getenv("RECORDING_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            transcribe=transcribe,
+            secret=secret.encode("utf-8") if secret else None,
+            max_sessions=int(os.getenv("RECORDING_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+            max_total_bytes=int(os.getenv("RECORDING_MAX_TOTAL_BYTES", DEFAULT_MAX_TOTAL_BYTES)),
+        )
+
+    def _sign(self, payload):
+        return hmac.new(self.secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def issue_token(self, current=None):
+        """An upload token for one page; `current` is returned instead while it has time left."""
+        if current and self._token_expiry(current) > time.time() + TOKEN_RENEW_SECONDS:
+            return current
+        payload = f"{int(time.time() + self.token_ttl_seconds)}.{secrets.token_hex(8)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def _token_expiry(self, token):
+        """Expiry time of a token signed by this server, 0 for anything else."""
+        expires, _, rest = (token or "").partition(".")
+        nonce, _, signature = rest.partition(".")
+        if not expires.isdigit() or not hmac.compare_digest(signature, self._sign(f"{expires}.{nonce}")):
+            return 0
+        return int(expires)
+
+    def encoded_path(self, recording_id):
+        return os.path.join(self.directory, recording_id, "audio.webm")
+
+    def _authorized(self, recording_id, token):
+        session = self.get(recording_id)
+        if session is None:
+            raise ValueError("Unknown recording")
+        if not hmac.compare_digest(session.token, token or ""):
+            raise PermissionError("Invalid recording token")
+        return session
+
+    def add_chunk(self, recording_id, seq, data, token=None):
+        if not RECORDING_ID.fullmatch(recording_id):
+            raise ValueError("Invalid recording id")
+        with self._lock:
+            session = self._sessions.get(recording_id)
+            if session is None:
+                if seq != 0:
+                    raise ValueError("Unknown recording")
+                if self._token_expiry(token) < time.time():
+                    raise PermissionError("Invalid or expired recording token")
+                self._purge()
+                if sum(not s.finished for s in self._sessions.values()) >= self.max_sessions:
+                    raise RecordingLimitError("Too many recordings in progress")
+                session = RecordingSession(recording_id, os.path.join(self.directory, recording_id),
+                                           self.transcribe, self.piece_seconds, token)
+                self._sessions[recording_id] = session
+            spooled = sum(s.bytes_received for s in self._sessions.values())
+        session = self._authorized(recording_id, token)
+        if session.bytes_received + len(data) > self.max_bytes:
+            raise ValueError("The recording is too large")
+        if spooled + len(data) > self.max_total_bytes:
+            raise RecordingLimitError("Not enough space for more recordings")
+        session.add_chunk(seq, data)
+
+    def finish(self, recording_id, token=None):
+        self._authorized(recording_id, token).finish()
+
+    def get(self, recording_id):
+        """The live session, or None if this process is not receiving that recording."""
+        with self._lock:
+            return self._sessions.get(recording_id)
+
+    def purge(self):
+        """Delete recordings idle for longer than the TTL, including ones left on disk by other processes."""
+        with self._lock:
+            self._purge()
+
+    def _purge(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for recording_id, session in list(self._sessions.items()):
+            if session.last_activity < cutoff:
+                del self._sessions[recording_id]
+                session.close()
+        wall_cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name not in self._sessions and os.path.isdir(path) and os.path.getmtime(path) < wall_cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class _RecordingHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, message=""):
+        body = message.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, X-Recording-Token")
+        self.send_header("Access-Control-Max-Age", "86400")
+        self.end_headers()
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        match = PATH.fullmatch(url.path)
+        if not match:
+            self._reply(404, "Not found")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_CHUNK_BYTES:
+            self._reply(413, "Chunk too large")
+            return
+        data = self.rfile.read(length)
+        recording_id, action = match.groups()
+        token = self.headers.get("X-Recording-Token")
+        try:
+            if action == "chunks":
+                seq = int(parse_qs(url.query).get("seq", ["0"])[0])
+                self.server.streams.add_chunk(recording_id, seq, data, token)
+            else:
+                self.server.streams.finish(recording_id, token)
+        except PermissionError as e:
+            self._reply(403, str(e))
+            return
+        except ValueError as e:
+            self._reply(409, str(e))
+            return
+        except RecordingLimitError as e:
+            self._reply(503, str(e))
+            return
+        except OSError as e:
+            # e.g. ffmpeg is missing; the recorder falls back to uploading the whole recording
+            self._reply(503, str(e))
+            return
+        self._reply(200, "ok")
+
+
+def _purge_periodically(streams):
+    while True:
+        time.sleep(PURGE_INTERVAL_SECONDS)
+        streams.purge()
+
+
+def start_recording_server(streams, port, host=DEFAULT_RECORDING_HOST):
+    """Receive recording chunks from a daemon thread, and purge expired recordings from another. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _RecordingHandler)
+    server.daemon_threads = True
+    server.streams = streams
+    threading.Thread(target=server.serve_forever, name="recording-server", daemon=True).start()
+    threading.Thread(target=_purge_periodically, args=(streams,), name="recording-purge", daemon=True).start()
+    return server
+
+
+def start_recording_server_from_env(streams):
+    """None unless RECORDING_PORT is set (or if the port is taken); the recorder then uploads the whole
+    recording at Stop."""
+    port = int(os.getenv("RECORDING_PORT", "0"))
+    if not port:
+        return None
+    try:
+        return start_recording_server(streams, port, os.getenv("RECORDING_HOST", DEFAULT_RECORDING_HOST))
+    except OSError:
+        return None
@@ -0,0 +1,366 @@
+"""Structured (JSON) form of the 15-section analysis report.
+
+Each section of the protocol has a JSON schema; report_schema() combines the
+schemas of the requested sections into one strict object schema, sent as the
+response_format so the model's output is constrained to it. Responses are
+validated again locally (cached answers and models without schema support
+are not constrained), and render_markdown() turns a validated report back
+into the markdown the app shows.
+"""
+import json
+
+import jsonschema
+
+from prompts import ANALYSIS_SECTIONS, STRUCTURED_FORMAT_INSTRUCTION, STRUCTURED_REPAIR_PROMPT
+
+
+class ReportValidationError(ValueError):
+    """Raised when a structured report still fails validation after the repair request."""
+
+    def __init__(self, errors):
+        super().__init__("The structured report does not match its schema: " + "; ".join(errors))
+        self.errors = errors
+
+
+MAX_REPORTED_ERRORS = 20
+
+STRING = {"type": "string"}
+NUMBER = {"type": "number"}
+INTEGER = {"type": "integer"}
+OPTIONAL_STRING = {"type": ["string", "null"]}
+OPTIONAL_NUMBER = {"type": ["number", "null"]}
+OPTIONAL_INTEGER = {"type": ["integer", "null"]}
+CEFR_LEVEL = {"type": "string", "enum": ["A1", "A2", "B1", "B2", "C1", "C2"]}
+
+
+def _object(**properties):
+    # Strict structured outputs need every property required and no additional properties
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def _array(items):
+    return {"type": "array", "items": items}
+
+
+COUNTED_PHRASE = _object(phrase=STRING, count=INTEGER)
+
+SECTION_KEYS = {
+    1: "cefr_assessment",
+    2: "strengths_and_weaknesses",
+    3: "native_like_rephrasing",
+    4: "vocabulary_metrics",
+    5: "word_level_classification",
+    6: "word_repetition",
+    7: "speaking_rate_and_pauses",
+    8: "pronunciation",
+    9: "mother_tongue_influence",
+    10: "grammar",
+    11: "improvement_plan",
+    12: "topic_relevance",
+    13: "dimension_weights",
+    14: "mother_tongue_influence_deep_analysis",
+    15: "adaptive_recommendations",
+}
+
+SECTION_SCHEMAS = {
+    1: _object(
+        ratings=_array(_object(
+            category={"type": "string", "enum": ["Fluency", "Grammar", "Vocabulary", "Pronunciation", "Interaction"]},
+            level=CEFR_LEVEL, evidence=STRING)),
+        overall_level=CEFR_LEVEL,
+        overall_justification=STRING,
+    ),
+    2: _object(
+        grammar_accuracy_percent=NUMBER,
+        complex_sentences_percent=NUMBER,
+        compound_sentences_percent=NUMBER,
+        simple_sentences_percent=NUMBER,
+        advanced_constructions=_array(_object(construction=STRING, count=INTEGER)),
+        vocabulary_range=STRING,
+        speaking_rate=STRING,
+        fillers=_array(COUNTED_PHRASE),
+        repetitions=_array(COUNTED_PHRASE),
+        linking_words=STRING,
+    ),
+    3: _object(items=_array(_object(original=STRING, alternative=STRING, explanation=STRING))),
+    4: _object(
+        total_words=INTEGER,
+        unique_words=INTEGER,
+        type_token_ratio=NUMBER,
+        lexical_density_percent=NUMBER,
+        academic_word_coverage_percent=NUMBER,
+        cefr_distribution=_array(_object(level=CEFR_LEVEL, percent=NUMBER, words=INTEGER)),
+    ),
+    5: _object(levels=_array(_object(level=CEFR_LEVEL, examples=_array(STRING)))),
+    6: _object(
+        high_frequency=_array(COUNTED_PHRASE),
+        alternatives=_array(_object(phrase=STRING, alternatives=_array(STRING))),
+    ),
+    7: _object(
+        words_per_minute=OPTIONAL_NUMBER,
+        syllables_per_minute=OPTIONAL_NUMBER,
+        native_range_comparison=STRING,
+        total_pauses=OPTIONAL_INTEGER,
+        natural_pauses=OPTIONAL_INTEGER,
+        hesitation_pauses=OPTIONAL_INTEGER,
+        words_per_pause=OPTIONAL_NUMBER,
+        average_pause_seconds=OPTIONAL_NUMBER,
+        pause_to_speech_ratio=OPTIONAL_NUMBER,
+        flow_disruption_score=STRING,
+        disruption_patterns=_array(STRING),
+    ),
+    8: _object(
+        vowels_percent=NUMBER,
+        consonants_percent=NUMBER,
+        consonant_clusters_percent=NUMBER,
+        diphthongs_percent=NUMBER,
+        issues=_array(_object(phoneme=STRING, description=STRING, examples=_array(STRING))),
+        word_stress=STRING,
+        sentence_stress=STRING,
+        intonation=STRING,
+        rhythm=STRING,
+    ),
+    9: _object(
+        first_language=STRING,
+        confidence={"type": "string", "enum": ["high", "medium", "low"]},
+        phonological=STRING,
+        syntactic=STRING,
+        lexical=STRING,
+    ),
+    10: _object(
+        error_free_clauses_percent=NUMBER,
+        error_free_t_units_percent=NUMBER,
+        strengths=_array(_object(construction=STRING, count=INTEGER)),
+        errors=_array(_object(error_type=STRING, count=INTEGER, example=STRING)),
+    ),
+    11: _object(items=_array(_object(priority=INTEGER, focus_area=STRING, exercise=STRING, expected_outcome=STRING,
+                                     time_frame=STRING))),
+    12: _object(
+        expected_topic=OPTIONAL_STRING,
+        relevance_score=OPTIONAL_NUMBER,
+        on_topic_percent=OPTIONAL_NUMBER,
+        off_topic_percent=OPTIONAL_NUMBER,
+        digressions=_array(STRING),
+        coherence=STRING,
+    ),
+    13: _object(weights=_array(_object(dimension=STRING, weight_percent=NUMBER, criteria=STRING))),
+    14: _object(
+        phonological_transfers=_array(STRING),
+        syntactic_influence_percent=OPTIONAL_NUMBER,
+        lexical_borrowing=STRING,
+        accent_influence_score=STRING,
+        strategy_adaptations=_array(STRING),
+    ),
+    15: _object(
+        learning_trajectory=_array(STRING),
+        domain_strategies=_array(STRING),
+        targeted_interventions=_array(STRING),
+    ),
+}
+
+
+def report_schema(section_numbers=None):
+    section_numbers = section_numbers or sorted(ANALYSIS_SECTIONS)
+    return _object(**{SECTION_KEYS[number]: SECTION_SCHEMAS[number] for number in section_numbers})
+
+
+def response_format(section_numbers=None):
+    """response_format for a chat completion constrained to the sections' schema."""
+    return {"type": "json_schema",
+            "json_schema": {"name": "speech_report", "strict": True, "schema": report_schema(section_numbers)}}
+
+
+def json_instruction(section_numbers=None):
+    """Closing instruction of a structured prompt, naming the JSON key of each section."""
+    section_numbers = section_numbers or sorted(ANALYSIS_SECTIONS)
+    keys = "\n".join(f'- "{SECTION_KEYS[number]}": section {number}' for number in section_numbers)
+    return STRUCTURED_FORMAT_INSTRUCTION.format(section_keys=keys)
+
+
+def repair_prompt(text, errors):
+    return STRUCTURED_REPAIR_PROMPT.format(errors="\n".join(f"- {error}" for error in errors), report=text)
+
+
+def parse_report(text, section_numbers=None):
+    """(report, errors): the decoded report and its schema violations; report is None if it is not JSON."""
+    try:
+        report = json.loads(text or "")
+    except ValueError as e:
+        return None, [f"not valid JSON ({e})"]
+    validator = jsonschema.Draft202012Validator(report_schema(section_numbers))
+    errors = [f"{'/'.join(map(str, error.absolute_path)) or 'report'}: {error.message}"
+              for error in validator.iter_errors(report)]
+    return report, errors[:MAX_REPORTED_ERRORS]
+
+
+def order_report(report):
+    """The report's sections in protocol order."""
+    return {key: report[key] for key in SECTION_KEYS.values() if key in report}
+
+
+def _heading(number):
+    return ANALYSIS_SECTIONS[number].splitlines()[0]
+
+
+def _value(value, suffix=""):
+    return "n/a" if value is None else f"{value:g}{suffix}" if isinstance(value, float) else f"{value}{suffix}"
+
+
+def _table(header, rows):
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join("-" * (len(h) + 2) for h in header) + "|"]
+    lines += ["| " + " | ".join(str(cell).replace("|", "\\|") for cell in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def _counted(items):
+    return ", ".join(f"{item['phrase']} ({item['count']})" for item in items) or "none"
+
+
+def _bullets(items, indent=""):
+    return "\n".join(f"{indent}- {item}" for item in items) or f"{indent}- none"
+
+
+def _render_section(number, data):
+    if number == 1:
+        rows = [(r["category"], r["level"], r["evidence"]) for r in data["ratings"]]
+        rows.append(("**Overall CEFR Level**", data["overall_level"], data["overall_justification"]))
+        return _table(("Category", "Rating", "Evidence"), rows)
+    if number == 2:
+        constructions = ", ".join(f"{c['construction']} ({c['count']})" for c in data["advanced_constructions"])
+        return "\n".join([
+            "**Strengths:**",
+            f"- **Grammar Accuracy:** {_value(data['grammar_accuracy_percent'], '%')} of sentences "
+            "grammatically correct",
+            f"- **Sentence Complexity:** {_value(data['complex_sentences_percent'], '%')} complex sentences, "
+            f"{_value(data['compound_sentences_percent'], '%')} compound sentences, "
+            f"{_value(data['simple_sentences_percent'], '%')} simple sentences",
+            f"- **Advanced Constructions:** {constructions or 'none'}",
+            f"- **Vocabulary Range:** {data['vocabulary_range']}",
+            "",
+            "**Areas for Improvement:**",
+            f"- **Speaking Rate:** {data['speaking_rate']}",
+            f"- **Filler Usage:** {_counted(data['fillers'])}",
+            f"- **Word Repetition:** {_counted(data['repetitions'])}",
+            f"- **Linking Words:** {data['linking_words']}",
+        ])
+    if number == 3:
+        return _table(("Non-Native Construction", "Native-Like Alternative", "Improvement Explanation"),
+                      [(f'"{i["original"]}"', i["alternative"], i["explanation"]) for i in data["items"]])
+    if number == 4:
+        return "\n".join([
+            "**Quantitative Analysis:**",
+            f"- **Total Word Count:** {data['total_words']}",
+            f"- **Unique Word Count:** {data['unique_words']}",
+            f"- **Type-Token Ratio:** {_value(data['type_token_ratio'])}",
+            f"- **Lexical Density:** {_value(data['lexical_density_percent'], '%')}",
+            f"- **Academic Word List Coverage:** {_value(data['academic_word_coverage_percent'], '%')}",
+            "",
+            "**CEFR Level Distribution:**",
+            *(f"- {d['level']}: {_value(d['percent'], '%')} ({d['words']} words)" for d in data["cefr_distribution"]),
+        ])
+    if number == 5:
+        return _table(("CEFR Level", "Word/Phrase Examples"),
+                      [(level["level"], ", ".join(level["examples"])) for level in data["levels"]])
+    if number == 6:
+        return "\n".join([
+            "**High-Frequency Words/Phrases:**",
+            *(f"- {item['phrase']}: {item['count']} occurrences" for item in data["high_frequency"]),
+            "",
+            "**Suggested Alternatives:**",
+            *(f"- For {item['phrase']}: {', '.join(item['alternatives'])}" for item in data["alternatives"]),
+        ])
+    if number == 7:
+        return "\n".join([
+            "**Rate Metrics:**",
+            f"- **Words Per Minute:** {_value(data['words_per_minute'])}",
+            f"- **Syllables Per Minute:** {_value(data['syllables_per_minute'])}",
+            f"- **Comparison to Native Range:** {data['native_range_comparison']}",
+            "",
+            "**Pause Analysis:**",
+            f"- **Total Pauses:** {_value(data['total_pauses'])}",
+            f"- **Natural Pauses:** {_value(data['natural_pauses'])}",
+            f"- **Hesitation Pauses:** {_value(data['hesitation_pauses'])}",
+            f"- **Pause Frequency:** 1 pause every {_value(data['words_per_pause'])} words",
+            f"- **Average Pause Duration:** {_value(data['average_pause_seconds'], ' s')}",
+            "",
+            "**Fluency Assessment:**",
+            f"- **Pause-to-Speech Ratio:** {_value(data['pause_to_speech_ratio'])}",
+            f"- **Flow Disruption Score:** {data['flow_disruption_score']}",
+            f"- **Specific Disruption Patterns:** {'; '.join(data['disruption_patterns']) or 'none'}",
+        ])
+    if number == 8:
+        return "\n".join([
+            "**Phoneme Accuracy:**",
+            f"- **Vowels:** {_value(data['vowels_percent'], '%')} accuracy",
+            f"- **Consonants:** {_value(data['consonants_percent'], '%')} accuracy",
+            f"- **Consonant Clusters:** {_value(data['consonant_clusters_percent'], '%')} accuracy",
+            f"- **Diphthongs:** {_value(data['diphthongs_percent'], '%')} accuracy",
+            "",
+            "**Specific Issues:**",
+            *(f"- {i['phoneme']}: {i['description']} in words {', '.join(i['examples'])}" for i in data["issues"]),
+            "",
+            "**Prosodic Features:**",
+            f"- **Word Stress:** {data['word_stress']}",
+            f"- **Sentence Stress:** {data['sentence_stress']}",
+            f"- **Intonation Patterns:** {data['intonation']}",
+            f"- **Rhythm:** {data['rhythm']}",
+        ])
+    if number == 9:
+        return "\n".join([
+            f"- **Identified First Language:** {data['first_language']} (confidence level: {data['confidence']})",
+            f"- **Phonological Influences:** {data['phonological']}",
+            f"- **Syntactic Influences:** {data['syntactic']}",
+            f"- **Lexical Influences:** {data['lexical']}",
+        ])
+    if number == 10:
+        return "\n".join([
+            "**Accuracy Statistics:**",
+            f"- **Error-Free Clauses:** {_value(data['error_free_clauses_percent'], '%')}",
+            f"- **Error-Free T-Units:** {_value(data['error_free_t_units_percent'], '%')}",
+            "",
+            "**Grammar Strengths:**",
+            *(f"- {s['construction']}: Used correctly {s['count']} times" for s in data["strengths"]),
+            "",
+            "**Grammar Errors:**",
+            *(f"- {e['error_type']}: {e['count']} instances (e.g., \"{e['example']}\")" for e in data["errors"]),
+        ])
+    if number == 11:
+        return _table(("Priority", "Focus Area", "Specific Exercise", "Expected Outcome", "Time Frame"),
+                      [(i["priority"], i["focus_area"], i["exercise"], i["expected_outcome"], i["time_frame"])
+                       for i in data["items"]])
+    if number == 12:
+        return "\n".join([
+            f"- **Expected Topic:** {data['expected_topic'] or 'not provided'}",
+            f"- **Relevance Score:** {_value(data['relevance_score'])}",
+            f"- **On-Topic Content:** {_value(data['on_topic_percent'], '%')}",
+            f"- **Off-Topic Content:** {_value(data['off_topic_percent'], '%')}",
+            f"- **Main Digressions:** {'; '.join(data['digressions']) or 'none'}",
+            f"- **Coherence Assessment:** {data['coherence']}",
+        ])
+    if number == 13:
+        return "**Weighted Assessment Criteria:**\n" + "\n".join(
+            f"- **{w['dimension']}:** {_value(w['weight_percent'], '%')} ({w['criteria']})" for w in data["weights"])
+    if number == 14:
+        return "\n".join([
+            "- **Linguistic Transfer Mapping:**",
+            _bullets(data["phonological_transfers"], "  "),
+            f"  - Syntactic influence: {_value(data['syntactic_influence_percent'], '%')}",
+            f"  - Lexical borrowing: {data['lexical_borrowing']}",
+            f"- **Accent Influence Score:** {data['accent_influence_score']}",
+            "- **Communication Strategy Adaptations:**",
+            _bullets(data["strategy_adaptations"], "  "),
+        ])
+    return "\n".join([
+        "- **Personalized Learning Trajectory:**",
+        _bullets(data["learning_trajectory"], "  "),
+        "- **Domain-Specific Strategies:**",
+        _bullets(data["domain_strategies"], "  "),
+        "- **Targeted Interventions:**",
+        _bullets(data["targeted_interventions"], "  "),
+    ])
+
+
+def render_markdown(report):
+    """The markdown report for a validated structured report (any subset of sections)."""
+    return "\n\n".join(f"{_heading(number)}\n\n{_render_section(number, report[key])}"
+                       for number, key in SECTION_KEYS.items() if key in report)
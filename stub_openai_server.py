@@ -0,0 +1,140 @@
+"""Minimal local stand-in for the OpenAI chat completions endpoint.
+
+Used to exercise AsyncLLMClient (retries, rate limiting, connection reuse)
+without network access or API quota. Point the client at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+
+Usage:
+    python stub_openai_server.py --port 8765 --latency 0.5 --fail-every 5
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, count, model, content, usage=None):
+        """Send content as server-sent chat.completion.chunk events, a few words at a time."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_event(data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(payload):X}\r\n".encode("ascii") + payload + b"\r\n")
+            self.wfile.flush()
+
+        words = content.split(" ")
+        for i in range(0, len(words), 3):
+            piece = " ".join(words[i:i + 3]) + (" " if i + 3 < len(words) else "")
+            write_event(json.dumps({
+                "id": f"chatcmpl-stub-{count}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }))
+            time.sleep(self.server.chunk_delay)
+        if usage:
+            write_event(json.dumps({
+                "id": f"chatcmpl-stub-{count}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            }))
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+        if server.fail_every and count % server.fail_every == 0:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                            headers={"retry-after": "0"})
+            return
+
+        time.sleep(server.latency)
+        prompt = request["messages"][-1]["content"]
+        content = server.response_text or f"Stub analysis of a {len(prompt)}-character prompt."
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if request.get("stream"):
+            include_usage = (request.get("stream_options") or {}).get("include_usage")
+            self._send_stream(count, request.get("model", "stub"), content, usage if include_usage else None)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-stub-{count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, fail_every=0, response_text=None, chunk_delay=0.0):
+    """Start the stub in a daemon thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), StubOpenAIHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_every = fail_every
+    server.response_text = response_text
+    server.chunk_delay = chunk_delay
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub of the OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with a 429")
+    args = parser.parse_args()
+
+    stub, base_url = start_stub_server(args.host, args.port, args.latency, args.fail_every)
+    print(f"Stub OpenAI server listening at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.shutdown()
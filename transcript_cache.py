@@ -0,0 +1,94 @@
+"""Persistent, content-addressed cache for Whisper transcription results.
+
+Entries are keyed by a hash of the audio bytes together with the model name
+and decode options, stored as one JSON file each, and evicted least recently
+used first once the cache grows past its size limit.
+"""
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "speech_analysis", "transcripts")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def audio_fingerprint(audio_bytes):
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+class TranscriptCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        cache_dir = os.getenv("TRANSCRIPT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        max_mb = os.getenv("TRANSCRIPT_CACHE_MAX_MB")
+        max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        return cls(cache_dir, max_bytes)
+
+    @staticmethod
+    def make_key(fingerprint, model_name, decode_options=None):
+        options = json.dumps(decode_options or {}, sort_keys=True, default=str)
+        return hashlib.sha256(f"{fingerprint}|{model_name}|{options}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # Bump mtime so eviction sees this entry as recently used
+            os.utime(path, None)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return entry
+
+    def put(self, key, result):
+        entry = {
+            "text": result["text"],
+            "segments": result.get("segments", []),
+            "language": result.get("language"),
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, default=float)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+            for _, size, name in sorted(entries):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, name))